@@ -18,6 +18,13 @@ def create_app(config_class=Config):
     CORS(app, supports_credentials=True)
     
     # セッション設定
+    # Redis クライアントはここで作るが、実際の接続は最初のリクエスト時
+    if app.config.get('SESSION_TYPE') == 'redis' and app.config.get('SESSION_REDIS') is None:
+        from redis import Redis
+        app.config['SESSION_REDIS'] = Redis.from_url(
+            app.config['REDIS_URL'],
+            socket_connect_timeout=app.config.get('REDIS_CONNECT_TIMEOUT', 1),
+        )
     Session(app)
     
     # データベース初期化
@@ -40,9 +47,16 @@ def create_app(config_class=Config):
     def internal_error(error):
         return {'error': 'Internal server error'}, 500
     
-    # ヘルスチェックエンドポイント
+    # ヘルスチェックエンドポイント（プロセスが生きているかだけ。依存先は見ない）
     @app.route('/health')
     def health():
         return {'status': 'healthy'}, 200
     
+    # レディネスチェック（DB / Redis に到達できるか。結果は短時間キャッシュ）
+    @app.route('/ready')
+    def ready():
+        from .health import readiness
+        result = readiness(app)
+        return result, (200 if result['status'] == 'ready' else 503)
+    
     return app
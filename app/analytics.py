@@ -1,9 +1,11 @@
 """
 分析エンジン - メトリクス分析と自動フロー提案
+
+各メソッドは SessionGraph（app/session_graph.py）か、to_dict() のノード・接続のリストを受け取る。
+リストの場合はその場で SessionGraph にしてから数える。summarize には集計クエリの結果の
+SessionGraphStats も渡せる（使うのはノード数・接続数・カテゴリ分布・カテゴリ間の接続数・孤立ノード数だけ）。
 """
-from collections import defaultdict, Counter
-from datetime import datetime
-import math
+from .session_graph import CATEGORIES, CATEGORY_CODES, SessionGraph, SessionGraphStats
 
 
 class AnalyticsEngine:
@@ -33,14 +35,35 @@ class AnalyticsEngine:
         'internalization': '#BD10E0'     # 紫
     }
     
+    @staticmethod
+    def _graph(nodes, connections=None):
+        """SessionGraph / SessionGraphStats ならそのまま、リストなら SessionGraph にする"""
+        if isinstance(nodes, (SessionGraph, SessionGraphStats)):
+            return nodes
+        return SessionGraph.from_dicts(nodes, connections or ())
+    
+    @staticmethod
+    def summarize(graph):
+        """分析サマリー（/api/analytics/summary の analytics）"""
+        return {
+            'total_nodes': len(graph),
+            'total_connections': graph.connection_count,
+            'category_distribution': AnalyticsEngine.calculate_category_distribution(graph),
+            'balance_score': AnalyticsEngine.calculate_balance_score(graph),
+            'flow_quality': AnalyticsEngine.analyze_flow_quality(graph),
+            'completion_score': AnalyticsEngine.calculate_completion_score(graph),
+            'suggestions': AnalyticsEngine.suggest_next_steps(graph),
+            'insights': AnalyticsEngine.generate_insights(graph)
+        }
+    
     @staticmethod
     def calculate_category_distribution(nodes):
         """カテゴリ分布の計算"""
-        if not nodes:
+        graph = AnalyticsEngine._graph(nodes)
+        if not len(graph):
             return {}
         
-        distribution = Counter([node['category'] for node in nodes])
-        total = len(nodes)
+        total = len(graph)
         
         return {
             category: {
@@ -49,25 +72,26 @@ class AnalyticsEngine:
                 'name': AnalyticsEngine.CATEGORY_NAMES.get(category, category),
                 'color': AnalyticsEngine.CATEGORY_COLORS.get(category, '#999999')
             }
-            for category, count in distribution.items()
+            for category, count in zip(CATEGORIES, graph.category_counts())
+            if count > 0
         }
     
     @staticmethod
     def calculate_balance_score(nodes):
         """知識創造プロセスのバランススコア計算"""
-        if not nodes:
+        graph = AnalyticsEngine._graph(nodes)
+        if not len(graph):
             return 0
         
-        distribution = Counter([node['category'] for node in nodes])
-        total = len(nodes)
+        total = len(graph)
         
         # 理想的な分布は25%ずつ
         ideal_percentage = 25.0
         
         # 各カテゴリの偏差を計算
         deviations = []
-        for category in ['socialization', 'externalization', 'combination', 'internalization']:
-            actual_percentage = (distribution.get(category, 0) / total) * 100
+        for count in graph.category_counts():
+            actual_percentage = (count / total) * 100
             deviation = abs(actual_percentage - ideal_percentage)
             deviations.append(deviation)
         
@@ -78,9 +102,10 @@ class AnalyticsEngine:
         return round(balance_score, 1)
     
     @staticmethod
-    def analyze_flow_quality(nodes, connections):
+    def analyze_flow_quality(nodes, connections=None):
         """フロー品質の分析"""
-        if not nodes or not connections:
+        graph = AnalyticsEngine._graph(nodes, connections)
+        if not len(graph) or not graph.connection_count:
             return {
                 'score': 0,
                 'ideal_flows': 0,
@@ -88,21 +113,16 @@ class AnalyticsEngine:
                 'quality_percentage': 0
             }
         
-        # ノードIDからカテゴリへのマッピング
-        node_categories = {node['id']: node['category'] for node in nodes}
+        # カテゴリの組ごとの接続数（行き先が削除済みの接続は理想的な遷移に数えない）
+        matrix = graph.flow_matrix()
         
         ideal_flow_count = 0
-        total_connections = len(connections)
+        total_connections = graph.connection_count
         
-        for conn in connections:
-            source_category = node_categories.get(conn['source_id'])
-            target_category = node_categories.get(conn['target_id'])
-            
-            if source_category and target_category:
-                # 理想的な遷移パターンに合致するか確認
-                expected_targets = AnalyticsEngine.SECI_FLOW_PATTERNS.get(source_category, [])
-                if target_category in expected_targets:
-                    ideal_flow_count += 1
+        for source_category, expected_targets in AnalyticsEngine.SECI_FLOW_PATTERNS.items():
+            # 理想的な遷移パターンに合致する接続を数える
+            for target_category in expected_targets:
+                ideal_flow_count += matrix[CATEGORY_CODES[source_category]][CATEGORY_CODES[target_category]]
         
         quality_percentage = (ideal_flow_count / total_connections * 100) if total_connections > 0 else 0
         
@@ -114,9 +134,10 @@ class AnalyticsEngine:
         }
     
     @staticmethod
-    def suggest_next_steps(nodes, connections):
+    def suggest_next_steps(nodes, connections=None):
         """次のステップの提案"""
-        if not nodes:
+        graph = AnalyticsEngine._graph(nodes, connections)
+        if not len(graph):
             return [{
                 'category': 'socialization',
                 'title': '共同化から始めましょう',
@@ -125,23 +146,16 @@ class AnalyticsEngine:
             }]
         
         # 現在のカテゴリ分布を取得
-        distribution = Counter([node['category'] for node in nodes])
-        total = len(nodes)
-        
-        # ノードIDからカテゴリへのマッピング
-        node_categories = {node['id']: node['category'] for node in nodes}
+        distribution = dict(zip(CATEGORIES, graph.category_counts()))
+        total = len(graph)
         
-        # 各カテゴリの接続状況を分析
-        outgoing_connections = defaultdict(int)
-        for conn in connections:
-            source_category = node_categories.get(conn['source_id'])
-            if source_category:
-                outgoing_connections[source_category] += 1
+        # カテゴリの組ごとの接続数
+        matrix = graph.flow_matrix()
         
         suggestions = []
         
         # 1. 不足しているカテゴリの提案
-        for category in ['socialization', 'externalization', 'combination', 'internalization']:
+        for category in CATEGORIES:
             count = distribution.get(category, 0)
             percentage = (count / total) * 100
             
@@ -157,13 +171,10 @@ class AnalyticsEngine:
         for category, expected_targets in AnalyticsEngine.SECI_FLOW_PATTERNS.items():
             if category in distribution and distribution[category] > 0:
                 # このカテゴリから期待される遷移先への接続があるか確認
-                has_expected_flow = False
-                for conn in connections:
-                    source_cat = node_categories.get(conn['source_id'])
-                    target_cat = node_categories.get(conn['target_id'])
-                    if source_cat == category and target_cat in expected_targets:
-                        has_expected_flow = True
-                        break
+                has_expected_flow = any(
+                    matrix[CATEGORY_CODES[category]][CATEGORY_CODES[target]] > 0
+                    for target in expected_targets
+                )
                 
                 if not has_expected_flow:
                     for target_category in expected_targets:
@@ -175,12 +186,7 @@ class AnalyticsEngine:
                         })
         
         # 3. 孤立ノードの接続提案
-        connected_nodes = set()
-        for conn in connections:
-            connected_nodes.add(conn['source_id'])
-            connected_nodes.add(conn['target_id'])
-        
-        isolated_count = len(nodes) - len(connected_nodes)
+        isolated_count = graph.isolated_count()
         if isolated_count > 0:
             suggestions.append({
                 'category': None,
@@ -196,29 +202,30 @@ class AnalyticsEngine:
         return suggestions[:5]  # 上位5件のみ返す
     
     @staticmethod
-    def calculate_completion_score(nodes, connections):
+    def calculate_completion_score(nodes, connections=None):
         """知識創造プロセスの完成度スコア"""
-        if not nodes:
+        graph = AnalyticsEngine._graph(nodes, connections)
+        if not len(graph):
             return 0
         
         scores = []
         
         # 1. ノード数スコア（最大30点）
-        node_count_score = min(30, (len(nodes) / 20) * 30)
+        node_count_score = min(30, (len(graph) / 20) * 30)
         scores.append(node_count_score)
         
         # 2. バランススコア（最大30点）
-        balance_score = AnalyticsEngine.calculate_balance_score(nodes)
+        balance_score = AnalyticsEngine.calculate_balance_score(graph)
         scores.append(balance_score * 0.3)
         
         # 3. フロー品質スコア（最大25点）
-        flow_quality = AnalyticsEngine.analyze_flow_quality(nodes, connections)
+        flow_quality = AnalyticsEngine.analyze_flow_quality(graph)
         scores.append(flow_quality['score'] * 0.25)
         
         # 4. 接続密度スコア（最大15点）
-        if len(nodes) > 1:
-            max_possible_connections = len(nodes) * (len(nodes) - 1) / 2
-            connection_density = (len(connections) / max_possible_connections) * 100
+        if len(graph) > 1:
+            max_possible_connections = len(graph) * (len(graph) - 1) / 2
+            connection_density = (graph.connection_count / max_possible_connections) * 100
             density_score = min(15, connection_density * 0.15)
             scores.append(density_score)
         else:
@@ -228,22 +235,20 @@ class AnalyticsEngine:
         return round(min(100, total_score), 1)
     
     @staticmethod
-    def generate_insights(nodes, connections):
+    def generate_insights(nodes, connections=None):
         """インサイト生成"""
+        graph = AnalyticsEngine._graph(nodes, connections)
         insights = []
         
-        if not nodes:
+        if not len(graph):
             insights.append({
                 'type': 'info',
                 'message': '知識マッピングを始めましょう！まずは共同化から。'
             })
             return insights
         
-        # カテゴリ分布の分析
-        distribution = AnalyticsEngine.calculate_category_distribution(nodes)
-        
         # バランスチェック
-        balance_score = AnalyticsEngine.calculate_balance_score(nodes)
+        balance_score = AnalyticsEngine.calculate_balance_score(graph)
         if balance_score > 80:
             insights.append({
                 'type': 'success',
@@ -256,7 +261,7 @@ class AnalyticsEngine:
             })
         
         # フロー品質チェック
-        flow_quality = AnalyticsEngine.analyze_flow_quality(nodes, connections)
+        flow_quality = AnalyticsEngine.analyze_flow_quality(graph)
         if flow_quality['score'] > 70:
             insights.append({
                 'type': 'success',
@@ -269,12 +274,12 @@ class AnalyticsEngine:
             })
         
         # ノード数チェック
-        if len(nodes) >= 50:
+        if len(graph) >= 50:
             insights.append({
                 'type': 'success',
-                'message': f'{len(nodes)}個のノードを作成しました！素晴らしい知識の蓄積です。'
+                'message': f'{len(graph)}個のノードを作成しました！素晴らしい知識の蓄積です。'
             })
-        elif len(nodes) < 5:
+        elif len(graph) < 5:
             insights.append({
                 'type': 'info',
                 'message': 'より多くの知識を追加して、全体像を充実させましょう'
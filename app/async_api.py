@@ -0,0 +1,469 @@
+"""
+読み取り専用 API の非同期パス（ASGI + async SQLAlchemy / asyncpg）
+
+GET /api/nodes, /api/nodes/clusters, /api/changes, /api/search, /api/analytics/summary, /api/activity を
+イベントループ上で処理し、DB 待ちの間に他のリクエストを進められるようにする。
+レスポンスの JSON は Flask 側（routes.py）と同じ形・同じエンコーダで返す。
+
+それ以外のリクエスト、およびセッションがまだ DB に無い初回アクセスは
+Flask アプリ（WSGI）にそのまま渡す。セッションの作成は Flask 側だけで行う。
+
+シャードの選択（セッションキーのハッシュ）と読み取りレプリカの判定（書き込み直後の
+ユーザーか、レプリカが使えるか）は Flask 側と同じく database.py のものを使う。
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+
+from flask import request as flask_request
+from sqlalchemy import select, update
+from sqlalchemy.engine import make_url
+
+from . import database
+from .analytics import AnalyticsEngine
+from .changes import (
+    CHANGES_QUERY, CURSOR_QUERY, STRUCTURE_QUERY, build_changes_response, cursor_from_row,
+    parse_cursor, reset_response, structure_version_from_row, summarize_changes,
+)
+from .clusters import (
+    CLUSTER_CACHE_EXPIRE, CLUSTER_EDGES_QUERY, CLUSTER_NODES_QUERY,
+    build_cluster_level, cache_key as cluster_cache_key, cluster_response, level_for_zoom, parse_zoom,
+)
+from .graph_analysis import SPIRAL_CACHE_EXPIRE, analyze_spiral, cache_key as spiral_cache_key
+from .session_graph import (
+    EDGE_STATS_QUERY, GRAPH_EDGES_QUERY, GRAPH_NODES_QUERY, NODE_STATS_QUERY, SessionGraph, SessionGraphStats,
+)
+from .viewport import (
+    POINTS_QUERY, VIEWPORT_MIN_NODES, cached_grid, parse_bbox, store_grid,
+    viewport_response, viewport_statements, visible_node_ids,
+)
+from .models import (
+    Session as UserSession,
+    KnowledgeNode,
+    NodeConnection,
+    ActivityLog,
+    SECICategory,
+)
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', '10'))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '5'))
+
+# ユーザーノードキャッシュの有効期限（cache_manager.set_user_nodes_cache と同じ）
+NODES_CACHE_EXPIRE = 3600
+
+
+def async_database_url(db_url):
+    """psycopg2 用の URL を asyncpg 用に変換（sslmode は asyncpg の ssl 引数へ）"""
+    url = make_url(db_url).set(drivername='postgresql+asyncpg')
+    query = dict(url.query)
+    connect_args = {}
+    sslmode = query.pop('sslmode', None)
+    if sslmode:
+        # asyncpg は libpq と同じ sslmode 文字列を ssl 引数で受け付ける
+        connect_args['ssl'] = sslmode
+    return url.set(query=query), connect_args
+
+
+class AsyncReadAPI:
+    """読み取り系エンドポイントだけを持つ ASGI アプリ"""
+
+    def __init__(self, flask_app, fallback):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        # シャードごとのエンジンとセッションファクトリ（レプリカが無ければ reader はプライマリ）
+        self.engines = []
+        self.writers = []
+        self.readers = []
+        self.redis = None
+        self.routes = {
+            '/api/nodes': self.get_nodes,
+            '/api/nodes/clusters': self.get_node_clusters,
+            '/api/changes': self.get_node_changes,
+            '/api/search': self.search_nodes,
+            '/api/analytics/summary': self.get_analytics_summary,
+            '/api/activity': self.get_activity_log,
+        }
+
+    # ===== ASGI =====
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            handler = self.routes.get(scope['path'])
+            if handler is not None:
+                try:
+                    session_id, reader = await self._resolve_session(scope)
+                except Exception as e:
+                    return await self._send_json(send, 500, {'success': False, 'error': str(e)})
+                if session_id is not None:
+                    query = {k: v[0] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+                    status, payload = await self._run(handler, reader, session_id, query)
+                    return await self._send_json(send, status, payload)
+
+        await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._init_backends()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self._close_backends()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _init_backends(self):
+        """エンジンと Redis クライアントを作る（接続は初回利用時）"""
+        if self.engines:
+            return
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        for shard in database.shards:
+            engine = self._create_engine(shard.url)
+            writer = async_sessionmaker(engine, expire_on_commit=False)
+            self.engines.append(engine)
+            reader = writer
+            if shard.read_url:
+                read_engine = self._create_engine(shard.read_url)
+                self.engines.append(read_engine)
+                reader = async_sessionmaker(read_engine, expire_on_commit=False)
+            self.writers.append(writer)
+            self.readers.append(reader)
+
+        redis_url = self.flask_app.config.get('REDIS_URL')
+        if redis_url:
+            from redis import asyncio as redis_asyncio
+            self.redis = redis_asyncio.from_url(
+                redis_url,
+                decode_responses=True,
+                socket_connect_timeout=self.flask_app.config.get('REDIS_CONNECT_TIMEOUT', 1),
+            )
+
+    def _create_engine(self, db_url):
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        url, connect_args = async_database_url(db_url)
+        connect_args['timeout'] = self.flask_app.config.get('DB_CONNECT_TIMEOUT', 5)
+        return create_async_engine(
+            url,
+            pool_size=ASYNC_DB_POOL_SIZE,
+            max_overflow=ASYNC_DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            connect_args=connect_args,
+        )
+
+    async def _close_backends(self):
+        for engine in self.engines:
+            await engine.dispose()
+        if self.redis is not None:
+            await self.redis.close()
+
+    async def _send_json(self, send, status, payload):
+        body = self.flask_app.json.dumps(payload).encode('utf-8') + b'\n'
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _run(self, handler, reader, session_id, query):
+        """ハンドラを実行（例外は Flask 側と同じ 500 の形で返す）
+        ハンドラは payload か (status, payload) を返す"""
+        try:
+            result = await handler(reader, session_id, query)
+            return result if isinstance(result, tuple) else (200, result)
+        except Exception as e:
+            return 500, {'success': False, 'error': str(e)}
+
+    # ===== セッション =====
+
+    def _read_session_key(self, cookie_header):
+        """Flask のセッションインターフェースでクッキーを読み、シャードとレプリカを使えるかを決める
+        （Redis / DB に触れるのでスレッドで実行する）"""
+        app = self.flask_app
+        with app.test_request_context('/', headers={'Cookie': cookie_header}):
+            flask_session = app.session_interface.open_session(app, flask_request)
+            session_key = flask_session.get('session_id') if flask_session is not None else None
+            if not session_key:
+                return None, 0, False
+            shard = database.shards[database.shard_index_for_key(session_key)]
+            use_replica = (
+                shard.read_url is not None
+                and not database.is_pinned_to_primary(flask_session)
+                and shard.replica_available()
+            )
+            return session_key, shard.index, use_replica
+
+    async def _resolve_session(self, scope):
+        """DB 上のセッション ID と読み取り用のセッションファクトリ（セッションが無ければ None で Flask に任せる）"""
+        cookie_header = ''
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookie_header = value.decode('latin-1')
+                break
+        if not cookie_header:
+            return None, None
+
+        if not self.engines:
+            self._init_backends()
+
+        session_key, shard_index, use_replica = await asyncio.to_thread(self._read_session_key, cookie_header)
+        if not session_key:
+            return None, None
+
+        # require_session と同じく最終アクティビティを更新し、同じ往復で ID を得る
+        async with self.writers[shard_index]() as db:
+            result = await db.execute(
+                update(UserSession)
+                .where(UserSession.session_key == session_key)
+                .values(last_activity=datetime.utcnow())
+                .returning(UserSession.id)
+                .execution_options(synchronize_session=False)
+            )
+            session_id = result.scalar_one_or_none()
+            await db.commit()
+        reader = self.readers[shard_index] if use_replica else self.writers[shard_index]
+        return session_id, reader
+
+    # ===== キャッシュ =====
+
+    async def _cache_get(self, key):
+        if self.redis is None:
+            return None
+        try:
+            data = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"redis get failed: {e}")
+            return None
+        return json.loads(data) if data else None
+
+    async def _cache_set(self, key, expire, value):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.setex(key, expire, json.dumps(value, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"redis set failed: {e}")
+
+    async def _get_nodes_cache(self, session_id):
+        return await self._cache_get(f'nodes:{session_id}')
+
+    async def _set_nodes_cache(self, session_id, result):
+        await self._cache_set(f'nodes:{session_id}', NODES_CACHE_EXPIRE, result)
+
+    # ===== クエリ =====
+
+    async def _load_graph(self, db, session_id):
+        nodes = (await db.execute(
+            select(KnowledgeNode).filter_by(session_id=session_id, is_deleted=False)
+        )).scalars().all()
+        connections = (await db.execute(
+            select(NodeConnection).join(
+                KnowledgeNode,
+                NodeConnection.source_node_id == KnowledgeNode.id
+            ).where(
+                KnowledgeNode.session_id == session_id,
+                KnowledgeNode.is_deleted == False
+            )
+        )).scalars().all()
+        return [node.to_dict() for node in nodes], [conn.to_dict() for conn in connections]
+
+    # ===== エンドポイント（routes.py と同じレスポンス） =====
+
+    async def get_nodes(self, reader, session_id, query):
+        """ノード一覧取得（bbox を指定すると大きいセッションでは表示範囲内だけ）"""
+        if query.get('bbox'):
+            try:
+                bbox = parse_bbox(query['bbox'])
+            except ValueError:
+                return 400, {'success': False, 'error': 'bboxはx0,y0,x1,y1の形式で指定してください'}
+            async with reader() as db:
+                cursor = cursor_from_row((await db.execute(CURSOR_QUERY, {'sid': session_id})).first())
+                grid = cached_grid(session_id, cursor)
+                if grid is None:
+                    grid = store_grid(session_id, cursor, (await db.execute(POINTS_QUERY, {'sid': session_id})).all())
+                if len(grid) > VIEWPORT_MIN_NODES:
+                    node_ids, truncated = visible_node_ids(grid, bbox)
+                    nodes, connections = [], []
+                    if node_ids:
+                        nodes_stmt, connections_stmt = viewport_statements(session_id, node_ids)
+                        nodes = (await db.execute(nodes_stmt)).scalars().all()
+                        connections = (await db.execute(connections_stmt)).scalars().all()
+                    return viewport_response(nodes, connections, bbox, cursor, len(grid), truncated)
+
+        cached = await self._get_nodes_cache(session_id)
+        if cached and 'cursor' in cached:
+            return {
+                'success': True,
+                'nodes': cached.get('nodes', []),
+                'connections': cached.get('connections', []),
+                'cursor': cached['cursor'],
+                'cached': True,
+            }
+
+        async with reader() as db:
+            cursor = cursor_from_row((await db.execute(CURSOR_QUERY, {'sid': session_id})).first())
+            nodes_data, connections_data = await self._load_graph(db, session_id)
+
+        result = {
+            'nodes': nodes_data,
+            'connections': connections_data,
+            'cursor': cursor
+        }
+        await self._set_nodes_cache(session_id, result)
+        return {'success': True, **result, 'cached': False}
+
+    async def get_node_clusters(self, reader, session_id, query):
+        """縮小表示用のクラスタ要約（zoom は D3 の拡大率、bbox で範囲を絞れる）"""
+        zoom = parse_zoom(query.get('zoom', '1'))
+        if zoom is None:
+            return 400, {'success': False, 'error': 'zoomには正の数を指定してください'}
+
+        bbox = None
+        if query.get('bbox'):
+            try:
+                bbox = parse_bbox(query['bbox'])
+            except ValueError:
+                return 400, {'success': False, 'error': 'bboxはx0,y0,x1,y1の形式で指定してください'}
+
+        level = level_for_zoom(zoom)
+        async with reader() as db:
+            cursor = cursor_from_row((await db.execute(CURSOR_QUERY, {'sid': session_id})).first())
+            key = cluster_cache_key(session_id, cursor, level)
+            summary = await self._cache_get(key)
+            if summary is not None:
+                return cluster_response(summary, level, cursor, True, bbox)
+            summary = build_cluster_level(
+                (await db.execute(CLUSTER_NODES_QUERY, {'sid': session_id})).all(),
+                (await db.execute(CLUSTER_EDGES_QUERY, {'sid': session_id})).all(),
+                level,
+            )
+        await self._cache_set(key, CLUSTER_CACHE_EXPIRE, summary)
+        return cluster_response(summary, level, cursor, False, bbox)
+
+    async def get_node_changes(self, reader, session_id, query):
+        """差分同期: since（カーソル）より新しいノード・接続と削除"""
+        since = parse_cursor(query.get('since'))
+        if since is None:
+            return 400, {'success': False, 'error': 'sinceには0以上の整数を指定してください'}
+
+        async with reader() as db:
+            rows = (await db.execute(CHANGES_QUERY, {'sid': session_id, 'since': since})).all()
+            summary = summarize_changes(rows, since)
+            if summary['reset']:
+                return reset_response(summary)
+
+            nodes = []
+            if summary['node_ids']:
+                nodes = (await db.execute(
+                    select(KnowledgeNode).where(
+                        KnowledgeNode.session_id == session_id,
+                        KnowledgeNode.id.in_(summary['node_ids'])
+                    )
+                )).scalars().all()
+            connections = []
+            if summary['connection_ids']:
+                connections = (await db.execute(
+                    select(NodeConnection).where(NodeConnection.id.in_(summary['connection_ids']))
+                )).scalars().all()
+
+        return build_changes_response(summary, nodes, connections)
+
+    async def search_nodes(self, reader, session_id, query):
+        """ノード検索"""
+        text_query = query.get('q', '')
+        category = query.get('category', '')
+
+        stmt = select(KnowledgeNode).filter_by(session_id=session_id, is_deleted=False)
+        if text_query:
+            stmt = stmt.where(
+                (KnowledgeNode.title.ilike(f'%{text_query}%')) |
+                (KnowledgeNode.description.ilike(f'%{text_query}%'))
+            )
+        if category:
+            try:
+                stmt = stmt.filter_by(category=SECICategory(category).value)
+            except ValueError:
+                pass
+
+        async with reader() as db:
+            nodes = (await db.execute(stmt)).scalars().all()
+
+        return {
+            'success': True,
+            'nodes': [node.to_dict() for node in nodes],
+            'count': len(nodes)
+        }
+
+    async def get_analytics_summary(self, reader, session_id, query):
+        """分析サマリー取得"""
+        async with reader() as db:
+            structure_version = structure_version_from_row(
+                (await db.execute(STRUCTURE_QUERY, {'sid': session_id})).first()
+            )
+            key = spiral_cache_key(session_id, structure_version)
+            # サマリーの数値は常に集計クエリから、グラフ全体はスパイラル分析がキャッシュに無いときだけ（Flask 側と同じ）
+            stats = SessionGraphStats(
+                (await db.execute(NODE_STATS_QUERY, {'sid': session_id})).all(),
+                (await db.execute(EDGE_STATS_QUERY, {'sid': session_id})).all(),
+            )
+            spiral = await self._cache_get(key)
+            graph = None
+            if spiral is None:
+                graph = SessionGraph.from_rows(
+                    (await db.execute(GRAPH_NODES_QUERY, {'sid': session_id})).all(),
+                    (await db.execute(GRAPH_EDGES_QUERY, {'sid': session_id})).all(),
+                )
+
+        if spiral is None:
+            spiral = analyze_spiral(graph)
+            await self._cache_set(key, SPIRAL_CACHE_EXPIRE, spiral)
+
+        analytics = AnalyticsEngine.summarize(stats)
+        analytics['spiral'] = spiral
+        return {
+            'success': True,
+            'analytics': analytics
+        }
+
+    async def get_activity_log(self, reader, session_id, query):
+        """アクティビティログ取得"""
+        limit = int(query.get('limit', 50))
+        since = datetime.utcnow() - timedelta(days=self.flask_app.config['ACTIVITY_LOG_RETENTION_DAYS'])
+
+        async with reader() as db:
+            activities = (await db.execute(
+                select(ActivityLog).where(
+                    ActivityLog.session_id == session_id,
+                    ActivityLog.created_at >= since
+                ).order_by(ActivityLog.created_at.desc()).limit(limit)
+            )).scalars().all()
+
+        return {
+            'success': True,
+            'activities': [activity.to_dict() for activity in activities]
+        }
+
+
+def create_asgi_app(flask_app, wsgi_threads=None):
+    """Flask アプリの前に非同期の読み取りパスを置いた ASGI アプリを作る"""
+    from a2wsgi import WSGIMiddleware
+
+    if wsgi_threads is None:
+        wsgi_threads = int(os.getenv('GUNICORN_THREADS', '4'))
+    # Flask 側はスレッドプールで並列に動かす（プールサイズはスレッド数に合わせてある）
+    fallback = WSGIMiddleware(flask_app, workers=wsgi_threads)
+    return AsyncReadAPI(flask_app, fallback)
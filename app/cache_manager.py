@@ -2,42 +2,83 @@
 Redisキャッシュ管理
 """
 import redis
-from flask import session
 import json
+import logging
+import threading
+import time
+from flask import session
 from functools import wraps
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
 redis_client = None
 
+# 接続は初回利用時に行う。失敗したら指数バックオフで次の試行まで待つ
+_redis_settings = {}
+_connect_failures = 0
+_next_connect_at = 0.0
+_connect_lock = threading.Lock()
+
 
 def init_cache(app):
-    """Redisキャッシュ初期化"""
-    global redis_client
+    """Redisキャッシュ初期化（設定の登録のみ。接続は初回利用時）"""
+    global redis_client, _redis_settings, _connect_failures, _next_connect_at
+    
+    redis_client = None
+    _connect_failures = 0
+    _next_connect_at = 0.0
     
     redis_url = app.config.get('REDIS_URL')
     if not redis_url:
         app.logger.warning("REDIS_URL not set. Cache disabled.")
-        redis_client = None
+        _redis_settings = {}
         return
 
-    try:
-        redis_client = redis.from_url(
-            redis_url,
-            decode_responses=True,
-            socket_connect_timeout=5,
-            socket_keepalive=True,
-        )
-        redis_client.ping()
-        app.logger.info("Redis cache enabled.")
-    except Exception as e:
-        app.logger.warning(f"Redis init failed: {e}. Cache disabled.")
-        redis_client = None
+    _redis_settings = {
+        'url': redis_url,
+        'connect_timeout': app.config.get('REDIS_CONNECT_TIMEOUT', 1),
+        'base_delay': app.config.get('REDIS_RETRY_BASE_DELAY', 0.5),
+        'max_delay': app.config.get('REDIS_RETRY_MAX_DELAY', 30),
+    }
 
-def get_cache():
-    """Redisクライアント取得"""
+
+def _connect():
+    """Redisへ接続（1回だけ試行し、失敗時は次の試行時刻を後ろへずらす）"""
+    global redis_client, _connect_failures, _next_connect_at
+    
+    with _connect_lock:
+        if redis_client is not None or time.monotonic() < _next_connect_at:
+            return redis_client
+        try:
+            client = redis.from_url(
+                _redis_settings['url'],
+                decode_responses=True,
+                socket_connect_timeout=_redis_settings['connect_timeout'],
+                socket_keepalive=True,
+            )
+            client.ping()
+            redis_client = client
+            _connect_failures = 0
+            logger.info("Redis cache enabled.")
+        except Exception as e:
+            _connect_failures += 1
+            delay = min(
+                _redis_settings['max_delay'],
+                _redis_settings['base_delay'] * (2 ** (_connect_failures - 1))
+            )
+            _next_connect_at = time.monotonic() + delay
+            logger.warning(f"Redis connect failed ({_connect_failures}): {e}. Retry in {delay:.1f}s, cache disabled until then.")
     return redis_client
 
 
+def get_cache():
+    """Redisクライアント取得（未接続なら接続を試みる。使えなければ None）"""
+    if redis_client is not None or not _redis_settings:
+        return redis_client
+    return _connect()
+
+
 def cache_key(prefix, *args):
     """キャッシュキー生成"""
     return f"{prefix}:{':'.join(str(arg) for arg in args)}"
@@ -49,6 +90,7 @@ def cached(prefix, expire=300):
         @wraps(func)
         def wrapper(*args, **kwargs):
             # キャッシュキーの生成
+            redis_client = get_cache()
             if redis_client is None:
                 return func(*args, **kwargs)
 
@@ -77,7 +119,7 @@ def cached(prefix, expire=300):
 
 def invalidate_cache(prefix, *args):
     """キャッシュ無効化"""
-    global redis_client
+    redis_client = get_cache()
     if redis_client is None:
         return
     #key = cache_key(prefix, *args)
@@ -96,6 +138,7 @@ def get_session_id():
 
 def get_session_data(key, default=None):
     """セッションデータ取得"""
+    redis_client = get_cache()
     if redis_client is None:
         return default
 
@@ -106,6 +149,7 @@ def get_session_data(key, default=None):
 
 
 def set_session_data(key, value, expire=None):
+    redis_client = get_cache()
     if redis_client is None:
         return
 
@@ -127,6 +171,7 @@ def set_session_data(key, value, expire=None):
 
 
 def delete_session_data(key):
+    redis_client = get_cache()
     if redis_client is None:
         return
 
@@ -137,6 +182,7 @@ def delete_session_data(key):
 
 
 def get_user_nodes_cache(session_id):
+    redis_client = get_cache()
     if redis_client is None:
         return
 
@@ -147,6 +193,7 @@ def get_user_nodes_cache(session_id):
 
 
 def set_user_nodes_cache(session_id, nodes, expire=3600):
+    redis_client = get_cache()
     if redis_client is None:
         return
 
@@ -160,6 +207,7 @@ def set_user_nodes_cache(session_id, nodes, expire=3600):
 
 
 def invalidate_user_cache(session_id):
+    redis_client = get_cache()
     if redis_client is None:
         return
 
@@ -0,0 +1,176 @@
+"""
+差分同期（GET /api/changes?since=<cursor>）
+
+ノード・位置・接続の変更はトリガーがセッションごとの番号（change_seq）を振る
+（migrations/006_change_feed.sql）。クライアントは /api/nodes で全件とカーソルを受け取り、
+以降は since=カーソル で「それより新しい変更」だけを取得してその場で反映する。
+
+変更の一覧は1つの SQL 文（= 1つのスナップショット）で読むので、返すカーソルより
+小さい番号の変更はすべて結果に含まれている。本体の行は2回目のクエリで読むため
+カーソルより新しい状態が返ることがあるが、反映は上書きなので次回の重複は害が無い。
+カーソルと本体は同じサーバーから読む必要がある（遅れたレプリカの本体とプライマリのカーソルを
+組み合わせると、間の変更を二度と受け取れない）。Flask 側は RoutingSession が1リクエストの
+読み取りの接続先を固定し、非同期パスは1つの reader セッションで読む。
+
+Flask 側（routes.py）と非同期パス（async_api.py）の両方から使う。
+"""
+from .database import read_only_text
+
+# セッションのカーソル（行が無ければ変更なし = 0）
+CURSOR_QUERY = read_only_text("""
+    SELECT last_seq, pruned_through FROM session_change_cursors WHERE session_id = :sid
+""")
+
+# グラフ構造の版（カテゴリ・接続の向きが変わったときだけ進む。migrations/009_structure_version.sql）
+STRUCTURE_QUERY = read_only_text("""
+    SELECT structure_seq FROM session_change_cursors WHERE session_id = :sid
+""")
+
+# since より新しい変更の (種類, id, 番号) と、同じスナップショットでのカーソル行
+CHANGES_QUERY = read_only_text("""
+    SELECT 'node' AS kind, kn.id AS entity_id,
+           GREATEST(kn.change_seq, COALESCE(np.change_seq, 0)) AS seq
+    FROM knowledge_nodes kn
+    LEFT JOIN node_positions np ON np.node_id = kn.id
+    WHERE kn.session_id = :sid
+      AND (kn.change_seq > :since OR np.change_seq > :since)
+    UNION ALL
+    SELECT 'connection', nc.id, nc.change_seq
+    FROM node_connections nc
+    JOIN knowledge_nodes kn ON kn.id = nc.source_node_id
+    WHERE kn.session_id = :sid AND nc.change_seq > :since
+    UNION ALL
+    SELECT 'deleted_' || dr.entity_type, dr.entity_id, dr.change_seq
+    FROM deleted_records dr
+    WHERE dr.session_id = :sid AND dr.change_seq > :since
+    UNION ALL
+    SELECT 'cursor', NULL, c.last_seq
+    FROM session_change_cursors c
+    WHERE c.session_id = :sid
+    UNION ALL
+    SELECT 'pruned', NULL, c.pruned_through
+    FROM session_change_cursors c
+    WHERE c.session_id = :sid
+""")
+
+
+def parse_cursor(value):
+    """クエリ文字列の since を整数に（不正なら None）"""
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor >= 0 else None
+
+
+def cursor_from_row(row):
+    """CURSOR_QUERY の結果からカーソル値"""
+    return row[0] if row is not None else 0
+
+
+def structure_version_from_row(row):
+    """STRUCTURE_QUERY の結果から構造の版"""
+    return row[0] if row is not None else 0
+
+
+def summarize_changes(rows, since):
+    """CHANGES_QUERY の結果を、読み直す id と墓石に分ける
+
+    since がサーバーのカーソルより新しい（別のDBのカーソル等）か、
+    墓石が既に削除された範囲にある場合は reset=True（全件を取り直す）。
+    """
+    summary = {
+        'cursor': 0,
+        'reset': False,
+        'node_ids': [],
+        'connection_ids': [],
+        'deleted_nodes': [],
+        'deleted_connections': [],
+    }
+    pruned_through = 0
+    for kind, entity_id, seq in rows:
+        if kind == 'cursor':
+            summary['cursor'] = seq
+        elif kind == 'pruned':
+            pruned_through = seq
+        elif kind == 'node':
+            summary['node_ids'].append(entity_id)
+        elif kind == 'connection':
+            summary['connection_ids'].append(entity_id)
+        elif kind == 'deleted_node':
+            summary['deleted_nodes'].append(str(entity_id))
+        elif kind == 'deleted_connection':
+            summary['deleted_connections'].append(str(entity_id))
+
+    if since > summary['cursor'] or since < pruned_through:
+        summary['reset'] = True
+    return summary
+
+
+def build_changes_response(summary, nodes, connections):
+    """読み直したノード・接続と墓石からレスポンスを作る
+
+    論理削除済みのノード、読み直した時点で消えていた行も墓石として返す。
+    """
+    deleted_nodes = list(summary['deleted_nodes'])
+    live_nodes = []
+    for node in nodes:
+        if node.is_deleted:
+            deleted_nodes.append(str(node.id))
+        else:
+            live_nodes.append(node.to_dict())
+    found_nodes = {str(node.id) for node in nodes}
+    deleted_nodes += [str(i) for i in summary['node_ids'] if str(i) not in found_nodes]
+
+    found_connections = {str(conn.id) for conn in connections}
+    deleted_connections = list(summary['deleted_connections'])
+    deleted_connections += [str(i) for i in summary['connection_ids'] if str(i) not in found_connections]
+
+    return {
+        'success': True,
+        'cursor': summary['cursor'],
+        'reset': False,
+        'nodes': live_nodes,
+        'connections': [conn.to_dict() for conn in connections],
+        'deleted': {
+            'nodes': deleted_nodes,
+            'connections': deleted_connections,
+        },
+    }
+
+
+def reset_response(summary):
+    return {'success': True, 'cursor': summary['cursor'], 'reset': True}
+
+
+def get_cursor(db, session_id):
+    """セッションの現在のカーソル（全件取得の前に読む）"""
+    return cursor_from_row(db.execute(CURSOR_QUERY, {'sid': session_id}).first())
+
+
+def get_structure_version(db, session_id):
+    """セッションのグラフ構造の版（位置の更新では変わらない。データより先に読む）"""
+    return structure_version_from_row(db.execute(STRUCTURE_QUERY, {'sid': session_id}).first())
+
+
+def get_changes(db, session_id, since):
+    """since より新しい変更（Flask 側）"""
+    from .models import KnowledgeNode, NodeConnection
+
+    rows = db.execute(CHANGES_QUERY, {'sid': session_id, 'since': since}).all()
+    summary = summarize_changes(rows, since)
+    if summary['reset']:
+        return reset_response(summary)
+
+    nodes = []
+    if summary['node_ids']:
+        nodes = db.query(KnowledgeNode).filter(
+            KnowledgeNode.session_id == session_id,
+            KnowledgeNode.id.in_(summary['node_ids'])
+        ).all()
+    connections = []
+    if summary['connection_ids']:
+        connections = db.query(NodeConnection).filter(
+            NodeConnection.id.in_(summary['connection_ids'])
+        ).all()
+    return build_changes_response(summary, nodes, connections)
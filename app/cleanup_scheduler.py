@@ -0,0 +1,215 @@
+"""
+インクリメンタル・クリーンアップスケジューラ
+CleanupService の各タスクを小さなスライスで常時少しずつ実行する
+"""
+import json
+import os
+import socket
+import time
+import uuid
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Redis上のキー
+LEADER_KEY = 'cleanup:leader'
+CURSOR_KEY = 'cleanup:cursor'            # HASH: タスク名 -> 再開位置(JSON)
+METRICS_KEY_PREFIX = 'cleanup:metrics:'  # HASH: タスクごとのメトリクス
+
+# リースの延長／解放は自分が持っている場合だけ行う
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLost(Exception):
+    """スライスの途中でクリーンアップのリースを失った"""
+
+
+class CleanupScheduler:
+    """リーダー選出付きのインクリメンタル・スケジューラ
+
+    - Redisのリース（SET NX PX）を持つ1インスタンスだけがスライスを実行する
+    - タスクを順番に、1スライスあたり CLEANUP_SLICE_SECONDS の時間上限で実行する
+    - 追いついたタスク（Redisスイープは SCAN が一周したとき）は CLEANUP_TASK_IDLE_SECONDS 休ませる
+    - 再開位置とメトリクス（最終実行、削除件数、所要時間）はRedisに保存する
+    - リースはバッチの間（service.batch_hook）でも延長し、失ったらスライスを打ち切る。
+      保存の直前にも延長して確かめ、失っていれば新しいリーダーの再開位置とメトリクスを上書きしない
+
+    DBのタスクは期限切れの行を先頭から消していくので再開位置は不要で、
+    カーソルを持つのは SCAN の位置を覚える Redis スイープだけ。
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.redis_client = service.redis_client
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.lease_ttl = float(os.getenv('CLEANUP_LEASE_TTL', 30))
+        self.slice_seconds = float(os.getenv('CLEANUP_SLICE_SECONDS', 5))
+        self.tick_seconds = float(os.getenv('CLEANUP_TICK_SECONDS', 2))
+        self.idle_seconds = float(os.getenv('CLEANUP_TASK_IDLE_SECONDS', 900))
+
+        self.is_leader = False
+        self._renew = self.redis_client.register_script(_RENEW_SCRIPT)
+        self._release = self.redis_client.register_script(_RELEASE_SCRIPT)
+        service.batch_hook = self._keep_lease
+
+        # (タスク名, 実行関数) の順で巡回する
+        self.tasks = [
+            ('sessions', service.cleanup_old_sessions),
+            ('redis_cache', service.cleanup_redis_cache),
+            ('activity_logs', service.cleanup_old_activity_logs),
+            ('orphaned_analytics', service.cleanup_orphaned_analytics),
+            ('tombstones', service.compact_tombstones),
+            ('change_tombstones', service.prune_change_tombstones),
+        ]
+        self._next_run = {name: 0.0 for name, _ in self.tasks}
+        self._position = 0
+
+    # ===== リーダー選出 =====
+
+    def _hold_lease(self):
+        """リースを取得または延長し、リーダーかどうかを返す"""
+        ttl_ms = int(self.lease_ttl * 1000)
+        try:
+            if self.is_leader:
+                self.is_leader = bool(self._renew(keys=[LEADER_KEY], args=[self.instance_id, ttl_ms]))
+                if not self.is_leader:
+                    logger.warning("クリーンアップのリースを失いました")
+            else:
+                self.is_leader = bool(self.redis_client.set(LEADER_KEY, self.instance_id, nx=True, px=ttl_ms))
+                if self.is_leader:
+                    logger.info(f"クリーンアップのリーダーになりました: {self.instance_id}")
+        except Exception as e:
+            logger.error(f"リース操作エラー: {str(e)}")
+            self.is_leader = False
+        return self.is_leader
+
+    def _keep_lease(self):
+        """バッチの間でリースを延長し、失っていれば LeaseLost でタスクを中断させる
+
+        一度失ったら取り直さない（他のインスタンスが引き継いでいる可能性がある）。
+        """
+        if not self.is_leader or not self._hold_lease():
+            raise LeaseLost(f"クリーンアップのリースを失いました: {self.instance_id}")
+
+    def release(self):
+        """リースを手放す（停止時）"""
+        if not self.is_leader:
+            return
+        try:
+            self._release(keys=[LEADER_KEY], args=[self.instance_id])
+        except Exception as e:
+            logger.error(f"リース解放エラー: {str(e)}")
+        self.is_leader = False
+
+    # ===== カーソル =====
+
+    def _load_cursors(self):
+        """Redisスイープの再開位置を復元"""
+        raw = self.redis_client.hget(CURSOR_KEY, 'redis_cache')
+        self.service._redis_cursors = json.loads(raw) if raw else {}
+
+    def _save_cursors(self):
+        self.redis_client.hset(CURSOR_KEY, 'redis_cache', json.dumps(self.service._redis_cursors))
+
+    # ===== メトリクス =====
+
+    def _record(self, name, rows_removed, duration):
+        key = METRICS_KEY_PREFIX + name
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(key, mapping={
+            'last_run': datetime.utcnow().isoformat(),
+            'last_rows_removed': rows_removed,
+            'last_duration_ms': int(duration * 1000),
+            'instance': self.instance_id,
+        })
+        pipe.hincrby(key, 'total_rows_removed', rows_removed)
+        pipe.hincrby(key, 'slices', 1)
+        pipe.execute()
+
+    def get_metrics(self):
+        """タスクごとのメトリクスを取得"""
+        return {
+            name: self.redis_client.hgetall(METRICS_KEY_PREFIX + name)
+            for name, _ in self.tasks
+        }
+
+    # ===== 実行 =====
+
+    def run_slice(self):
+        """期限の来ているタスクを1つだけ1スライス分実行（実行したタスク名を返す）"""
+        now = time.monotonic()
+        for offset in range(len(self.tasks)):
+            name, task = self.tasks[(self._position + offset) % len(self.tasks)]
+            if self._next_run[name] > now:
+                continue
+            self._position = (self._position + offset + 1) % len(self.tasks)
+
+            if name == 'redis_cache':
+                self._load_cursors()
+
+            started = time.monotonic()
+            try:
+                result = task(time_budget=self.slice_seconds)
+            except LeaseLost:
+                # タスクはロールバックして中断済み
+                logger.warning(f"リースを失ったため {name} を中断しました")
+                return name
+            duration = time.monotonic() - started
+
+            if not self.is_leader or not self._hold_lease():
+                logger.warning(f"リースを失ったため {name} の再開位置とメトリクスを保存しません")
+                return name
+
+            # compact_tombstones はテーブル別の辞書を返す
+            rows_removed = sum(result.values()) if isinstance(result, dict) else int(result or 0)
+
+            if name == 'redis_cache':
+                self._save_cursors()
+            self._record(name, rows_removed, duration)
+
+            if self._caught_up(name, rows_removed):
+                self._next_run[name] = time.monotonic() + self.idle_seconds
+            return name
+        return None
+
+    def _caught_up(self, name, rows_removed):
+        """休ませてよいか
+
+        DBのタスクは何も消えなければ追いついている。Redisスイープは TTL 無しのキーが無いページでも
+        0 を返すので、全パターンの SCAN が一周し終えた（再開位置が残っていない）ときだけ。
+        """
+        if name == 'redis_cache':
+            return not self.service._redis_cursors
+        return rows_removed == 0
+
+    def run_forever(self):
+        """常駐ループ"""
+        logger.info(f"インクリメンタル・クリーンアップ起動: {self.instance_id}")
+        logger.info(f"スライス {self.slice_seconds}秒 / 間隔 {self.tick_seconds}秒 / 休止 {self.idle_seconds}秒")
+
+        try:
+            while True:
+                try:
+                    # スライスが長引いてもリースが切れないよう毎回延長する
+                    if self._hold_lease():
+                        self.run_slice()
+                except Exception as e:
+                    logger.error(f"予期しないエラー: {str(e)}")
+                time.sleep(self.tick_seconds)
+        except KeyboardInterrupt:
+            logger.info("クリーンアップサービス停止")
+        finally:
+            self.release()
@@ -1,154 +1,652 @@
 """
 データ自動クリーンアップサービス
 180日間無操作のデータを自動削除
+
+常駐時は cleanup_scheduler.CleanupScheduler が各タスクを小さなスライスで実行し、
+Redisのリースで複数レプリカのうち1台だけが動く。
+DBのタスクは全シャード（DATABASE_SHARD_URLS）に対して順に実行する。
+  python -m app.cleanup_service           常駐（インクリメンタル）
+  python -m app.cleanup_service --once    全タスクを1回実行
+  python -m app.cleanup_service --status  タスクごとのメトリクス表示
+  python -m app.cleanup_service --stats   シャードごとの件数と合計を表示
 """
 import os
 import time
 import logging
+import re
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 import redis
 
+from app.cleanup_scheduler import LeaseLost
+from app.config import database_shard_urls
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+# 論理削除ノードの物理削除時に先に消す子テーブル（テーブル名, ノードを指す列）
+# node_comments は返信が親へのカスケードで消えないよう新しい順に消す
+TOMBSTONE_CASCADES = (
+    ('node_connections', 'source_node_id'),
+    ('node_connections', 'target_node_id'),
+    ('node_tags', 'node_id'),
+    ('node_versions', 'node_id'),
+    ('node_reactions', 'node_id'),
+    ('node_comments', 'node_id'),
+)
+
+# Redisスイープ対象のキー空間（cache_manager / layout / clusters のキャッシュと Flask-Session）
+REDIS_SWEEP_PATTERNS = ('session:*', 'nodes:*', 'analytics:*', 'layout:*', 'clusters:*', 'neighborhood:*', 'seci_session:*')
+
+# activity_logs の月次パーティション名（activity_logs_pYYYYMM）
+ACTIVITY_LOG_PARTITION_RE = re.compile(r'^activity_logs_p(\d{4})(\d{2})$')
+
+# 管理用の件数集計（シャードごとに実行して合計する）
+STATISTICS_QUERY = """
+    SELECT
+        (SELECT count(*) FROM sessions) AS sessions,
+        (SELECT count(*) FROM sessions WHERE last_activity >= :active_since) AS active_sessions,
+        (SELECT count(*) FROM knowledge_nodes WHERE NOT is_deleted) AS nodes,
+        (SELECT count(*) FROM knowledge_nodes WHERE is_deleted) AS deleted_nodes,
+        (SELECT count(*) FROM node_connections) AS connections,
+        (SELECT count(*) FROM node_comments WHERE NOT is_deleted) AS comments,
+        pg_database_size(current_database()) AS database_bytes
+"""
+
 
 class CleanupService:
     """データクリーンアップサービス"""
     
     def __init__(self):
-        self.database_url = os.getenv('DATABASE_URL')
+        self.database_urls = database_shard_urls()
         self.redis_url = os.getenv('REDIS_URL')
         self.retention_days = int(os.getenv('DATA_RETENTION_DAYS', 180))
-        self.cleanup_interval = int(os.getenv('CLEANUP_INTERVAL', 86400))  # デフォルト24時間
+        self.activity_log_retention_days = int(os.getenv('ACTIVITY_LOG_RETENTION_DAYS', 90))
+        self.activity_log_partitions_ahead = int(os.getenv('ACTIVITY_LOG_PARTITIONS_AHEAD', 3))  # 先行作成する月数
+        self.partition_detach_lock_timeout_ms = int(os.getenv('ACTIVITY_LOG_DETACH_LOCK_TIMEOUT_MS', 2000))  # DEFAULT がある場合の DETACH
+        self.tombstone_grace_days = int(os.getenv('TOMBSTONE_GRACE_DAYS', 30))
+        self.tombstone_batch_size = int(os.getenv('TOMBSTONE_BATCH_SIZE', 200))  # 1バッチのノード数
+        self.tombstone_cascade_cap = int(os.getenv('TOMBSTONE_CASCADE_CAP', 1000))  # 1トランザクションで消す子行数
+        self.change_tombstone_retention_days = int(os.getenv('CHANGE_TOMBSTONE_RETENTION_DAYS', 7))  # 差分同期の墓石
+        
+        # バッチ削除の設定
+        self.batch_size = int(os.getenv('CLEANUP_BATCH_SIZE', 1000))
+        self.session_batch_size = int(os.getenv('CLEANUP_SESSION_BATCH_SIZE', 50))  # カスケードが重いので小さめ
+        self.batch_sleep = float(os.getenv('CLEANUP_BATCH_SLEEP', 0.2))  # バッチ間の待機秒
+        self.pass_time_budget = float(os.getenv('CLEANUP_PASS_TIME_BUDGET', 300))  # 1パスの上限秒
+        self.progress_every = int(os.getenv('CLEANUP_PROGRESS_EVERY', 10))  # 進捗ログのバッチ間隔
+        
+        # Redisスイープの設定
+        self.redis_scan_count = int(os.getenv('REDIS_SWEEP_SCAN_COUNT', 1000))  # SCAN 1回のヒント件数
+        self.redis_sweep_rate = float(os.getenv('REDIS_SWEEP_MAX_KEYS_PER_SEC', 20000))  # 0で無制限
+        self.redis_sweep_time_budget = float(os.getenv('REDIS_SWEEP_TIME_BUDGET', 60))
+        self._redis_cursors = {}  # パターンごとの中断位置
+        self.batch_hook = None  # バッチの間に呼ぶ関数（スケジューラがリースの延長に使う）
         
-        # データベース接続
-        self.engine = create_engine(self.database_url)
-        self.Session = sessionmaker(bind=self.engine)
+        # データベース接続（シャードごと）
+        self.engines = [create_engine(url) for url in self.database_urls]
+        self.shard_sessions = [sessionmaker(bind=engine) for engine in self.engines]
+        self._shard_turns = {}  # タスクごとの次に先頭にするシャード
         
         # Redis接続
         self.redis_client = redis.from_url(self.redis_url, decode_responses=True)
     
-    def cleanup_old_sessions(self):
+    def _throttle(self):
+        """バッチ間のスリープ（本番トラフィックにI/Oとロックを譲る）
+        
+        batch_hook があれば先に呼ぶ。例外を投げればタスクは次のバッチに進まず中断する。
+        """
+        if self.batch_hook is not None:
+            self.batch_hook()
+        if self.batch_sleep > 0:
+            time.sleep(self.batch_sleep)
+    
+    def _deadline(self, time_budget=None):
+        """1パスの打ち切り時刻（time_budget 未指定なら CLEANUP_PASS_TIME_BUDGET）"""
+        if time_budget is None:
+            time_budget = self.pass_time_budget
+        return time.monotonic() + time_budget
+    
+    def _on_each_shard(self, name, task, time_budget=None):
+        """DBタスクを全シャードで実行して結果を合計する
+        
+        時間上限は全シャードで共有し、先頭のシャードを毎回ずらして
+        後ろのシャードが上限切れで後回しにされ続けないようにする。
+        """
+        deadline = self._deadline(time_budget)
+        count = len(self.shard_sessions)
+        start = self._shard_turns.get(name, 0)
+        self._shard_turns[name] = (start + 1) % count
+        
+        total = None
+        for offset in range(count):
+            Session = self.shard_sessions[(start + offset) % count]
+            if self.batch_hook is not None:
+                self.batch_hook()
+            result = task(Session, time_budget=max(0.0, deadline - time.monotonic()))
+            if total is None:
+                total = result
+            elif isinstance(total, dict):
+                total = {key: total.get(key, 0) + result.get(key, 0) for key in total}
+            else:
+                total += result
+            if time.monotonic() >= deadline:
+                break
+        return total
+    
+    def _batched_delete(self, session, label, table, where, params, batch_size, deadline=None, order_by='',
+                        commit=True, max_rows=None):
+        """固定件数ずつ削除してバッチごとにコミット
+        
+        対象を LIMIT n FOR UPDATE SKIP LOCKED で選んで消し、1トランザクションのロックとWALを小さく保つ。
+        選ぶ側は MATERIALIZED の CTE にする（WHERE id IN (サブクエリ) だと Nested Loop Semi Join で
+        サブクエリが外側の行ごとに再実行され、n 件を超えて消すことがある）。
+        deadline を過ぎたら残りは次回に回す。
+        commit=False なら呼び出し側のトランザクションの中で消す（コミットと待機はしない）。
+        max_rows を指定すると合計でその件数まで消して止める。
+        """
+        delete_query = text(f"""
+            WITH batch AS MATERIALIZED (
+                SELECT id FROM {table}
+                WHERE {where}
+                {order_by}
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            DELETE FROM {table}
+            USING batch
+            WHERE {table}.id = batch.id
+        """)
+        deleted = 0
+        batches = 0
+        while True:
+            limit = batch_size if max_rows is None else min(batch_size, max_rows - deleted)
+            if limit <= 0:
+                break
+            result = session.execute(delete_query, {**params, 'batch_size': limit})
+            if commit:
+                session.commit()
+            deleted += result.rowcount
+            batches += 1
+            
+            if result.rowcount < limit:
+                break
+            if batches % self.progress_every == 0:
+                logger.info(f"{label}: {deleted}件削除済み（{batches}バッチ）")
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info(f"{label}: 時間上限に達したため中断（{deleted}件削除、残りは次回）")
+                break
+            if commit:
+                self._throttle()
+        
+        return deleted
+    
+    def cleanup_old_sessions(self, time_budget=None):
+        """古いセッションデータの削除（全シャード）"""
+        return self._on_each_shard('sessions', self._cleanup_old_sessions, time_budget)
+    
+    def _cleanup_old_sessions(self, Session, time_budget=None):
         """古いセッションデータの削除"""
         cutoff_date = datetime.utcnow() - timedelta(days=self.retention_days)
         
-        session = self.Session()
+        session = Session()
         try:
-            # 削除対象のセッション数を取得
-            count_query = text("""
-                SELECT COUNT(*) FROM sessions
-                WHERE last_activity < :cutoff_date
-            """)
-            result = session.execute(count_query, {'cutoff_date': cutoff_date})
-            count = result.scalar()
+            # セッション削除（カスケード削除で関連データも削除）
+            # 1セッションあたりの子行が多いので小さめのバッチで消す
+            deleted_count = self._batched_delete(
+                session,
+                'セッション削除',
+                'sessions',
+                'last_activity < :cutoff_date',
+                {'cutoff_date': cutoff_date},
+                self.session_batch_size,
+                deadline=self._deadline(time_budget)
+            )
             
-            if count > 0:
-                logger.info(f"削除対象セッション: {count}件")
-                
-                # セッション削除（カスケード削除で関連データも削除）
-                delete_query = text("""
-                    DELETE FROM sessions
-                    WHERE last_activity < :cutoff_date
-                """)
-                session.execute(delete_query, {'cutoff_date': cutoff_date})
-                session.commit()
-                
-                logger.info(f"セッション削除完了: {count}件")
+            if deleted_count > 0:
+                logger.info(f"セッション削除完了: {deleted_count}件")
             else:
                 logger.info("削除対象のセッションはありません")
+            return deleted_count
         
+        except LeaseLost:
+            session.rollback()
+            raise
         except Exception as e:
             logger.error(f"セッション削除エラー: {str(e)}")
             session.rollback()
+            return 0
         finally:
             session.close()
     
-    def cleanup_redis_cache(self):
+    def _sweep_redis_page(self, pattern, cursor):
+        """SCAN 1ページ分を TTL 確認・UNLINK ともにパイプラインで処理"""
+        cursor, keys = self.redis_client.scan(
+            cursor=cursor,
+            match=pattern,
+            count=self.redis_scan_count
+        )
+        if not keys:
+            return cursor, 0, 0
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute()
+        
+        # TTLが設定されていないキーを削除（-2 は既に消えているので対象外）
+        stale_keys = [key for key, ttl in zip(keys, ttls) if ttl == -1]
+        if stale_keys:
+            # UNLINK はメモリ解放をバックグラウンドで行うので Redis を止めない
+            self.redis_client.unlink(*stale_keys)
+        
+        return cursor, len(keys), len(stale_keys)
+    
+    def cleanup_redis_cache(self, time_budget=None):
         """古いRedisキャッシュの削除"""
+        if time_budget is None:
+            time_budget = self.redis_sweep_time_budget
+        deadline = time.monotonic() + time_budget
+        started = time.monotonic()
+        scanned_count = 0
+        deleted_count = 0
+        
         try:
-            # セッション関連のキャッシュをスキャン
-            cursor = 0
-            deleted_count = 0
-            
-            while True:
-                cursor, keys = self.redis_client.scan(
-                    cursor=cursor,
-                    match='session:*',
-                    count=100
-                )
+            # 前回時間切れで中断していれば、残りのパターンだけをその位置から再開（0 はまだ始めていない）
+            patterns = [p for p in REDIS_SWEEP_PATTERNS if p in self._redis_cursors] or list(REDIS_SWEEP_PATTERNS)
+            for index, pattern in enumerate(patterns):
+                cursor = self._redis_cursors.get(pattern, 0)
                 
-                for key in keys:
-                    ttl = self.redis_client.ttl(key)
-                    # TTLが設定されていないか、有効期限切れのキーを削除
-                    if ttl == -1 or ttl == -2:
-                        self.redis_client.delete(key)
-                        deleted_count += 1
+                while True:
+                    cursor, scanned, deleted = self._sweep_redis_page(pattern, cursor)
+                    scanned_count += scanned
+                    deleted_count += deleted
+                    
+                    if cursor == 0:
+                        self._redis_cursors.pop(pattern, None)
+                        break
+                    
+                    if time.monotonic() >= deadline:
+                        self._redis_cursors[pattern] = cursor
+                        logger.info(f"Redisスイープ: 時間上限に達したため {pattern} の途中で中断（次回再開）")
+                        break
+                    
+                    if self.batch_hook is not None:
+                        self.batch_hook()
+                    
+                    # レート制限: 走査キー数が上限を超えないよう待機
+                    if self.redis_sweep_rate > 0:
+                        expected = scanned_count / self.redis_sweep_rate
+                        elapsed = time.monotonic() - started
+                        if expected > elapsed:
+                            time.sleep(expected - elapsed)
                 
-                if cursor == 0:
+                if time.monotonic() >= deadline:
+                    # 手を付けていないパターンを残しておく（一周し終えるまでスイープを休ませない）
+                    for rest in patterns[index + 1:]:
+                        self._redis_cursors.setdefault(rest, 0)
                     break
             
             if deleted_count > 0:
-                logger.info(f"Redisキャッシュ削除: {deleted_count}件")
+                logger.info(f"Redisキャッシュ削除: {deleted_count}件（走査 {scanned_count}件）")
             else:
-                logger.info("削除対象のRedisキャッシュはありません")
+                logger.info(f"削除対象のRedisキャッシュはありません（走査 {scanned_count}件）")
         
+        except LeaseLost:
+            raise
         except Exception as e:
             logger.error(f"Redisキャッシュ削除エラー: {str(e)}")
+        
+        return deleted_count
+    
+    def _is_activity_logs_partitioned(self, session):
+        """activity_logs がパーティションテーブルか（003 マイグレーション適用済みか）"""
+        relkind = session.execute(text("""
+            SELECT relkind FROM pg_class WHERE oid = to_regclass('public.activity_logs')
+        """)).scalar()
+        return relkind == 'p'
     
-    def cleanup_old_activity_logs(self):
-        """古いアクティビティログの削除（90日以上）"""
-        cutoff_date = datetime.utcnow() - timedelta(days=90)
+    def drop_expired_activity_log_partitions(self, session, cutoff_date):
+        """保持期間を過ぎた月次パーティションを切り離してから DROP（月全体が期限切れのものだけ）
+        
+        付いたままのパーティションの DROP TABLE は親の activity_logs に ACCESS EXCLUSIVE ロックを取り、
+        ログの読み書きをすべて止めるので、先に DETACH PARTITION ... CONCURRENTLY で切り離す
+        （トランザクションの外で実行する）。DEFAULT パーティションがあると PostgreSQL の制限で
+        CONCURRENTLY は使えないので、通常の DETACH を lock_timeout 付きで行い、ロック待ちで
+        書き込みを止めそうなら次回に回す。削除件数は切り離す前に count(*) で数える。
+        """
+        partitions = session.execute(text("""
+            SELECT c.relname, i.inhdetachpending
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'activity_logs'::regclass
+            ORDER BY c.relname
+        """)).fetchall()
+        session.commit()
+        has_default = any(name == 'activity_logs_default' for name, _ in partitions)
+        
+        # パーティション名 -> 行数
+        dropped = {}
+        with session.get_bind().connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for name, detach_pending in partitions:
+                match = ACTIVITY_LOG_PARTITION_RE.match(name)
+                if not match:
+                    continue
+                year, month = int(match.group(1)), int(match.group(2))
+                # パーティションの上限（翌月1日）が cutoff 以前なら全行が期限切れ
+                upper_bound = datetime(year + month // 12, month % 12 + 1, 1)
+                if upper_bound > cutoff_date:
+                    continue
+                
+                rows = conn.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+                if detach_pending:
+                    # 前回の CONCURRENTLY が中断されていれば完了させる
+                    conn.execute(text(f'ALTER TABLE activity_logs DETACH PARTITION "{name}" FINALIZE'))
+                elif not has_default:
+                    conn.execute(text(f'ALTER TABLE activity_logs DETACH PARTITION "{name}" CONCURRENTLY'))
+                else:
+                    try:
+                        session.execute(text(
+                            f"SET LOCAL lock_timeout = '{self.partition_detach_lock_timeout_ms}ms'"
+                        ))
+                        session.execute(text(f'ALTER TABLE activity_logs DETACH PARTITION "{name}"'))
+                        session.commit()
+                    except OperationalError as e:
+                        session.rollback()
+                        logger.warning(f"パーティション {name} の切り離しを次回に回します: {str(e).splitlines()[0]}")
+                        continue
+                conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                dropped[name] = rows
         
-        session = self.Session()
+        return dropped
+    
+    def cleanup_old_activity_logs(self, time_budget=None):
+        """古いアクティビティログの削除（全シャード）"""
+        return self._on_each_shard('activity_logs', self._cleanup_old_activity_logs, time_budget)
+    
+    def _cleanup_old_activity_logs(self, Session, time_budget=None):
+        """古いアクティビティログの削除（保持期間: ACTIVITY_LOG_RETENTION_DAYS）"""
+        cutoff_date = datetime.utcnow() - timedelta(days=self.activity_log_retention_days)
+        
+        session = Session()
         try:
-            delete_query = text("""
-                DELETE FROM activity_logs
-                WHERE created_at < :cutoff_date
-            """)
-            result = session.execute(delete_query, {'cutoff_date': cutoff_date})
-            session.commit()
+            if self._is_activity_logs_partitioned(session):
+                # 先のパーティションを用意してから、期限切れの月を丸ごと捨てる
+                created = session.execute(text(
+                    "SELECT ensure_activity_log_partitions(:months_ahead)"
+                ), {'months_ahead': self.activity_log_partitions_ahead}).scalar()
+                session.commit()
+                if created:
+                    logger.info(f"アクティビティログのパーティション作成: {created}件")
+                
+                dropped = self.drop_expired_activity_log_partitions(session, cutoff_date)
+                if dropped:
+                    logger.info(f"アクティビティログのパーティション削除: {', '.join(dropped)}")
+                
+                # 月次パーティションの範囲外で DEFAULT パーティションに入った行は行単位で削除
+                default_deleted = 0
+                if session.execute(text("SELECT to_regclass('public.activity_logs_default')")).scalar():
+                    default_deleted = self._batched_delete(
+                        session,
+                        'アクティビティログ削除（DEFAULT パーティション）',
+                        'activity_logs_default',
+                        'created_at < :cutoff_date',
+                        {'cutoff_date': cutoff_date},
+                        self.batch_size,
+                        deadline=self._deadline(time_budget)
+                    )
+                return sum(dropped.values()) + default_deleted
+            
+            # パーティション化前のテーブルは従来どおり行単位で削除
+            deleted_count = self._batched_delete(
+                session,
+                'アクティビティログ削除',
+                'activity_logs',
+                'created_at < :cutoff_date',
+                {'cutoff_date': cutoff_date},
+                self.batch_size,
+                deadline=self._deadline(time_budget)
+            )
             
-            deleted_count = result.rowcount
             if deleted_count > 0:
                 logger.info(f"アクティビティログ削除: {deleted_count}件")
+            return deleted_count
         
+        except LeaseLost:
+            session.rollback()
+            raise
         except Exception as e:
             logger.error(f"アクティビティログ削除エラー: {str(e)}")
             session.rollback()
+            return 0
         finally:
             session.close()
     
-    def cleanup_orphaned_analytics(self):
+    def cleanup_orphaned_analytics(self, time_budget=None):
+        """孤立した分析メトリクスの削除（全シャード）"""
+        return self._on_each_shard('orphaned_analytics', self._cleanup_orphaned_analytics, time_budget)
+    
+    def _cleanup_orphaned_analytics(self, Session, time_budget=None):
         """孤立した分析メトリクスの削除"""
-        session = self.Session()
+        session = Session()
         try:
-            delete_query = text("""
-                DELETE FROM analytics_metrics
-                WHERE session_id NOT IN (SELECT id FROM sessions)
-            """)
-            result = session.execute(delete_query)
-            session.commit()
+            deleted_count = self._batched_delete(
+                session,
+                '孤立分析メトリクス削除',
+                'analytics_metrics',
+                'NOT EXISTS (SELECT 1 FROM sessions s WHERE s.id = analytics_metrics.session_id)',
+                {},
+                self.batch_size,
+                deadline=self._deadline(time_budget)
+            )
             
-            deleted_count = result.rowcount
             if deleted_count > 0:
                 logger.info(f"孤立分析メトリクス削除: {deleted_count}件")
+            return deleted_count
         
+        except LeaseLost:
+            session.rollback()
+            raise
         except Exception as e:
             logger.error(f"孤立分析メトリクス削除エラー: {str(e)}")
             session.rollback()
+            return 0
+        finally:
+            session.close()
+    
+    def compact_tombstones(self, time_budget=None):
+        """論理削除済みノード・コメントの物理削除（全シャード）"""
+        return self._on_each_shard('tombstones', self._compact_tombstones, time_budget)
+    
+    def _compact_tombstones(self, Session, time_budget=None):
+        """論理削除済みノード・コメントの物理削除（猶予期間経過分）"""
+        cutoff_date = datetime.utcnow() - timedelta(days=self.tombstone_grace_days)
+        deadline = self._deadline(time_budget)
+        reclaimed = {table: 0 for table, _ in TOMBSTONE_CASCADES}
+        reclaimed['knowledge_nodes'] = 0
+        
+        session = Session()
+        try:
+            # 1) ノードの墓石: 子行を上限付きで消してから本体を消す。
+            #    SELECT ... FOR UPDATE SKIP LOCKED から本体の削除までを1トランザクションにし、
+            #    並行するワーカーが同じノードを扱わないようにする（ロックはコミットまで保持）。
+            #    1トランザクションで消す子行は tombstone_cascade_cap 件まで。ハブのノードで
+            #    上限に達したらそこまでをコミットし、次のトランザクションでノードをロックし直して続ける
+            select_query = text("""
+                SELECT id FROM knowledge_nodes
+                WHERE is_deleted AND updated_at < :cutoff_date
+                ORDER BY updated_at
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            """)
+            while time.monotonic() < deadline:
+                node_ids = [str(row[0]) for row in session.execute(select_query, {
+                    'cutoff_date': cutoff_date,
+                    'batch_size': self.tombstone_batch_size
+                })]
+                if not node_ids:
+                    session.commit()
+                    break
+                
+                # ノード本体の削除で上限なしのカスケードが走らないよう、子行を先に消し切る
+                batch_reclaimed = {table: 0 for table in reclaimed}
+                budget = self.tombstone_cascade_cap
+                for table, column in TOMBSTONE_CASCADES:
+                    deleted = self._batched_delete(
+                        session,
+                        f'墓石の子行削除 ({table})',
+                        table,
+                        f'{column} = ANY(CAST(:node_ids AS uuid[]))',
+                        {'node_ids': node_ids},
+                        self.tombstone_cascade_cap,
+                        order_by='ORDER BY created_at DESC' if table == 'node_comments' else '',
+                        commit=False,
+                        max_rows=budget
+                    )
+                    batch_reclaimed[table] += deleted
+                    budget -= deleted
+                    if budget <= 0:
+                        break
+                
+                # 上限に達したときは子行が残っているかもしれないので、本体は消さずに
+                # ここまでをコミットして次のトランザクションで続ける
+                if budget > 0:
+                    result = session.execute(text("""
+                        DELETE FROM knowledge_nodes
+                        WHERE id = ANY(CAST(:node_ids AS uuid[])) AND is_deleted
+                    """), {'node_ids': node_ids})
+                    batch_reclaimed['knowledge_nodes'] += result.rowcount
+                session.commit()
+                for table, count in batch_reclaimed.items():
+                    reclaimed[table] += count
+                self._throttle()
+            
+            # 2) コメントの墓石: 生きた返信を巻き込まないよう返信の無いものだけ
+            #    （親は次回以降、子が消えてから回収される）
+            reclaimed['node_comments'] += self._batched_delete(
+                session,
+                '墓石コメント削除',
+                'node_comments',
+                """is_deleted AND updated_at < :cutoff_date
+                   AND NOT EXISTS (
+                       SELECT 1 FROM node_comments r WHERE r.parent_comment_id = node_comments.id
+                   )""",
+                {'cutoff_date': cutoff_date},
+                self.tombstone_cascade_cap,
+                deadline=deadline
+            )
+            
+            total = sum(reclaimed.values())
+            if total > 0:
+                details = ', '.join(f"{table}={count}" for table, count in reclaimed.items() if count)
+                logger.info(f"墓石コンパクション: {total}行回収 ({details})")
+            else:
+                logger.info("回収対象の墓石はありません")
+        
+        except LeaseLost:
+            session.rollback()
+            raise
+        except Exception as e:
+            logger.error(f"墓石コンパクションエラー: {str(e)}")
+            session.rollback()
         finally:
             session.close()
+        
+        return reclaimed
+    
+    def prune_change_tombstones(self, time_budget=None):
+        """差分同期の墓石（deleted_records）の削除（全シャード）"""
+        return self._on_each_shard('change_tombstones', self._prune_change_tombstones, time_budget)
+    
+    def _prune_change_tombstones(self, Session, time_budget=None):
+        """差分同期の墓石の削除（保持期間: CHANGE_TOMBSTONE_RETENTION_DAYS）
+        
+        消した番号までをセッションの pruned_through に記録し、
+        それより古いカーソルのクライアントには全件を取り直させる。
+        """
+        cutoff_date = datetime.utcnow() - timedelta(days=self.change_tombstone_retention_days)
+        deadline = self._deadline(time_budget)
+        prune_query = text("""
+            WITH batch AS MATERIALIZED (
+                SELECT session_id, change_seq FROM deleted_records
+                WHERE deleted_at < :cutoff_date
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            ), pruned AS (
+                DELETE FROM deleted_records d
+                USING batch
+                WHERE d.session_id = batch.session_id AND d.change_seq = batch.change_seq
+                RETURNING d.session_id, d.change_seq
+            ), horizons AS (
+                UPDATE session_change_cursors c
+                SET pruned_through = GREATEST(c.pruned_through, p.max_seq)
+                FROM (
+                    SELECT session_id, max(change_seq) AS max_seq FROM pruned GROUP BY session_id
+                ) p
+                WHERE c.session_id = p.session_id
+            )
+            SELECT count(*) FROM pruned
+        """)
+        
+        session = Session()
+        deleted_count = 0
+        try:
+            while True:
+                batch = session.execute(prune_query, {
+                    'cutoff_date': cutoff_date,
+                    'batch_size': self.batch_size
+                }).scalar()
+                session.commit()
+                deleted_count += batch
+                if batch < self.batch_size or time.monotonic() >= deadline:
+                    break
+                self._throttle()
+            
+            if deleted_count > 0:
+                logger.info(f"差分同期の墓石削除: {deleted_count}件")
+            return deleted_count
+        
+        except LeaseLost:
+            session.rollback()
+            raise
+        except Exception as e:
+            logger.error(f"差分同期の墓石削除エラー: {str(e)}")
+            session.rollback()
+            return deleted_count
+        finally:
+            session.close()
+    
+    def collect_statistics(self, active_days=1):
+        """シャードごとの件数と合計（落ちているシャードは error を入れて合計から除く）"""
+        active_since = datetime.utcnow() - timedelta(days=active_days)
+        per_shard = []
+        total = {}
+        for index, Session in enumerate(self.shard_sessions):
+            session = Session()
+            try:
+                row = session.execute(text(STATISTICS_QUERY), {'active_since': active_since}).mappings().one()
+                stats = dict(row)
+                for key, value in stats.items():
+                    total[key] = total.get(key, 0) + value
+                per_shard.append({'shard': index, **stats})
+            except Exception as e:
+                logger.error(f"シャード{index}の集計エラー: {str(e)}")
+                per_shard.append({'shard': index, 'error': str(e)})
+            finally:
+                session.close()
+        return {'shards': per_shard, 'total': total}
     
     def run_cleanup(self):
         """クリーンアップ実行"""
         logger.info("=" * 50)
         logger.info("データクリーンアップ開始")
         logger.info(f"保持期間: {self.retention_days}日")
+        logger.info(f"シャード数: {len(self.shard_sessions)}")
         logger.info("=" * 50)
         
         # 各クリーンアップ処理を実行
@@ -156,30 +654,42 @@ class CleanupService:
         self.cleanup_redis_cache()
         self.cleanup_old_activity_logs()
         self.cleanup_orphaned_analytics()
+        self.compact_tombstones()
+        self.prune_change_tombstones()
         
         logger.info("=" * 50)
         logger.info("データクリーンアップ完了")
         logger.info("=" * 50)
     
     def run(self):
-        """サービス起動"""
+        """サービス起動（インクリメンタル・スケジューラで常駐）"""
+        from app.cleanup_scheduler import CleanupScheduler
+        
         logger.info(f"クリーンアップサービス起動")
-        logger.info(f"実行間隔: {self.cleanup_interval}秒")
         logger.info(f"データ保持期間: {self.retention_days}日")
+        logger.info(f"墓石の猶予期間: {self.tombstone_grace_days}日")
+        logger.info(f"バッチ: {self.batch_size}件 / 待機 {self.batch_sleep}秒")
         
-        while True:
-            try:
-                self.run_cleanup()
-                logger.info(f"次回実行まで {self.cleanup_interval}秒待機")
-                time.sleep(self.cleanup_interval)
-            except KeyboardInterrupt:
-                logger.info("クリーンアップサービス停止")
-                break
-            except Exception as e:
-                logger.error(f"予期しないエラー: {str(e)}")
-                time.sleep(60)  # エラー時は1分待機
+        CleanupScheduler(self).run_forever()
 
 
 if __name__ == '__main__':
+    import argparse
+    import json
+    
+    parser = argparse.ArgumentParser(description='データ自動クリーンアップサービス')
+    parser.add_argument('--once', action='store_true', help='全タスクを1回だけ実行して終了')
+    parser.add_argument('--status', action='store_true', help='タスクごとのメトリクスを表示して終了')
+    parser.add_argument('--stats', action='store_true', help='シャードごとの件数と合計を表示して終了')
+    args = parser.parse_args()
+    
     service = CleanupService()
-    service.run()
+    if args.stats:
+        print(json.dumps(service.collect_statistics(), ensure_ascii=False, indent=2))
+    elif args.status:
+        from app.cleanup_scheduler import CleanupScheduler
+        print(json.dumps(CleanupScheduler(service).get_metrics(), ensure_ascii=False, indent=2))
+    elif args.once:
+        service.run_cleanup()
+    else:
+        service.run()
@@ -0,0 +1,169 @@
+"""
+縮小表示用のクラスタ要約（GET /api/nodes/clusters?zoom=）
+
+ズームレベルごとに位置をグリッドでまとめ、セルごとの重心・件数・SECI カテゴリ別の件数と、
+セル間の接続数（向き付き）を返す。マッパーは縮小表示中にノードと接続の代わりにこれを描く。
+
+レベルは D3 の拡大率 k から level = floor(log2(k)) で決め（MIN_LEVEL〜0）、
+セルの一辺は画面上で CLUSTER_CELL_PIXELS 程度になるワールド座標の長さにする。
+要約はレベルごとに、差分同期のカーソル（= グラフの版。app/changes.py）をキーに
+Redis へ保存する。ノード・位置・接続が変わればカーソルが進むので古い要約は使われず、
+期限で消える。bbox を渡すと重心が範囲内のクラスタ（と両端がその中にある接続）だけを返し、
+応答を画面に収まる数に抑える。
+"""
+import json
+import logging
+import math
+import os
+
+from .database import read_only_text
+from .session_graph import CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_CELL_PIXELS = float(os.getenv('CLUSTER_CELL_PIXELS', '80'))
+CLUSTER_CACHE_EXPIRE = int(os.getenv('CLUSTER_CACHE_SECONDS', '3600'))
+MIN_LEVEL = -8
+MAX_LEVEL = 0
+
+CLUSTER_NODES_QUERY = read_only_text("""
+    SELECT kn.id, kn.category, COALESCE(np.x, 0), COALESCE(np.y, 0)
+    FROM knowledge_nodes kn
+    LEFT JOIN node_positions np ON np.node_id = kn.id
+    WHERE kn.session_id = :sid AND kn.is_deleted = false
+""")
+
+CLUSTER_EDGES_QUERY = read_only_text("""
+    SELECT nc.source_node_id, nc.target_node_id
+    FROM node_connections nc
+    JOIN knowledge_nodes s ON s.id = nc.source_node_id
+    JOIN knowledge_nodes t ON t.id = nc.target_node_id
+    WHERE s.session_id = :sid AND NOT s.is_deleted AND NOT t.is_deleted
+""")
+
+
+def parse_zoom(value):
+    """クエリ文字列の zoom（D3 の拡大率。不正なら None）"""
+    try:
+        zoom = float(value)
+    except (TypeError, ValueError):
+        return None
+    return zoom if math.isfinite(zoom) and zoom > 0 else None
+
+
+def level_for_zoom(zoom):
+    return max(MIN_LEVEL, min(MAX_LEVEL, math.floor(math.log2(zoom))))
+
+
+def cell_size_for_level(level):
+    """画面上で CLUSTER_CELL_PIXELS になるワールド座標の長さ"""
+    return CLUSTER_CELL_PIXELS / (2.0 ** level)
+
+
+def _cluster_level(nodes, edges, cell_size):
+    cells = {}
+    node_cell = {}
+    for node_id, category, x, y in nodes:
+        key = (math.floor(x / cell_size), math.floor(y / cell_size))
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = {
+                'sx': 0.0, 'sy': 0.0, 'count': 0,
+                'categories': dict.fromkeys(CATEGORIES, 0),
+                'bbox': [x, y, x, y],
+            }
+        cell['sx'] += x
+        cell['sy'] += y
+        cell['count'] += 1
+        cell['categories'][category] = cell['categories'].get(category, 0) + 1
+        bbox = cell['bbox']
+        bbox[0], bbox[1] = min(bbox[0], x), min(bbox[1], y)
+        bbox[2], bbox[3] = max(bbox[2], x), max(bbox[3], y)
+        node_cell[node_id] = key
+
+    weights = {}
+    for source, target in edges:
+        a, b = node_cell.get(source), node_cell.get(target)
+        if a is None or b is None or a == b:
+            continue
+        weights[(a, b)] = weights.get((a, b), 0) + 1
+
+    def cluster_id(key):
+        return f'{key[0]}:{key[1]}'
+
+    return {
+        'cell_size': cell_size,
+        'clusters': [
+            {
+                'id': cluster_id(key),
+                'x': round(cell['sx'] / cell['count'], 1),
+                'y': round(cell['sy'] / cell['count'], 1),
+                'count': cell['count'],
+                'categories': cell['categories'],
+                'bbox': [round(v, 1) for v in cell['bbox']],
+            }
+            for key, cell in cells.items()
+        ],
+        'edges': [
+            {'source': cluster_id(a), 'target': cluster_id(b), 'weight': weight}
+            for (a, b), weight in weights.items()
+        ],
+    }
+
+
+def build_cluster_level(node_rows, edge_rows, level):
+    """レベルの要約（ノードは (id, category, x, y)、接続は (source, target)）"""
+    nodes = [(str(node_id), str(category), float(x), float(y)) for node_id, category, x, y in node_rows]
+    edges = [(str(source), str(target)) for source, target in edge_rows]
+    return _cluster_level(nodes, edges, cell_size_for_level(level))
+
+
+def cache_key(session_id, cursor, level):
+    return f'clusters:{session_id}:{cursor}:{level}'
+
+
+def cluster_response(summary, level, cursor, cached, bbox=None):
+    clusters, edges = summary['clusters'], summary['edges']
+    if bbox is not None:
+        min_x, min_y, max_x, max_y = bbox
+        clusters = [c for c in clusters if min_x <= c['x'] <= max_x and min_y <= c['y'] <= max_y]
+        visible = {c['id'] for c in clusters}
+        edges = [e for e in edges if e['source'] in visible and e['target'] in visible]
+    return {
+        'success': True,
+        'zoom_level': level,
+        'cell_size': summary['cell_size'],
+        'cursor': cursor,
+        'bbox': list(bbox) if bbox is not None else None,
+        'clusters': clusters,
+        'edges': edges,
+        'cached': cached,
+    }
+
+
+def get_clusters(db, session_id, zoom, cursor, bbox=None):
+    """ズームに応じた要約（Flask 側。レベルごとにカーソル単位でキャッシュ）"""
+    from .cache_manager import get_cache
+
+    level = level_for_zoom(zoom)
+    redis_client = get_cache()
+    key = cache_key(session_id, cursor, level)
+    if redis_client is not None:
+        try:
+            data = redis_client.get(key)
+            if data:
+                return cluster_response(json.loads(data), level, cursor, True, bbox)
+        except Exception as e:
+            logger.warning(f"cluster cache get failed: {e}")
+
+    summary = build_cluster_level(
+        db.execute(CLUSTER_NODES_QUERY, {'sid': session_id}).all(),
+        db.execute(CLUSTER_EDGES_QUERY, {'sid': session_id}).all(),
+        level,
+    )
+    if redis_client is not None:
+        try:
+            redis_client.setex(key, CLUSTER_CACHE_EXPIRE, json.dumps(summary))
+        except Exception as e:
+            logger.warning(f"cluster cache set failed: {e}")
+    return cluster_response(summary, level, cursor, False, bbox)
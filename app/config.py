@@ -1,33 +1,80 @@
 # app/config.py
 import os
 from datetime import timedelta
-from redis import Redis
+
+from .profiles import get_profile
+
+
+def normalize_database_url(url):
+    """まれに postgres:// が来るケースの保険"""
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def database_shard_urls():
+    """シャードの接続先（DATABASE_SHARD_URLS 未設定なら DATABASE_URL の1台）"""
+    urls = [u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+    if not urls and os.getenv("DATABASE_URL"):
+        urls = [os.getenv("DATABASE_URL")]
+    return [normalize_database_url(u) for u in urls]
+
+
+def database_shard_read_urls():
+    """シャードごとの読み取りレプリカ（順番は DATABASE_SHARD_URLS と同じ。空欄はレプリカ無し）"""
+    raw = os.getenv("DATABASE_SHARD_READ_URLS")
+    if raw is None:
+        raw = os.getenv("DATABASE_READ_URL", "")
+    return [normalize_database_url(u.strip()) or None for u in raw.split(",")]
 
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
     FLASK_ENV = os.getenv("FLASK_ENV", "production")
     MAX_NODES_PER_USER = int(os.getenv("MAX_NODES_PER_USER", "200"))
+    # アクティビティログの保持日数（cleanup_service と同じ値。取得時のパーティション絞り込みにも使う）
+    ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_RETENTION_DAYS", "90"))
 
     # ---- DB ----
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+    DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL"))
 
-    SQLALCHEMY_DATABASE_URI = DATABASE_URL
+    # シャード（任意）。セッションキーのハッシュで振り分ける（database.py）
+    DATABASE_SHARD_URLS = database_shard_urls()
+    SQLALCHEMY_DATABASE_URI = DATABASE_SHARD_URLS[0] if DATABASE_SHARD_URLS else DATABASE_URL
+
+    # 読み取りレプリカ（任意）。GET リクエストの SELECT をこちらへ送る
+    DATABASE_SHARD_READ_URLS = database_shard_read_urls()
+    # 書き込み後この秒数は同じユーザーの読み取りをプライマリへ
+    DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+    # レプリカの遅延がこれを超えたらプライマリへ（確認は DB_READ_CHECK_SECONDS ごと）
+    DB_READ_MAX_LAG_SECONDS = float(os.getenv("DB_READ_MAX_LAG_SECONDS", "10"))
+    DB_READ_CHECK_SECONDS = float(os.getenv("DB_READ_CHECK_SECONDS", "5"))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # これが無いと database.py 側で KeyError になり得る
-    SQLALCHEMY_ENGINE_OPTIONS = {}
+    # connect_timeout で遅いDBに初回接続が張り付かないようにする
+    # プール設定は gunicorn と同じ DEPLOY_PROFILE から取る（app/profiles.py）
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+    _profile = get_profile()  # 小文字なので Flask の config には入らない
+    DEPLOY_PROFILE = _profile.name
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        **_profile.engine_options(),
+        "connect_args": {"connect_timeout": DB_CONNECT_TIMEOUT},
+    }
 
     # ---- Redis (任意) ----
     # Render 無料で Redis を使わないなら、REDIS_URL は未設定でOK（=無効化）
+    # クライアントは import 時には作らず create_app / 初回利用時に作る
     REDIS_URL = os.getenv("REDIS_URL", "")
     if REDIS_URL:
         SESSION_TYPE = "redis"
-        SESSION_REDIS = Redis.from_url(REDIS_URL)
     else:
         SESSION_TYPE = "filesystem"
-        SESSION_REDIS = None
+    SESSION_REDIS = None
+
+    # 接続タイムアウトと再接続のバックオフ（秒）
+    REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1"))
+    REDIS_RETRY_BASE_DELAY = float(os.getenv("REDIS_RETRY_BASE_DELAY", "0.5"))
+    REDIS_RETRY_MAX_DELAY = float(os.getenv("REDIS_RETRY_MAX_DELAY", "30"))
 
     SESSION_PERMANENT = True
     SESSION_USE_SIGNER = True
@@ -40,3 +87,6 @@ class Config:
 
     SITE_URL = os.getenv("SITE_URL", "https://seci-p6co.onrender.com")
 
+    # ---- Readiness (/ready) ----
+    READY_CACHE_SECONDS = float(os.getenv("READY_CACHE_SECONDS", "5"))
+    READY_CHECK_ATTEMPTS = int(os.getenv("READY_CHECK_ATTEMPTS", "3"))
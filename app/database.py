@@ -1,34 +1,240 @@
 """
 データベース接続管理
+
+シャーディング:
+  DATABASE_SHARD_URLS（カンマ区切り）を設定すると、セッションキーのハッシュで
+  N 台のデータベースのどれか1台にそのセッションの全データを置く。スキーマはすべて
+  session_id で区切られているので、1リクエストは1シャードで完結する。
+  require_session が use_shard_for_key() でシャードを決め、以降 db_session は
+  そのシャードのエンジンを使う。未設定なら DATABASE_URL の1台だけ（シャード0）。
+  シャード数を変えるとキーの割り当てが変わるので、増設時はデータの移行が必要。
+  他のセッションのノードは別のシャードにあり得るので、ノードを id で引く処理は必ず
+  session_id（= リクエストのセッション）でも絞る（タグ・リアクション・コメント・バージョンも同じ）。
+
+読み取りレプリカ:
+  DATABASE_READ_URL（シャード構成では DATABASE_SHARD_READ_URLS）が設定されていれば、
+  GET / HEAD リクエスト中の SELECT を読み取りレプリカへ送る。text() の生 SQL は中身を
+  判定できないので、read_only_text() で作った（execution_options(read_only=True) の）文だけを
+  SELECT と同じ扱いにする。1リクエストの読み取りは最初に選んだ接続先（レプリカかプライマリ）に
+  固定し、差分同期のカーソルとデータを別々のサーバーから読まないようにする。
+  次の場合はプライマリを使う。
+  - sessions テーブル（作成直後のセッションをレプリカが知らないことがある）
+  - 書き込み、SELECT ... FOR UPDATE、リクエスト外（クリーンアップ等）の処理
+  - 同じリクエスト内で書き込んだ後
+  - 書き込みから DB_READ_YOUR_WRITES_SECONDS 秒以内の同じユーザー（Flask セッションに記録）
+  - レプリカに接続できない / 遅延が DB_READ_MAX_LAG_SECONDS を超えているとき
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+import hashlib
+import logging
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import scoped_session, sessionmaker, Session as OrmSession
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import TextClause
 from contextlib import contextmanager
+from flask import g, has_app_context, has_request_context, request, session as flask_session
+
+logger = logging.getLogger(__name__)
 
 db_session = None
-engine = None
+shards = []
+
+# エンジンは初回利用時に作る（ワーカー起動をDBの応答待ちにしない）
+_engine_options = {}
+_engine_lock = threading.Lock()
+
+# 読み取りレプリカの設定（状態はシャードごとに DB_READ_CHECK_SECONDS の間キャッシュ）
+_read_settings = {'read_your_writes': 5.0, 'max_lag': 10.0, 'check_interval': 5.0}
+
+# Flask セッションに保存する「この時刻まではプライマリから読む」のキー
+PRIMARY_UNTIL_KEY = 'db_primary_until'
+
+# このリクエストの読み取りの接続先（Session.info に保存。1リクエスト1つに固定する）
+READ_ENGINE_KEY = 'read_engine'
+
+
+def read_only_text(sql):
+    """レプリカから読んでよい生 SQL（GET / HEAD 中は ORM の SELECT と同じく振り分ける）"""
+    return text(sql).execution_options(read_only=True)
+
+
+class Shard:
+    """1台分のデータベース（プライマリと任意の読み取りレプリカ）"""
+
+    def __init__(self, index, url, read_url=None):
+        self.index = index
+        self.url = url
+        self.read_url = read_url or None
+        self.engine = None
+        self.read_engine = None
+        self.replica_state = {'ok': False, 'checked_at': 0.0}
+        self._replica_lock = threading.Lock()
+
+    def get_engine(self):
+        """プライマリのエンジン（未作成なら作成）"""
+        if self.engine is None:
+            with _engine_lock:
+                if self.engine is None:
+                    self.engine = create_engine(self.url, **_engine_options)
+        return self.engine
+
+    def get_read_engine(self):
+        """読み取りレプリカのエンジン（未設定なら None）"""
+        if self.read_engine is None and self.read_url:
+            with _engine_lock:
+                if self.read_engine is None:
+                    new_engine = create_engine(self.read_url, **_engine_options)
+                    event.listen(new_engine, 'handle_error', self._on_replica_error)
+                    self.read_engine = new_engine
+        return self.read_engine
+
+    def _on_replica_error(self, context):
+        """レプリカで接続エラーが出たら次の確認まで使わない"""
+        if context.is_disconnect or context.connection is None:
+            self.replica_state.update(ok=False, checked_at=time.monotonic())
+            logger.warning(f"read replica of shard {self.index} marked unavailable: {context.original_exception}")
+
+    def _check_replica(self):
+        """レプリカに接続でき、遅延が許容範囲か"""
+        try:
+            with self.get_read_engine().connect() as conn:
+                # 受信済みの WAL をすべて適用済みなら遅延なし（更新が無いだけのレプリカを遅延扱いしない）
+                lag = conn.execute(text("""
+                    SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                    END
+                """)).scalar()
+        except Exception as e:
+            logger.warning(f"read replica check of shard {self.index} failed: {e}")
+            return False
+        if lag > _read_settings['max_lag']:
+            logger.warning(f"read replica lag of shard {self.index} {lag:.1f}s exceeds {_read_settings['max_lag']}s")
+            return False
+        return True
+
+    def replica_available(self):
+        """レプリカを読み取りに使ってよいか（結果は DB_READ_CHECK_SECONDS の間キャッシュ）"""
+        if self.get_read_engine() is None:
+            return False
+        state = self.replica_state
+        if time.monotonic() - state['checked_at'] < _read_settings['check_interval']:
+            return state['ok']
+
+        # 確認は1スレッドだけが行い、他は前回の結果を使う
+        if not self._replica_lock.acquire(blocking=False):
+            return state['ok']
+        try:
+            state.update(ok=self._check_replica(), checked_at=time.monotonic())
+            return state['ok']
+        finally:
+            self._replica_lock.release()
+
+    def dispose(self, close=True):
+        for shard_engine in (self.engine, self.read_engine):
+            if shard_engine is not None:
+                shard_engine.dispose(close=close)
+
+
+def shard_index_for_key(session_key, shard_count=None):
+    """セッションキーからシャード番号を決める（プロセスをまたいで安定なハッシュ）"""
+    if shard_count is None:
+        shard_count = len(shards)
+    if shard_count <= 1:
+        return 0
+    digest = hashlib.blake2b(str(session_key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+
+def use_shard_for_key(session_key):
+    """このリクエストで使うシャードをセッションキーから決める"""
+    g.shard_index = shard_index_for_key(session_key)
+    return shards[g.shard_index]
+
+
+def current_shard():
+    """このリクエストのシャード（未決定・リクエスト外ならシャード0）"""
+    if has_app_context():
+        return shards[g.get('shard_index', 0)]
+    return shards[0]
+
+
+class RoutingSession(OrmSession):
+    """リクエストのシャードと文の種類で接続先を選ぶセッション"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard = current_shard()
+        if not shard.read_url or not self._may_read_from_replica(mapper, clause):
+            return shard.get_engine()
+        # 最初の読み取りで決めた接続先を使い続ける（途中でレプリカの状態が変わっても混ぜない）
+        chosen = self.info.get(READ_ENGINE_KEY)
+        if chosen is None or chosen[0] != shard.index:
+            engine = shard.get_read_engine() if shard.replica_available() else shard.get_engine()
+            chosen = self.info[READ_ENGINE_KEY] = (shard.index, engine)
+        return chosen[1]
+
+    def _may_read_from_replica(self, mapper, clause):
+        if self._flushing or self.info.get('wrote'):
+            return False
+        if isinstance(clause, TextClause):
+            if not clause.get_execution_options().get('read_only'):
+                return False
+        elif not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return False
+        if mapper is not None and mapper.persist_selectable.name == 'sessions':
+            return False
+        if not has_request_context() or request.method not in ('GET', 'HEAD'):
+            return False
+        return not is_pinned_to_primary()
+
+
+def is_pinned_to_primary(session_data=None):
+    """直近に書き込んだユーザーか（Flask セッションの記録を見る）"""
+    if session_data is None:
+        session_data = flask_session
+    return session_data.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+def _pin_to_primary(db, flush_context):
+    """セッション以外の行を書いたら、このリクエストと直後の数秒はプライマリから読む"""
+    from .models import Session as UserSession
+
+    written = list(db.new) + list(db.dirty) + list(db.deleted)
+    if not any(not isinstance(obj, UserSession) for obj in written):
+        return
+    db.info['wrote'] = True
+    if has_request_context():
+        flask_session[PRIMARY_UNTIL_KEY] = time.time() + _read_settings['read_your_writes']
+
 
 def init_db(app):
-    """データベース初期化"""
-    db_url = app.config.get("SQLALCHEMY_DATABASE_URI")
-    if not db_url:
+    """データベース初期化（設定の登録のみ。接続は初回利用時）"""
+    shard_urls = app.config.get("DATABASE_SHARD_URLS") or []
+    if not shard_urls:
         raise RuntimeError("DATABASE_URL is not set. Please set DATABASE_URL in Render Environment.")
 
-    global db_session, engine
-    
-    engine = create_engine(
-    app.config["SQLALCHEMY_DATABASE_URI"],
-    **(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
-    )
-    
+    global db_session, shards, _engine_options
+    read_urls = list(app.config.get("DATABASE_SHARD_READ_URLS") or [])
+    read_urls += [None] * (len(shard_urls) - len(read_urls))
+    shards = [Shard(i, url, read_url) for i, (url, read_url) in enumerate(zip(shard_urls, read_urls))]
+    _engine_options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    _read_settings.update({
+        'read_your_writes': app.config.get("DB_READ_YOUR_WRITES_SECONDS", 5),
+        'max_lag': app.config.get("DB_READ_MAX_LAG_SECONDS", 10),
+        'check_interval': app.config.get("DB_READ_CHECK_SECONDS", 5),
+    })
+
     db_session = scoped_session(
         sessionmaker(
+            class_=RoutingSession,
             autocommit=False,
-            autoflush=False,
-            bind=engine
+            autoflush=False
         )
     )
-    
+    event.listen(db_session, 'after_flush', _pin_to_primary)
+
     # アプリケーションコンテキストにDB sessionを追加
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -36,6 +242,16 @@ def init_db(app):
             db_session.remove()
 
 
+def get_engine():
+    """このリクエストのシャードのプライマリエンジン"""
+    return current_shard().get_engine()
+
+
+def replica_available():
+    """このリクエストのシャードでレプリカを読み取りに使ってよいか"""
+    return current_shard().replica_available()
+
+
 @contextmanager
 def get_db():
     """データベースセッションのコンテキストマネージャー"""
@@ -50,5 +266,5 @@ def get_db():
 
 
 def get_session():
-    """データベースセッション取得"""
+    """データベースセッション取得（このリクエストのシャード）"""
     return db_session
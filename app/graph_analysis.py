@@ -0,0 +1,173 @@
+"""
+SECI スパイラルの分析（完全な S→E→C→I→S の循環と、理想的な遷移の最長の連鎖）
+
+AnalyticsEngine.analyze_flow_quality は理想的な遷移（共同化→表出化 など）を1本ずつ
+数えるだけで、4つのフェーズを一周する知識のスパイラルがあるかは分からない。
+
+理想的な遷移だけを残すと、各ノードの行き先は「次のフェーズ」のノードに限られる
+（カテゴリで層に分かれた4部グラフ）。SessionGraph（app/session_graph.py）の
+ideal_flows() で CSR のままこの部分グラフを作り、
+  - 循環: (共同化 s, 連結化 c) の組ごとに s→e→c の経路数と c→i→s の経路数を数えて掛ける。
+    手間は中間ノードごとの 入次数×出次数 の和（ウェッジ数）で、疎なグラフではほぼ線形。
+    SPIRAL_MAX_WEDGES を超えたら打ち切って truncated にする
+  - 最長の連鎖: 層をたどる動的計画法を SPIRAL_MAX_CHAIN 本まで繰り返す（1回 O(理想的な遷移数)）。
+    理想的な遷移の閉路は必ず4フェーズを一周するので、上限に達した（capped）ときは
+    スパイラルが回り続けている
+
+結果はグラフ構造の版（app/changes.py の get_structure_version。位置の更新では進まない）
+ごとに Redis へ保存する。
+"""
+import json
+import logging
+import os
+from array import array
+
+from .session_graph import CATEGORY_CODES
+
+logger = logging.getLogger(__name__)
+
+SPIRAL_MAX_WEDGES = int(os.getenv('SPIRAL_MAX_WEDGES', '2000000'))
+SPIRAL_MAX_CHAIN = int(os.getenv('SPIRAL_MAX_CHAIN', '12'))
+SPIRAL_CACHE_EXPIRE = int(os.getenv('SPIRAL_CACHE_SECONDS', '3600'))
+SAMPLE_CYCLES = 5
+
+
+def _wedges(graph, phase):
+    """phase の層を中間にした2歩の経路数 {(前の層のノード, 次の層のノード): 本数}"""
+    counts = {}
+    work = 0
+    for middle in graph.nodes_of(phase):
+        before = graph.predecessors(middle)
+        after = graph.successors(middle)
+        work += len(before) * len(after)
+        if work > SPIRAL_MAX_WEDGES:
+            return counts, work, True
+        for a in before:
+            for b in after:
+                counts[(a, b)] = counts.get((a, b), 0) + 1
+    return counts, work, False
+
+
+def count_cycles(graph):
+    """完全な循環 S→E→C→I→S の数・循環に含まれるノード・例（graph は ideal_flows() のもの）"""
+    # s→e→c と c→i→s
+    first, work_first, truncated = _wedges(graph, CATEGORY_CODES['externalization'])
+    second, work_second, truncated_second = ({}, 0, True) if truncated else _wedges(
+        graph, CATEGORY_CODES['internalization']
+    )
+    truncated = truncated or truncated_second
+
+    closing = {(s, c) for (s, c) in first if (c, s) in second}
+    cycles = sum(first[pair] * second[(pair[1], pair[0])] for pair in closing)
+
+    # 循環に含まれるノード: 閉じる組 (s, c) の両端と、その間の e / i
+    members = set()
+    for s, c in closing:
+        members.add(s)
+        members.add(c)
+    if not truncated:
+        for e in graph.nodes_of(CATEGORY_CODES['externalization']):
+            if any((s, c) in closing for s in graph.predecessors(e) for c in graph.successors(e)):
+                members.add(e)
+        for i in graph.nodes_of(CATEGORY_CODES['internalization']):
+            if any((s, c) in closing for c in graph.predecessors(i) for s in graph.successors(i)):
+                members.add(i)
+
+    samples = []
+    for s, c in sorted(closing)[:SAMPLE_CYCLES]:
+        e = next(e for e in graph.successors(s) if c in graph.successors(e))
+        i = next(i for i in graph.successors(c) if s in graph.successors(i))
+        samples.append([graph.ids[n] for n in (s, e, c, i)])
+
+    return {
+        'complete_cycles': cycles,
+        'nodes_in_cycles': len(members),
+        'sample_cycles': samples,
+        'truncated': truncated,
+        'work': work_first + work_second,
+    }
+
+
+def longest_chain(graph, max_length=None):
+    """理想的な遷移をたどる最長の連鎖（max_length 本で打ち切り。graph は ideal_flows() のもの）"""
+    if max_length is None:
+        max_length = SPIRAL_MAX_CHAIN
+    size = len(graph.ids)
+    if graph.edge_count == 0:
+        return {'length': 0, 'nodes': [], 'capped': False}
+
+    # 層 k: 長さ k の連鎖の終点になれるノードと、その1つ前のノード
+    reachable = [True] * size
+    parents = []
+    for _ in range(max_length):
+        parent = array('i', [-1]) * size
+        extended = False
+        for source in range(size):
+            if not reachable[source]:
+                continue
+            for target in graph.successors(source):
+                if parent[target] < 0:
+                    parent[target] = source
+                    extended = True
+        if not extended:
+            break
+        parents.append(parent)
+        reachable = [p >= 0 for p in parent]
+
+    end = next(i for i, p in enumerate(parents[-1]) if p >= 0)
+    chain = [end]
+    for parent in reversed(parents):
+        chain.append(parent[chain[-1]])
+    chain.reverse()
+    return {
+        'length': len(parents),
+        'nodes': [graph.ids[i] for i in chain],
+        'capped': len(parents) == max_length,
+    }
+
+
+def analyze_spiral(graph):
+    """SessionGraph のスパイラル分析"""
+    ideal = graph.ideal_flows()
+    cycles = count_cycles(ideal)
+    return {
+        'complete_cycles': cycles['complete_cycles'],
+        'nodes_in_cycles': cycles['nodes_in_cycles'],
+        'coverage_percentage': round(cycles['nodes_in_cycles'] / len(graph) * 100, 1) if len(graph) else 0,
+        'sample_cycles': cycles['sample_cycles'],
+        'truncated': cycles['truncated'],
+        'longest_chain': longest_chain(ideal),
+    }
+
+
+def cache_key(session_id, structure_version):
+    # 差分同期のカーソルで保存していた analytics:spiral:<sid>:<cursor> と番号が混ざらないよう別の接頭辞
+    return f'analytics:spiral-structure:{session_id}:{structure_version}'
+
+
+def get_cached_spiral(session_id, structure_version):
+    """キャッシュ済みのスパイラル分析（Flask 側。無ければ None）"""
+    from .cache_manager import get_cache
+
+    redis_client = get_cache()
+    if redis_client is None:
+        return None
+    try:
+        data = redis_client.get(cache_key(session_id, structure_version))
+        return json.loads(data) if data else None
+    except Exception as e:
+        logger.warning(f"spiral cache get failed: {e}")
+        return None
+
+
+def cache_spiral(session_id, structure_version, result):
+    """スパイラル分析をキャッシュする（Flask 側）"""
+    from .cache_manager import get_cache
+
+    redis_client = get_cache()
+    if redis_client is None:
+        return
+    try:
+        redis_client.setex(cache_key(session_id, structure_version), SPIRAL_CACHE_EXPIRE, json.dumps(result))
+    except Exception as e:
+        logger.warning(f"spiral cache set failed: {e}")
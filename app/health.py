@@ -0,0 +1,95 @@
+"""
+依存サービスのヘルスチェック（/ready 用）
+"""
+import threading
+import time
+from sqlalchemy import text
+
+from . import database
+from .cache_manager import get_cache
+
+_ready_cache = {'checked_at': 0.0, 'result': None}
+_ready_lock = threading.Lock()
+
+
+def retry_with_backoff(func, attempts=3, base_delay=0.2, max_delay=2.0):
+    """func を最大 attempts 回、指数バックオフで再試行（最後の例外はそのまま送出）"""
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(min(max_delay, base_delay * (2 ** attempt)))
+
+
+def check_shard(shard, attempts=3):
+    """シャード1台の PostgreSQL に SELECT 1 が通るか"""
+    def ping():
+        with shard.get_engine().connect() as conn:
+            conn.execute(text('SELECT 1'))
+
+    started = time.monotonic()
+    try:
+        retry_with_backoff(ping, attempts=attempts)
+        return {'ok': True, 'latency_ms': round((time.monotonic() - started) * 1000, 1)}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+
+
+def check_database(attempts=3):
+    """全シャードに SELECT 1 が通るか（1台でも落ちていればそのシャードのユーザーは使えない）"""
+    results = [check_shard(shard, attempts) for shard in database.shards]
+    if len(results) == 1:
+        return results[0]
+    return {
+        'ok': all(r['ok'] for r in results),
+        'shards': {str(i): r for i, r in enumerate(results)},
+    }
+
+
+def check_redis(app, attempts=3):
+    """Redis に PING が通るか（REDIS_URL 未設定なら対象外）"""
+    if not app.config.get('REDIS_URL'):
+        return {'ok': True, 'skipped': True}
+
+    def ping():
+        client = get_cache()
+        if client is None:
+            raise RuntimeError('Redis is not connected')
+        client.ping()
+
+    started = time.monotonic()
+    try:
+        retry_with_backoff(ping, attempts=attempts)
+        return {'ok': True, 'latency_ms': round((time.monotonic() - started) * 1000, 1)}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+
+
+def readiness(app):
+    """依存サービスの状態（READY_CACHE_SECONDS の間は前回の結果を返す）"""
+    ttl = app.config.get('READY_CACHE_SECONDS', 5)
+    now = time.monotonic()
+    cached = _ready_cache['result']
+    if cached is not None and now - _ready_cache['checked_at'] < ttl:
+        return cached
+
+    # 同時に来たプローブは1つだけが実際に確認する
+    with _ready_lock:
+        cached = _ready_cache['result']
+        if cached is not None and time.monotonic() - _ready_cache['checked_at'] < ttl:
+            return cached
+
+        attempts = app.config.get('READY_CHECK_ATTEMPTS', 3)
+        checks = {
+            'database': check_database(attempts),
+            'redis': check_redis(app, attempts),
+        }
+        result = {
+            'status': 'ready' if all(c['ok'] for c in checks.values()) else 'unavailable',
+            'checks': checks,
+        }
+        _ready_cache['result'] = result
+        _ready_cache['checked_at'] = time.monotonic()
+        return result
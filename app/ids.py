@@ -0,0 +1,49 @@
+"""
+主キー用の UUIDv7（RFC 9562）
+
+先頭 48bit がミリ秒の UNIX 時刻なので、新しい行のキーは B-tree の右端に集まり、
+ランダムな v4 のようにページ分割やキャッシュミスを起こさない。
+形式は通常の UUID と同じなので API の見た目（文字列の id）は変わらない。
+
+同じミリ秒内では rand_a（12bit）をカウンタとして使い、プロセス内で単調増加にする。
+SQL 側のデフォルトは migrations/004_uuid_v7_keys.sql の uuid_generate_v7()。
+"""
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+_COUNTER_MAX = 0xFFF
+
+
+def uuid7():
+    """時刻順に並ぶ UUID（バージョン7）"""
+    global _last_ms, _counter
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # カウンタの初期値は乱数の下位側から始め、同一ミリ秒での桁あふれを避ける
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            # 時計が戻った・同じミリ秒: 直前の時刻のままカウンタを進める
+            _counter += 1
+            if _counter > _COUNTER_MAX:
+                _last_ms += 1
+                _counter = 0
+        unix_ts_ms = _last_ms
+        rand_a = _counter
+
+    rand_b = int.from_bytes(os.urandom(8), 'big') & 0x3FFF_FFFF_FFFF_FFFF
+
+    value = (unix_ts_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76            # version
+    value |= rand_a << 64
+    value |= 0b10 << 62           # variant (RFC 9562)
+    value |= rand_b
+    return uuid.UUID(int=value)
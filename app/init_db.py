@@ -1,46 +1,269 @@
 # app/init_db.py
+"""
+バージョン管理されたマイグレーションランナー
+
+migrations/NNN_name.sql を番号順に1回ずつ適用し、schema_migrations に記録する。
+起動ごとに実行されるが、スキーマが最新なら schema_migrations を1回読むだけで終わる。
+activity_logs の先の月次パーティションはクリーンアップジョブが作る。ジョブを動かさない環境では
+--partitions を cron などから呼ぶ（それまでの行は DEFAULT パーティションが受ける）。
+複数コンテナが同時に起動しても advisory lock で適用は1台ずつになる。
+先頭に "-- migrate:no-transaction" の行があるファイルは、CREATE INDEX CONCURRENTLY のように
+トランザクションの中で実行できない文のために1文ずつ autocommit で実行する。
+DATABASE_SHARD_URLS が設定されていれば全シャードに同じマイグレーションを適用する。
+
+  python -m app.init_db           未適用のマイグレーションを適用
+  python -m app.init_db --status  適用状況を表示
+  python -m app.init_db --partitions  activity_logs の先の月次パーティションを作成
+"""
+import argparse
+import hashlib
 import os
+import re
+import sys
+import time
 from pathlib import Path
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
 
-# ★ ここはあなたの models.py が Base = declarative_base() を持っている前提
-from app.models import Base
-import app.models  # モデル定義を確実に読み込ませる（副作用でテーブル定義が揃う）
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+MIGRATION_FILE_RE = re.compile(r"^(\d{3})_(\w+)\.sql$")
 
-def main():
-    db_url = os.getenv("DATABASE_URL")
-    if not db_url:
+# pg_advisory_lock のキー（このアプリのマイグレーション専用）
+MIGRATION_LOCK_KEY = 0x5EC1_0001
+# 他のコンテナが適用中のときにロックを取り直す間隔（秒）
+MIGRATION_LOCK_POLL_SECONDS = 1.0
+
+# この行があるファイルはトランザクションで包まず、1文ずつ autocommit で実行する。
+# 途中で失敗すると実行済みの文は残るので、各文は再実行できるように書く（$$ の関数本体は書けない）
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+# --partitions で先行作成する activity_logs の月数（CleanupService と同じ設定）
+ACTIVITY_LOG_PARTITIONS_AHEAD = int(os.getenv("ACTIVITY_LOG_PARTITIONS_AHEAD", "3"))
+
+
+class Migration:
+    """マイグレーションファイル1つ分"""
+
+    def __init__(self, path):
+        match = MIGRATION_FILE_RE.match(path.name)
+        self.path = path
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.sql = path.read_text(encoding="utf-8")
+        self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+        self.transactional = NO_TRANSACTION_MARKER not in (line.strip() for line in self.sql.splitlines())
+
+    def statements(self):
+        """no-transaction のファイルを文に分ける（行コメントを除いて ; で区切る）"""
+        body = "\n".join(line for line in self.sql.splitlines() if not line.lstrip().startswith("--"))
+        return [stmt.strip() for stmt in body.split(";") if stmt.strip()]
+
+
+def discover_migrations(migrations_dir=MIGRATIONS_DIR):
+    """マイグレーションファイルを番号順に取得"""
+    migrations = [
+        Migration(path)
+        for path in sorted(migrations_dir.glob("*.sql"))
+        if MIGRATION_FILE_RE.match(path.name)
+    ]
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration versions in {migrations_dir}")
+    return migrations
+
+
+def get_database_urls():
+    """マイグレーション対象（DATABASE_SHARD_URLS、未設定なら DATABASE_URL の1台）"""
+    db_urls = [u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+    if not db_urls and os.getenv("DATABASE_URL"):
+        db_urls = [os.getenv("DATABASE_URL")]
+    if not db_urls:
         raise RuntimeError("DATABASE_URL is not set")
 
     # まれに postgres:// が来るケースの保険
-    if db_url.startswith("postgres://"):
-        db_url = db_url.replace("postgres://", "postgresql://", 1)
+    return [
+        u.replace("postgres://", "postgresql://", 1) if u.startswith("postgres://") else u
+        for u in db_urls
+    ]
 
-    engine = create_engine(db_url, pool_pre_ping=True)
 
-    # 1) まず ORM 定義からテーブル作成（sessions を確実に作る）
-    Base.metadata.create_all(bind=engine)
-
-    # 2) migrations/init.sql があるなら流す（既存ならエラー無視）
-    sql_path = Path(__file__).resolve().parent.parent / "migrations" / "init.sql"
-    if sql_path.exists():
-        sql = sql_path.read_text(encoding="utf-8")
-        with engine.begin() as conn:
-            for stmt in sql.split(";"):
-                stmt = stmt.strip()
-                if not stmt:
+def read_ledger(conn):
+    """適用済みバージョン -> checksum（台帳テーブルが無ければ None）"""
+    try:
+        rows = conn.execute(text("SELECT version, checksum FROM schema_migrations")).fetchall()
+    except ProgrammingError:
+        conn.rollback()
+        return None
+    conn.commit()
+    return {version: checksum for version, checksum in rows}
+
+
+def warn_on_changed(migrations, ledger):
+    for m in migrations:
+        if m.version in ledger and ledger[m.version] != m.checksum:
+            print(f"[WARN] migration {m.path.name} changed after it was applied")
+
+
+def acquire_migration_lock(conn):
+    """マイグレーションの advisory lock を取る（セッションロック）
+
+    pg_advisory_lock で待つと、待っている文のスナップショットを適用中の CREATE INDEX CONCURRENTLY が
+    待ち合わせてデッドロックになり、待つ側が落ちる。pg_try_advisory_lock を間隔をあけて繰り返し、
+    待つ間はトランザクションもスナップショットも持たない。
+    """
+    while True:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}).scalar()
+        conn.commit()
+        if locked:
+            return
+        time.sleep(MIGRATION_LOCK_POLL_SECONDS)
+
+
+def run_migration(conn, m):
+    """1ファイルを実行して台帳に記録してコミット"""
+    if m.transactional:
+        # ファイル単位で1トランザクション。$$ の関数本体を含むので分割しない。
+        # no_parameters で format() の %I / %L をドライバに解釈させない
+        conn.execution_options(no_parameters=True).exec_driver_sql(m.sql)
+    else:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            for stmt in m.statements():
+                conn.execution_options(no_parameters=True).exec_driver_sql(stmt)
+        finally:
+            # autocommit でも SQLAlchemy 側のトランザクションは始まっているので閉じてから戻す
+            conn.commit()
+            conn.execution_options(isolation_level=conn.default_isolation_level)
+    conn.execute(text("""
+        INSERT INTO schema_migrations (version, name, checksum)
+        VALUES (:version, :name, :checksum)
+    """), {"version": m.version, "name": m.name, "checksum": m.checksum})
+    conn.commit()
+
+
+def apply_pending(engine, migrations):
+    """advisory lock の下で未適用分を適用（適用したファイル名のリストを返す）"""
+    applied = []
+    with engine.connect() as conn:
+        acquire_migration_lock(conn)
+        try:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    checksum VARCHAR(64) NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            conn.commit()
+
+            # ロック待ちの間に他のコンテナが適用しているかもしれないので読み直す
+            ledger = read_ledger(conn)
+            for m in migrations:
+                if m.version in ledger:
                     continue
                 try:
-                    conn.execute(text(stmt))
-                except Exception as e:
-                    print(f"[WARN] {e}")
+                    run_migration(conn, m)
+                except Exception:
+                    conn.rollback()
+                    print(f"[ERROR] migration {m.path.name} failed", file=sys.stderr)
+                    raise
+                applied.append(m.path.name)
+                print(f"migration applied: {m.path.name}")
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            conn.commit()
+    return applied
+
+
+def migrate(db_url):
+    """未適用のマイグレーションを適用"""
+    migrations = discover_migrations()
+    engine = create_engine(db_url, pool_pre_ping=True)
+    try:
+        # ウォームブート: 台帳を1回読むだけ
+        with engine.connect() as conn:
+            ledger = read_ledger(conn)
+        if ledger is not None and all(m.version in ledger for m in migrations):
+            warn_on_changed(migrations, ledger)
+            print(f"schema up to date (version {max(ledger, default=0)})")
+            applied = []
+        else:
+            applied = apply_pending(engine, migrations)
+        return applied
+    finally:
+        engine.dispose()
+
+
+def ensure_partitions(db_url):
+    """activity_logs の当月から ACTIVITY_LOG_PARTITIONS_AHEAD ヶ月先までのパーティションを作る
+
+    DEFAULT パーティションからの行の移し替えで activity_logs に ACCESS EXCLUSIVE ロックを取りうるので、
+    起動ごとのマイグレーションでは呼ばない。
+    """
+    engine = create_engine(db_url)
+    try:
+        with engine.connect() as conn:
+            exists = conn.execute(text(
+                "SELECT to_regprocedure('ensure_activity_log_partitions(integer)') IS NOT NULL"
+            )).scalar()
+            if not exists:
+                conn.rollback()
+                return 0
+            # 同時に実行されても同じパーティションを作り合わないようにマイグレーションと同じロックを取る
+            # （待ち方は acquire_migration_lock と同じ理由で try を繰り返す）
+            while not conn.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+            ).scalar():
+                conn.rollback()
+                time.sleep(MIGRATION_LOCK_POLL_SECONDS)
+            created = conn.execute(
+                text("SELECT ensure_activity_log_partitions(:months_ahead)"),
+                {"months_ahead": ACTIVITY_LOG_PARTITIONS_AHEAD},
+            ).scalar()
+            conn.commit()
+    finally:
+        engine.dispose()
+    print(f"activity_logs partitions created: {created}")
+    return created
+
+
+def status(db_url):
+    """適用状況の表示"""
+    migrations = discover_migrations()
+    engine = create_engine(db_url)
+    try:
+        with engine.connect() as conn:
+            ledger = read_ledger(conn) or {}
+    finally:
+        engine.dispose()
+
+    for m in migrations:
+        state = "applied" if m.version in ledger else "pending"
+        if m.version in ledger and ledger[m.version] != m.checksum:
+            state = "changed"
+        print(f"{m.path.name:50s} {state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="データベースマイグレーション")
+    parser.add_argument("--status", action="store_true", help="適用状況を表示して終了")
+    parser.add_argument("--partitions", action="store_true", help="activity_logs の先の月次パーティションを作成して終了")
+    args = parser.parse_args()
+
+    db_urls = get_database_urls()
+    for index, db_url in enumerate(db_urls):
+        if len(db_urls) > 1:
+            print(f"[shard {index}]")
+        if args.status:
+            status(db_url)
+        elif args.partitions:
+            ensure_partitions(db_url)
+        else:
+            migrate(db_url)
 
-    # 3) デバッグ：sessions の存在確認（ログで見える）
-    with engine.begin() as conn:
-        r = conn.execute(text("SELECT to_regclass('public.sessions')")).scalar()
-        print("sessions table:", r)
 
 if __name__ == "__main__":
     main()
-
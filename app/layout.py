@@ -0,0 +1,379 @@
+"""
+サーバー側の力学レイアウト（POST /api/layout）
+
+ブラウザの D3 シミュレーションは読み込みのたびに乱数から収束させるので、
+大きなマップでは遅く、端末ごとに配置が変わる。ここでは同じグラフから常に同じ配置を作る。
+
+  - 反発力: Barnes–Hut（四分木で遠くのノード群を重心1点にまとめる。O(n log n)）
+  - 引力: 接続に沿ったばね
+  - カテゴリの引き寄せ: SECI の4象限（共同化=左上, 表出化=右上, 連結化=右下, 内面化=左下）
+    のアンカーへ引き、カテゴリごとにまとまった配置にする（接続の引力の方が強いので越境はする）
+  - 初期配置と乱数はグラフのハッシュから決めるので結果は決定的
+
+結果はノードと接続の構造（id, カテゴリ, 接続の組）のハッシュをキーに Redis へ保存し、
+位置の変更やタイトル等の編集ではキャッシュを捨てない。
+ノード数が LAYOUT_SYNC_MAX_NODES を超えるグラフはリクエスト内では計算せず、
+別プロセス（LAYOUT_WORKERS）で計算して 202 を返す。クライアントは同じ POST を再送して結果を受け取る。
+
+グラフは SessionGraph（app/session_graph.py）で受け取る。
+compute_layout は Flask に依存しない（ワーカープロセスと scripts/bench_layout.py から呼ぶ）。
+
+計算は純 Python なので大きいグラフは遅い（scripts/bench_layout.py の実測で1反復あたり
+1千ノード約 40ms、1万ノード約 0.6秒、5万ノード約 4秒。反復は最低 40 回）。
+1万ノードで約 25秒、5万ノードで約 3分かかり、1つのワーカーは1件ずつ計算する。
+5万ノード級が LAYOUT_WORKERS あたり3件以上並ぶと、後ろの計算が終わる前に計算中の印
+（LAYOUT_PENDING_SECONDS）が切れて同じグラフが再投入されうる。数万ノードのマップを
+常用する環境では LAYOUT_WORKERS と LAYOUT_PENDING_SECONDS をあわせて上げる。
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+from collections import OrderedDict
+
+from .session_graph import CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+# 計算方法を変えたら上げる（古いキャッシュを使わないように）
+LAYOUT_VERSION = 1
+
+LAYOUT_SYNC_MAX_NODES = int(os.getenv('LAYOUT_SYNC_MAX_NODES', '200'))
+LAYOUT_WORKERS = int(os.getenv('LAYOUT_WORKERS', '1'))
+LAYOUT_CACHE_EXPIRE = int(os.getenv('LAYOUT_CACHE_SECONDS', '86400'))
+# バックグラウンド計算中の印（ワーカープロセスが落ちても残り続けないよう期限付き）
+LAYOUT_PENDING_EXPIRE = int(os.getenv('LAYOUT_PENDING_SECONDS', '600'))
+
+# ノード間の理想距離（D3 側の link distance に合わせた画面上のピクセル）
+IDEAL_DISTANCE = 120.0
+THETA = 0.8
+CATEGORY_GRAVITY = 1.0
+# 座標が完全に重なった四分木の葉はこの深さで分割をやめる
+MAX_TREE_DEPTH = 24
+
+# SECI モデルの図と同じ並び（左上から時計回り）
+CATEGORY_ANCHORS = {
+    'socialization': (-1.0, -1.0),
+    'externalization': (1.0, -1.0),
+    'combination': (1.0, 1.0),
+    'internalization': (-1.0, 1.0),
+}
+
+
+def structural_hash(graph):
+    """ノード (id, category) と接続 (source, target) の構造から決まるハッシュ"""
+    ids = graph.ids
+    digest = hashlib.sha256(f'v{LAYOUT_VERSION}'.encode())
+    for node_id, category in sorted((ids[i], graph.category(i)) for i in range(len(ids))):
+        digest.update(f'n:{node_id}:{category};'.encode())
+    for source, target in sorted((ids[s], ids[t]) for s, t in graph.edges()):
+        digest.update(f'e:{source}:{target};'.encode())
+    return digest.hexdigest()
+
+
+def parse_center(value):
+    """リクエストの center（{"x": 数, "y": 数}。省略なら原点。不正なら None）"""
+    if value is None:
+        return 0.0, 0.0
+    if not isinstance(value, dict):
+        return None
+    try:
+        x, y = float(value.get('x', 0)), float(value.get('y', 0))
+    except (TypeError, ValueError):
+        return None
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return None
+    return x, y
+
+
+def default_iterations(node_count):
+    """小さいグラフは丁寧に、大きいグラフは初期配置（カテゴリ別）を頼りに回数を減らす"""
+    if node_count <= 1:
+        return 0
+    return max(40, min(300, int(4000 / math.sqrt(node_count))))
+
+
+def _build_tree(xs, ys):
+    """四分木を配列で作る（重心・質量・一辺の長さ・子 / 葉のノード番号）"""
+    com_x, com_y, mass, size, children, bodies = [], [], [], [], [], []
+
+    min_x, max_x = min(xs), max(xs)
+    min_y, max_y = min(ys), max(ys)
+    root_size = max(max_x - min_x, max_y - min_y, 1.0)
+
+    def build(indices, x0, y0, cell_size, depth):
+        cell = len(mass)
+        com_x.append(0.0)
+        com_y.append(0.0)
+        mass.append(0.0)
+        size.append(cell_size)
+        children.append(())
+        bodies.append(())
+
+        if len(indices) == 1 or depth >= MAX_TREE_DEPTH:
+            sx = sy = 0.0
+            for i in indices:
+                sx += xs[i]
+                sy += ys[i]
+            count = len(indices)
+            com_x[cell], com_y[cell], mass[cell] = sx / count, sy / count, float(count)
+            bodies[cell] = tuple(indices)
+            return cell
+
+        half = cell_size / 2
+        mid_x, mid_y = x0 + half, y0 + half
+        quadrants = ([], [], [], [])
+        for i in indices:
+            quadrants[(xs[i] >= mid_x) + 2 * (ys[i] >= mid_y)].append(i)
+
+        kids = []
+        sx = sy = total = 0.0
+        for q, members in enumerate(quadrants):
+            if not members:
+                continue
+            child = build(members, x0 + half * (q & 1), y0 + half * (q >> 1), half, depth + 1)
+            kids.append(child)
+            sx += com_x[child] * mass[child]
+            sy += com_y[child] * mass[child]
+            total += mass[child]
+        com_x[cell], com_y[cell], mass[cell] = sx / total, sy / total, total
+        children[cell] = tuple(kids)
+        return cell
+
+    build(list(range(len(xs))), min_x, min_y, root_size, 0)
+    return com_x, com_y, mass, size, children, bodies
+
+
+def _repulsion(xs, ys, k2, theta, rng):
+    """全ノードの反発力（Barnes–Hut 近似）"""
+    com_x, com_y, mass, size, children, bodies = _build_tree(xs, ys)
+    theta2 = theta * theta
+    n = len(xs)
+    fx = [0.0] * n
+    fy = [0.0] * n
+    for i in range(n):
+        x, y = xs[i], ys[i]
+        ax = ay = 0.0
+        stack = [0]
+        while stack:
+            cell = stack.pop()
+            dx = x - com_x[cell]
+            dy = y - com_y[cell]
+            d2 = dx * dx + dy * dy
+            leaf = bodies[cell]
+            if leaf:
+                for j in leaf:
+                    if j == i:
+                        continue
+                    dx = x - xs[j]
+                    dy = y - ys[j]
+                    d2 = dx * dx + dy * dy
+                    if d2 < 1e-6:
+                        # 完全に重なったノードはランダムな向きに押し出す
+                        dx, dy = rng.uniform(-1, 1), rng.uniform(-1, 1)
+                        d2 = dx * dx + dy * dy + 1e-6
+                    ax += dx * k2 / d2
+                    ay += dy * k2 / d2
+            elif size[cell] * size[cell] < theta2 * d2:
+                # 十分遠いセルは重心1点として扱う（F = m k^2 / d を d で正規化）
+                f = mass[cell] * k2 / d2
+                ax += dx * f
+                ay += dy * f
+            else:
+                stack.extend(children[cell])
+        fx[i] = ax
+        fy[i] = ay
+    return fx, fy
+
+
+def compute_layout(graph, iterations=None, theta=THETA, seed=None):
+    """SessionGraph の配置を計算する
+
+    返り値は {ノードid(str): (x, y)}。座標は原点中心。
+    """
+    ids = graph.ids
+    n = len(ids)
+    if n == 0:
+        return {}
+    if seed is None:
+        seed = int(structural_hash(graph)[:16], 16)
+    if iterations is None:
+        iterations = default_iterations(n)
+    rng = random.Random(seed)
+
+    k = IDEAL_DISTANCE
+    k2 = k * k
+    links = [(s, t) for s, t in graph.edges() if s != t]
+
+    # カテゴリごとのアンカー。各カテゴリが半径 k*sqrt(件数) 程度に広がっても重ならない距離に置く
+    # （カテゴリが不明なノードは原点に引く）
+    counts = graph.category_counts() + [len([c for c in graph.codes if c < 0])]
+    spread = k * math.sqrt(max(counts))
+    anchor_distance = spread * 0.9 + k
+    code_anchors = [
+        (ux * anchor_distance, uy * anchor_distance)
+        for ux, uy in (CATEGORY_ANCHORS[category] for category in CATEGORIES)
+    ]
+    anchors = [code_anchors[code] if code >= 0 else (0.0, 0.0) for code in graph.codes]
+
+    # 初期配置: アンカーの周りに散らす
+    xs = [ax + rng.gauss(0, spread / 2) for ax, _ in anchors]
+    ys = [ay + rng.gauss(0, spread / 2) for _, ay in anchors]
+
+    temperature = spread / 2
+    for step in range(iterations):
+        fx, fy = _repulsion(xs, ys, k2, theta, rng)
+
+        for a, b in links:
+            dx = xs[a] - xs[b]
+            dy = ys[a] - ys[b]
+            d = math.sqrt(dx * dx + dy * dy) or 1e-3
+            f = d / k  # F = d^2 / k を d で正規化
+            fx[a] -= dx * f
+            fy[a] -= dy * f
+            fx[b] += dx * f
+            fy[b] += dy * f
+
+        # 温度（1回の移動量の上限）を線形に下げる
+        limit = temperature * (1 - step / iterations) + 1.0
+        for i in range(n):
+            ax, ay = anchors[i]
+            dx = fx[i] - CATEGORY_GRAVITY * (xs[i] - ax)
+            dy = fy[i] - CATEGORY_GRAVITY * (ys[i] - ay)
+            d = math.sqrt(dx * dx + dy * dy)
+            if d > limit:
+                dx *= limit / d
+                dy *= limit / d
+            xs[i] += dx
+            ys[i] += dy
+
+    cx = sum(xs) / n
+    cy = sum(ys) / n
+    return {node_id: (round(xs[i] - cx, 1), round(ys[i] - cy, 1)) for i, node_id in enumerate(ids)}
+
+
+# ===== キャッシュとバックグラウンド計算（Flask 側） =====
+
+_executor = None
+_executor_lock = threading.Lock()
+# Redis が無いときの置き場所と、このプロセスで計算中のハッシュ
+_local_results = OrderedDict()
+_LOCAL_RESULTS_MAX = 32
+_pending = set()
+
+
+def _cache_key(graph_hash):
+    return f'layout:{graph_hash}'
+
+
+def _pending_key(graph_hash):
+    return f'layout:pending:{graph_hash}'
+
+
+def get_cached_layout(graph_hash):
+    """キャッシュ済みの配置（無ければ None）"""
+    from .cache_manager import get_cache
+
+    redis_client = get_cache()
+    if redis_client is not None:
+        try:
+            data = redis_client.get(_cache_key(graph_hash))
+            if data:
+                return {node_id: tuple(xy) for node_id, xy in json.loads(data).items()}
+        except Exception as e:
+            logger.warning(f"layout cache get failed: {e}")
+    return _local_results.get(graph_hash)
+
+
+def set_cached_layout(graph_hash, positions):
+    from .cache_manager import get_cache
+
+    _local_results[graph_hash] = positions
+    _local_results.move_to_end(graph_hash)
+    while len(_local_results) > _LOCAL_RESULTS_MAX:
+        _local_results.popitem(last=False)
+
+    redis_client = get_cache()
+    if redis_client is None:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        pipe.setex(_cache_key(graph_hash), LAYOUT_CACHE_EXPIRE, json.dumps(positions))
+        pipe.delete(_pending_key(graph_hash))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"layout cache set failed: {e}")
+
+
+def _get_executor():
+    """レイアウト用のプロセスプール（初回利用時に作る）
+
+    gunicorn ワーカーのスレッドや DB 接続を引き継がないよう spawn で起動する。
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                _executor = ProcessPoolExecutor(
+                    max_workers=LAYOUT_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _executor
+
+
+def submit_layout(graph_hash, graph):
+    """配置の計算をバックグラウンドに回す（同じグラフの計算中なら何もしない）"""
+    from .cache_manager import get_cache
+
+    if graph_hash in _pending:
+        return
+    # 他のワーカーが計算中なら待つだけ
+    redis_client = get_cache()
+    if redis_client is not None:
+        try:
+            if not redis_client.set(_pending_key(graph_hash), '1', nx=True, ex=LAYOUT_PENDING_EXPIRE):
+                return
+        except Exception as e:
+            logger.warning(f"layout pending mark failed: {e}")
+
+    _pending.add(graph_hash)
+    future = _get_executor().submit(compute_layout, graph)
+
+    def done(f):
+        _pending.discard(graph_hash)
+        try:
+            set_cached_layout(graph_hash, f.result())
+        except Exception as e:
+            logger.error(f"layout computation failed ({len(graph)} nodes): {e}")
+            if redis_client is not None:
+                try:
+                    redis_client.delete(_pending_key(graph_hash))
+                except Exception:
+                    pass
+
+    future.add_done_callback(done)
+
+
+def save_positions(db, session_id, positions):
+    """配置を node_positions に書く（このセッションのノードだけ。1文でまとめて）"""
+    from sqlalchemy import text
+
+    ids = list(positions)
+    db.execute(text("""
+        INSERT INTO node_positions (node_id, x, y)
+        SELECT v.id, v.x, v.y
+        FROM unnest(CAST(:ids AS uuid[]), CAST(:xs AS float8[]), CAST(:ys AS float8[])) AS v(id, x, y)
+        JOIN knowledge_nodes kn ON kn.id = v.id AND kn.session_id = :sid
+        ON CONFLICT (node_id) DO UPDATE
+        SET x = EXCLUDED.x, y = EXCLUDED.y, updated_at = now()
+    """), {
+        'sid': session_id,
+        'ids': ids,
+        'xs': [positions[i][0] for i in ids],
+        'ys': [positions[i][1] for i in ids],
+    })
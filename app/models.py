@@ -7,9 +7,10 @@ from sqlalchemy.dialects.postgresql import UUID, INET, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import text
-import uuid
 import enum
 
+from .ids import uuid7
+
 Base = declarative_base()
 
 
@@ -26,7 +27,7 @@ class Session(Base):
     """セッション管理テーブル"""
     __tablename__ = 'sessions'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_key = Column(String(255), unique=True, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_activity = Column(DateTime, default=datetime.utcnow, index=True)
@@ -51,7 +52,7 @@ class KnowledgeNode(Base):
     """知識ノードテーブル"""
     __tablename__ = 'knowledge_nodes'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_id = Column(UUID(as_uuid=True), ForeignKey('sessions.id', ondelete='CASCADE'), nullable=False, index=True)
     title = Column(String(255), nullable=False)
     description = Column(Text)
@@ -68,14 +69,20 @@ class KnowledgeNode(Base):
             index=True,
          )
     data_metadata = Column('metadata', JSONB, server_default=text("'{}'::jsonb"), nullable=False)
-    position_x = Column(Float, default=0)
-    position_y = Column(Float, default=0)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_deleted = Column(Boolean, default=False)
     
     # リレーションシップ
     session = relationship('Session', back_populates='knowledge_nodes')
+    # 位置は node_positions に分離（ドラッグ保存でこの行を書き換えない）。常に JOIN で読む
+    position = relationship(
+        'NodePosition',
+        back_populates='node',
+        uselist=False,
+        lazy='joined',
+        cascade='all, delete-orphan',
+    )
     outgoing_connections = relationship(
         'NodeConnection',
         foreign_keys='NodeConnection.source_node_id',
@@ -98,6 +105,29 @@ class KnowledgeNode(Base):
             )
     reactions = relationship('NodeReaction', back_populates='node', cascade='all, delete-orphan')
     comments = relationship('NodeComment', back_populates='node', cascade='all, delete-orphan')
+    # 集計はトリガーが書く（migrations/007_node_stats.sql）。アプリからは読むだけ
+    stats = relationship('NodeStats', uselist=False, viewonly=True)
+
+    def _ensure_position(self):
+        if self.position is None:
+            self.position = NodePosition(x=0, y=0)
+        return self.position
+
+    @property
+    def position_x(self):
+        return self.position.x if self.position is not None else 0
+
+    @position_x.setter
+    def position_x(self, value):
+        self._ensure_position().x = value
+
+    @property
+    def position_y(self):
+        return self.position.y if self.position is not None else 0
+
+    @position_y.setter
+    def position_y(self, value):
+        self._ensure_position().y = value
     
     def to_dict(self, include_connections=False):
         data = {
@@ -124,11 +154,46 @@ class KnowledgeNode(Base):
         return data
 
 
+class NodePosition(Base):
+    """ノード位置テーブル（x / y にインデックスを張らず HOT 更新にする。fillfactor は 005 で設定）"""
+    __tablename__ = 'node_positions'
+
+    node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), primary_key=True)
+    x = Column(Float, nullable=False, default=0)
+    y = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    node = relationship('KnowledgeNode', back_populates='position')
+
+
+class NodeStats(Base):
+    """ノードごとの集計（トリガーで増減。行が無いノードはすべて 0）"""
+    __tablename__ = 'node_stats'
+
+    FIELDS = ('tag_count', 'like_count', 'star_count', 'bookmark_count', 'comment_count', 'version_count')
+
+    node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), primary_key=True)
+    tag_count = Column(Integer, nullable=False, default=0)
+    like_count = Column(Integer, nullable=False, default=0)
+    star_count = Column(Integer, nullable=False, default=0)
+    bookmark_count = Column(Integer, nullable=False, default=0)
+    comment_count = Column(Integer, nullable=False, default=0)
+    version_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def empty_dict(cls):
+        return {field: 0 for field in cls.FIELDS}
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
 class NodeConnection(Base):
     """ノード間接続テーブル"""
     __tablename__ = 'node_connections'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     source_node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), nullable=False, index=True)
     target_node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), nullable=False, index=True)
     connection_type = Column(String(50), default='related')
@@ -156,7 +221,7 @@ class AnalyticsMetric(Base):
     """分析メトリクステーブル"""
     __tablename__ = 'analytics_metrics'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_id = Column(UUID(as_uuid=True), ForeignKey('sessions.id', ondelete='CASCADE'), nullable=False, index=True)
     metric_type = Column(String(100), nullable=False)
     metric_value = Column(JSONB, nullable=False)
@@ -179,7 +244,7 @@ class ActivityLog(Base):
     """アクティビティログテーブル"""
     __tablename__ = 'activity_logs'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_id = Column(UUID(as_uuid=True), ForeignKey('sessions.id', ondelete='CASCADE'), nullable=False, index=True)
     action_type = Column(String(100), nullable=False)
     target_type = Column(String(100))
@@ -207,7 +272,7 @@ class Tag(Base):
     """タグマスター"""
     __tablename__ = 'tags'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = Column(String(50), unique=True, nullable=False, index=True)
     color = Column(String(7), default='#6C757D')
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -228,7 +293,7 @@ class NodeTag(Base):
     """ノード-タグ関連"""
     __tablename__ = 'node_tags'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), nullable=False, index=True)
     tag_id = Column(UUID(as_uuid=True), ForeignKey('tags.id', ondelete='CASCADE'), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -251,7 +316,7 @@ class NodeVersion(Base):
     """ノードのバージョン履歴"""
     __tablename__ = 'node_versions'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), nullable=False, index=True)
     title = Column(String(255), nullable=False)
     description = Column(Text)
@@ -299,7 +364,7 @@ class NodeReaction(Base):
     """いいね・スター・ブックマーク"""
     __tablename__ = 'node_reactions'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), nullable=False, index=True)
     session_id = Column(UUID(as_uuid=True), ForeignKey('sessions.id', ondelete='CASCADE'), nullable=False, index=True)
     reaction_type = Column(String(20), nullable=False)  # 'like', 'star', 'bookmark'
@@ -323,7 +388,7 @@ class NodeComment(Base):
     """ノードへのコメント"""
     __tablename__ = 'node_comments'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     node_id = Column(UUID(as_uuid=True), ForeignKey('knowledge_nodes.id', ondelete='CASCADE'), nullable=False, index=True)
     session_id = Column(UUID(as_uuid=True), ForeignKey('sessions.id', ondelete='CASCADE'), nullable=False)
     comment_text = Column(Text, nullable=False)
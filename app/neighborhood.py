@@ -0,0 +1,160 @@
+"""
+ノードの周辺 k ホップの部分グラフ（GET /api/nodes/<id>/neighborhood?depth=&direction=）
+
+get_node の include_connections は直接の接続だけで、しかも関連を1件ずつ遅延ロードする。
+フォーカス表示では中心から数ホップ先までを1回の往復で取りたいので、探索は
+1本の再帰 CTE で行う。
+  - direction: out（接続の向きに進む）/ in（逆向き）/ both
+  - depth は NEIGHBORHOOD_MAX_DEPTH まで、1ノードから広げる隣接は NEIGHBORHOOD_MAX_FANOUT 件まで
+    （LATERAL ... LIMIT。id 順なので結果は決まる）
+  - 閉路: 再帰項を UNION（(ノード, 深さ) の重複を捨てる）にし、深さで打ち切るので必ず止まる。
+    同じ深さのフロンティアに同じノードは1回しか入らない
+  - ノード数が NEIGHBORHOOD_MAX_NODES を超えたら中心に近い順に切り詰めて truncated にする
+部分グラフ（ノード + 両端が部分グラフ内の接続）は差分同期のカーソル（= グラフの版。
+app/changes.py）ごとに Redis へ保存する。
+"""
+import json
+import logging
+import os
+
+from .database import read_only_text
+
+logger = logging.getLogger(__name__)
+
+NEIGHBORHOOD_MAX_DEPTH = int(os.getenv('NEIGHBORHOOD_MAX_DEPTH', '3'))
+NEIGHBORHOOD_MAX_FANOUT = int(os.getenv('NEIGHBORHOOD_MAX_FANOUT', '50'))
+NEIGHBORHOOD_MAX_NODES = int(os.getenv('NEIGHBORHOOD_MAX_NODES', '500'))
+NEIGHBORHOOD_CACHE_EXPIRE = int(os.getenv('NEIGHBORHOOD_CACHE_SECONDS', '600'))
+
+DIRECTIONS = ('out', 'in', 'both')
+
+NEIGHBORHOOD_QUERY = read_only_text("""
+    WITH RECURSIVE walk(node_id, depth) AS (
+        SELECT kn.id, 0
+        FROM knowledge_nodes kn
+        WHERE kn.id = CAST(:nid AS uuid) AND kn.session_id = :sid AND NOT kn.is_deleted
+      UNION
+        SELECT nb.id, w.depth + 1
+        FROM walk w
+        CROSS JOIN LATERAL (
+            SELECT n.id
+            FROM (
+                SELECT nc.target_node_id AS id FROM node_connections nc
+                WHERE CAST(:follow_out AS boolean) AND nc.source_node_id = w.node_id
+                UNION
+                SELECT nc.source_node_id FROM node_connections nc
+                WHERE CAST(:follow_in AS boolean) AND nc.target_node_id = w.node_id
+            ) adjacent
+            JOIN knowledge_nodes n ON n.id = adjacent.id
+            WHERE n.session_id = :sid AND NOT n.is_deleted
+            ORDER BY n.id
+            LIMIT :fanout
+        ) nb
+        WHERE w.depth < :depth
+    )
+    SELECT node_id, min(depth) AS depth
+    FROM walk
+    GROUP BY node_id
+    ORDER BY min(depth), node_id
+    LIMIT :limit
+""")
+
+
+def parse_depth(value):
+    """クエリ文字列の depth（1〜NEIGHBORHOOD_MAX_DEPTH。不正なら None）"""
+    try:
+        depth = int(value)
+    except (TypeError, ValueError):
+        return None
+    return depth if 1 <= depth <= NEIGHBORHOOD_MAX_DEPTH else None
+
+
+def walk_params(session_id, node_id, depth, direction):
+    return {
+        'sid': session_id,
+        'nid': str(node_id),
+        'depth': depth,
+        'follow_out': direction in ('out', 'both'),
+        'follow_in': direction in ('in', 'both'),
+        'fanout': NEIGHBORHOOD_MAX_FANOUT,
+        # 1件多く取って切り詰めたかを判定する
+        'limit': NEIGHBORHOOD_MAX_NODES + 1,
+    }
+
+
+def subgraph_statements(session_id, node_ids):
+    """部分グラフのノードと、両端が部分グラフ内にある接続を読む文"""
+    from sqlalchemy import select
+    from .models import KnowledgeNode, NodeConnection
+
+    nodes_stmt = select(KnowledgeNode).where(
+        KnowledgeNode.session_id == session_id,
+        KnowledgeNode.is_deleted == False,
+        KnowledgeNode.id.in_(node_ids)
+    )
+    connections_stmt = select(NodeConnection).where(
+        NodeConnection.source_node_id.in_(node_ids),
+        NodeConnection.target_node_id.in_(node_ids)
+    )
+    return nodes_stmt, connections_stmt
+
+
+def build_neighborhood(node_id, depth, direction, walk_rows, nodes, connections, cursor):
+    """探索結果（node_id, depth）と読んだノード・接続から応答を作る"""
+    truncated = len(walk_rows) > NEIGHBORHOOD_MAX_NODES
+    depths = {str(row_id): row_depth for row_id, row_depth in walk_rows[:NEIGHBORHOOD_MAX_NODES]}
+    node_dicts = []
+    for node in nodes:
+        data = node.to_dict()
+        data['depth'] = depths[data['id']]
+        node_dicts.append(data)
+    node_dicts.sort(key=lambda n: (n['depth'], n['id']))
+    return {
+        'success': True,
+        'center': str(node_id),
+        'depth': depth,
+        'direction': direction,
+        'nodes': node_dicts,
+        'connections': [conn.to_dict() for conn in connections],
+        'truncated': truncated,
+        'cursor': cursor,
+        'cached': False,
+    }
+
+
+def cache_key(session_id, cursor, node_id, depth, direction):
+    return f'neighborhood:{session_id}:{cursor}:{node_id}:{depth}:{direction}'
+
+
+def get_neighborhood(db, session_id, node_id, depth, direction, cursor):
+    """周辺の部分グラフ（Flask 側）。中心のノードが無ければ None"""
+    from .cache_manager import get_cache
+
+    redis_client = get_cache()
+    key = cache_key(session_id, cursor, node_id, depth, direction)
+    if redis_client is not None:
+        try:
+            data = redis_client.get(key)
+            if data:
+                return {**json.loads(data), 'cached': True}
+        except Exception as e:
+            logger.warning(f"neighborhood cache get failed: {e}")
+
+    walk_rows = db.execute(NEIGHBORHOOD_QUERY, walk_params(session_id, node_id, depth, direction)).all()
+    if not walk_rows:
+        return None
+    node_ids = [row_id for row_id, _ in walk_rows[:NEIGHBORHOOD_MAX_NODES]]
+    nodes_stmt, connections_stmt = subgraph_statements(session_id, node_ids)
+    result = build_neighborhood(
+        node_id, depth, direction, walk_rows,
+        db.execute(nodes_stmt).scalars().all(),
+        db.execute(connections_stmt).scalars().all(),
+        cursor,
+    )
+
+    if redis_client is not None:
+        try:
+            redis_client.setex(key, NEIGHBORHOOD_CACHE_EXPIRE, json.dumps(result, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"neighborhood cache set failed: {e}")
+    return result
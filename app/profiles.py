@@ -0,0 +1,115 @@
+"""
+デプロイプロファイル（gunicorn のワーカーモデルと DB プールの組み合わせ）
+
+DEPLOY_PROFILE=sync|gthread|gevent|asgi で選ぶ。gunicorn_conf.py と Config の
+SQLALCHEMY_ENGINE_OPTIONS が同じプロファイルを読むので、
+ワーカー数 × (pool_size + max_overflow + 非同期プール) が PostgreSQL への最大接続数になる。
+
+  sync     1ワーカー1リクエスト。プールも1本（+予備1本）
+  gthread  1ワーカーに GUNICORN_THREADS 本のスレッド。プールはスレッド数と同じ
+  gevent   1ワーカーで多数のグリーンレットを回す。psycogreen で psycopg2 を協調化する
+  asgi     uvicorn ワーカー。読み取り API は asyncpg のプール（app/async_api.py）、
+           残りは GUNICORN_THREADS 本のスレッドで Flask に渡す
+"""
+import multiprocessing
+import os
+
+DEFAULT_PROFILE = 'gthread'
+
+# 共通のプール設定
+POOL_PRE_PING = True
+POOL_RECYCLE_SECONDS = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+POOL_TIMEOUT_SECONDS = int(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+
+class DeployProfile:
+    """1つのプロファイル（gunicorn 設定とプール設定）"""
+
+    def __init__(self, name, worker_class, workers, threads, pool_size, max_overflow,
+                 worker_connections=1000, app_uri='app:create_app()', async_pool=0):
+        self.name = name
+        self.app_uri = app_uri
+        self.worker_class = worker_class
+        self.workers = workers
+        self.threads = threads
+        self.worker_connections = worker_connections
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        # 非同期パス用プール（pool_size + max_overflow の合計）
+        self.async_pool = async_pool
+
+    @property
+    def max_db_connections(self):
+        """このプロファイルで PostgreSQL に張り得る接続数の上限"""
+        return self.workers * (self.pool_size + self.max_overflow + self.async_pool)
+
+    def engine_options(self):
+        """create_engine に渡すプール設定"""
+        return {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_pre_ping': POOL_PRE_PING,
+            'pool_recycle': POOL_RECYCLE_SECONDS,
+            'pool_timeout': POOL_TIMEOUT_SECONDS,
+        }
+
+    def describe(self):
+        return (
+            f"profile={self.name} worker_class={self.worker_class} workers={self.workers} "
+            f"threads={self.threads} pool_size={self.pool_size} max_overflow={self.max_overflow} "
+            f"async_pool={self.async_pool} "
+            f"max_db_connections={self.max_db_connections}"
+        )
+
+
+def _cpu_count():
+    return multiprocessing.cpu_count()
+
+
+def _workers(default):
+    return int(os.getenv('WEB_CONCURRENCY', default))
+
+
+def _sync():
+    # 同時に使う接続は1本。予備1本はウォームアップやテンプレート内の遅延ロード用
+    return DeployProfile('sync', 'sync', _workers(_cpu_count() * 2 + 1), 1,
+                         pool_size=1, max_overflow=1)
+
+
+def _gthread():
+    threads = int(os.getenv('GUNICORN_THREADS', '4'))
+    return DeployProfile('gthread', 'gthread', _workers(_cpu_count() + 1), threads,
+                         pool_size=threads, max_overflow=2)
+
+
+def _gevent():
+    # グリーンレット数はプールより多くてよい（DB待ちは pool_timeout まで並ぶ）
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '200'))
+    pool_size = int(os.getenv('DB_POOL_SIZE', '10'))
+    return DeployProfile('gevent', 'gevent', _workers(_cpu_count()), 1,
+                         pool_size=pool_size, max_overflow=pool_size,
+                         worker_connections=worker_connections)
+
+
+def _asgi():
+    threads = int(os.getenv('GUNICORN_THREADS', '4'))
+    async_pool = int(os.getenv('ASYNC_DB_POOL_SIZE', '10')) + int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '5'))
+    return DeployProfile('asgi', 'uvicorn.workers.UvicornWorker', _workers(_cpu_count()), threads,
+                         pool_size=threads, max_overflow=2,
+                         app_uri='asgi:app', async_pool=async_pool)
+
+
+PROFILES = {
+    'sync': _sync,
+    'gthread': _gthread,
+    'gevent': _gevent,
+    'asgi': _asgi,
+}
+
+
+def get_profile(name=None):
+    """DEPLOY_PROFILE（または name）のプロファイルを返す"""
+    name = (name or os.getenv('DEPLOY_PROFILE', DEFAULT_PROFILE)).lower()
+    if name not in PROFILES:
+        raise ValueError(f"unknown DEPLOY_PROFILE '{name}' (choose from {', '.join(PROFILES)})")
+    return PROFILES[name]()
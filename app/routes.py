@@ -2,7 +2,7 @@
 ルート定義とAPIエンドポイント
 """
 from flask import Blueprint, render_template, request, jsonify, session
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
 from .models import (
         Session as UserSession,
@@ -15,13 +15,25 @@ from .models import (
         NodeVersion,
         NodeReaction,
         NodeComment,
+        NodeStats,
         )
-from .database import get_session
+from .config import Config
+from .database import get_session, use_shard_for_key
 from .cache_manager import (
     get_session_id, get_user_nodes_cache, set_user_nodes_cache,
     invalidate_user_cache, get_cache
 )
 from .analytics import AnalyticsEngine
+from .changes import get_changes, get_cursor, get_structure_version, parse_cursor
+from .clusters import get_clusters, parse_zoom
+from .graph_analysis import analyze_spiral, cache_spiral, get_cached_spiral
+from .neighborhood import DIRECTIONS, get_neighborhood, parse_depth
+from .session_graph import SessionGraph, SessionGraphStats
+from .layout import (
+    LAYOUT_SYNC_MAX_NODES, compute_layout, get_cached_layout, parse_center, save_positions,
+    set_cached_layout, structural_hash, submit_layout,
+)
+from .viewport import VIEWPORT_MIN_NODES, load_viewport, parse_bbox, session_grid
 from functools import wraps
 
 # ブループリント定義
@@ -34,6 +46,9 @@ def require_session(f):
     def decorated_function(*args, **kwargs):
         session_key = get_session_id()
         
+        # このセッションのデータを持つシャードを選ぶ（以降の db_session はそのシャード）
+        use_shard_for_key(session_key)
+        
         # セッションの取得または作成
         db = get_session()
         user_session = db.query(UserSession).filter_by(session_key=session_key).first()
@@ -119,10 +134,24 @@ def sitemap():
 @api_bp.route('/nodes', methods=['GET'])
 @require_session
 def get_nodes():
-    """ノード一覧取得"""
+    """ノード一覧取得（bbox を指定すると大きいセッションでは表示範囲内だけ）"""
     try:
         session_id = str(request.user_session.id)
         
+        if request.args.get('bbox'):
+            try:
+                bbox = parse_bbox(request.args['bbox'])
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'bboxはx0,y0,x1,y1の形式で指定してください'
+                }), 400
+            db = get_session()
+            cursor = get_cursor(db, request.user_session.id)
+            grid = session_grid(db, request.user_session.id, cursor)
+            if len(grid) > VIEWPORT_MIN_NODES:
+                return jsonify(load_viewport(db, request.user_session.id, grid, bbox, cursor))
+        
         # キャッシュから取得を試みる
         #cached_nodes = get_user_nodes_cache(session_id)
         #if cached_nodes:
@@ -132,16 +161,20 @@ def get_nodes():
         #        'cached': True
         #    })
         cached = get_user_nodes_cache(session_id)
-        if cached:
+        if cached and 'cursor' in cached:
             return jsonify({
                 'success': True,
                 'nodes': cached.get('nodes', []),
                 'connections': cached.get('connections', []),
+                'cursor': cached['cursor'],
                 'cached': True,
                 })
         
         # データベースから取得
+        # 差分同期のカーソルは本体より先に読む（間の変更は次の /changes で重ねて届くだけ）。
+        # CURSOR_QUERY も ORM の SELECT も RoutingSession がリクエストで固定した同じ接続先から読む
         db = get_session()
+        cursor = get_cursor(db, request.user_session.id)
         nodes = db.query(KnowledgeNode).filter_by(
             session_id=request.user_session.id,
             is_deleted=False
@@ -162,7 +195,8 @@ def get_nodes():
         # キャッシュに保存
         result = {
             'nodes': nodes_data,
-            'connections': connections_data
+            'connections': connections_data,
+            'cursor': cursor
         }
         set_user_nodes_cache(session_id, result)
         
@@ -179,6 +213,127 @@ def get_nodes():
         }), 500
 
 
+@api_bp.route('/nodes/clusters', methods=['GET'])
+@require_session
+def get_node_clusters():
+    """縮小表示用のクラスタ要約（zoom は D3 の拡大率、bbox で範囲を絞れる）"""
+    try:
+        zoom = parse_zoom(request.args.get('zoom', '1'))
+        if zoom is None:
+            return jsonify({
+                'success': False,
+                'error': 'zoomには正の数を指定してください'
+            }), 400
+        
+        bbox = None
+        if request.args.get('bbox'):
+            try:
+                bbox = parse_bbox(request.args['bbox'])
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'bboxはx0,y0,x1,y1の形式で指定してください'
+                }), 400
+        
+        db = get_session()
+        cursor = get_cursor(db, request.user_session.id)
+        return jsonify(get_clusters(db, request.user_session.id, zoom, cursor, bbox))
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@api_bp.route('/changes', methods=['GET'])
+@require_session
+def get_node_changes():
+    """差分同期: since（カーソル）より新しいノード・接続と削除"""
+    try:
+        since = parse_cursor(request.args.get('since'))
+        if since is None:
+            return jsonify({
+                'success': False,
+                'error': 'sinceには0以上の整数を指定してください'
+            }), 400
+        
+        db = get_session()
+        return jsonify(get_changes(db, request.user_session.id, since))
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@api_bp.route('/layout', methods=['POST'])
+@require_session
+def compute_node_layout():
+    """サーバー側の自動配置（同じ構造のグラフはキャッシュから返す）
+    
+    apply=true なら配置を保存する。center を渡すと座標をその点の周りに平行移動する。
+    大きいグラフはバックグラウンドで計算して 202 を返す（同じリクエストを再送して受け取る）。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        center = parse_center(data.get('center')) if isinstance(data, dict) else None
+        if center is None:
+            return jsonify({
+                'success': False,
+                'error': 'centerは{"x": 数値, "y": 数値}の形式で指定してください'
+            }), 400
+        offset_x, offset_y = center
+        
+        db = get_session()
+        graph = SessionGraph.load(db, request.user_session.id)
+        graph_hash = structural_hash(graph)
+        
+        positions = get_cached_layout(graph_hash)
+        cached = positions is not None
+        if positions is None:
+            if len(graph) > LAYOUT_SYNC_MAX_NODES:
+                submit_layout(graph_hash, graph)
+                return jsonify({
+                    'success': True,
+                    'status': 'pending',
+                    'hash': graph_hash
+                }), 202
+            positions = compute_layout(graph)
+            set_cached_layout(graph_hash, positions)
+        
+        positions = {
+            node_id: (round(x + offset_x, 1), round(y + offset_y, 1))
+            for node_id, (x, y) in positions.items()
+        }
+        
+        if data.get('apply') and positions:
+            save_positions(db, request.user_session.id, positions)
+            db.add(ActivityLog(
+                session_id=request.user_session.id,
+                action_type='layout_applied',
+                target_type='session',
+                details={'nodes': len(positions)}
+            ))
+            db.commit()
+            invalidate_user_cache(str(request.user_session.id))
+        
+        return jsonify({
+            'success': True,
+            'status': 'done',
+            'hash': graph_hash,
+            'cached': cached,
+            'positions': {node_id: {'x': x, 'y': y} for node_id, (x, y) in positions.items()}
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @api_bp.route('/nodes', methods=['POST'])
 @require_session
 def create_node():
@@ -216,7 +371,6 @@ def create_node():
             is_deleted=False
         ).count()
         
-        from .config import Config
         if node_count >= Config.MAX_NODES_PER_USER:
             return jsonify({
                 'success': False,
@@ -265,6 +419,44 @@ def create_node():
         }), 500
 
 
+@api_bp.route('/nodes/stats', methods=['GET'])
+@require_session
+def get_nodes_stats():
+    """ノードごとの集計（バッジ・ダッシュボード用。?ids=a,b,... で絞る。省略時はセッションの全ノード）"""
+    try:
+        db = get_session()
+        query = db.query(KnowledgeNode.id, NodeStats).outerjoin(
+            NodeStats, NodeStats.node_id == KnowledgeNode.id
+        ).filter(
+            KnowledgeNode.session_id == request.user_session.id,
+            KnowledgeNode.is_deleted == False
+        )
+        
+        ids = request.args.get('ids')
+        if ids:
+            node_ids = []
+            for value in ids.split(','):
+                try:
+                    node_ids.append(uuid.UUID(value.strip()))
+                except ValueError:
+                    continue
+            query = query.filter(KnowledgeNode.id.in_(node_ids))
+        
+        return jsonify({
+            'success': True,
+            'stats': {
+                str(node_id): stats.to_dict() if stats else NodeStats.empty_dict()
+                for node_id, stats in query.all()
+            }
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @api_bp.route('/nodes/<node_id>', methods=['GET'])
 @require_session
 def get_node(node_id):
@@ -283,9 +475,12 @@ def get_node(node_id):
                 'error': 'ノードが見つかりません'
             }), 404
         
+        data = node.to_dict(include_connections=True)
+        data['stats'] = node.stats.to_dict() if node.stats else NodeStats.empty_dict()
+        
         return jsonify({
             'success': True,
-            'node': node.to_dict(include_connections=True)
+            'node': data
         })
     
     except Exception as e:
@@ -295,6 +490,43 @@ def get_node(node_id):
         }), 500
 
 
+@api_bp.route('/nodes/<node_id>/neighborhood', methods=['GET'])
+@require_session
+def get_node_neighborhood(node_id):
+    """ノードの周辺 depth ホップの部分グラフ（direction は out / in / both）"""
+    try:
+        depth = parse_depth(request.args.get('depth', '1'))
+        direction = request.args.get('direction', 'both')
+        if depth is None or direction not in DIRECTIONS:
+            return jsonify({
+                'success': False,
+                'error': 'depthは1以上の整数、directionはout/in/bothで指定してください'
+            }), 400
+        try:
+            node_id = uuid.UUID(node_id)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'ノードが見つかりません'
+            }), 404
+        
+        db = get_session()
+        cursor = get_cursor(db, request.user_session.id)
+        result = get_neighborhood(db, request.user_session.id, node_id, depth, direction, cursor)
+        if result is None:
+            return jsonify({
+                'success': False,
+                'error': 'ノードが見つかりません'
+            }), 404
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @api_bp.route('/nodes/<node_id>', methods=['PUT'])
 @require_session
 def update_node(node_id):
@@ -331,6 +563,7 @@ def update_node(node_id):
                     'error': '無効なカテゴリです'
                 }), 400
         if 'position' in data:
+            # 位置は node_positions の行だけを更新する（ドラッグ保存で knowledge_nodes を書き換えない）
             node.position_x = data['position'].get('x', node.position_x)
             node.position_y = data['position'].get('y', node.position_y)
         if 'metadata' in data:
@@ -600,44 +833,22 @@ def get_analytics_summary():
     """分析サマリー取得"""
     try:
         db = get_session()
+        # スパイラル分析のキャッシュの版（グラフ構造の版。データより先に読む）
+        structure_version = get_structure_version(db, request.user_session.id)
         
-        # ノードと接続を取得
-        nodes = db.query(KnowledgeNode).filter_by(
-            session_id=request.user_session.id,
-            is_deleted=False
-        ).all()
-        
-        connections = db.query(NodeConnection).join(
-            KnowledgeNode,
-            NodeConnection.source_node_id == KnowledgeNode.id
-        ).filter(
-            KnowledgeNode.session_id == request.user_session.id,
-            KnowledgeNode.is_deleted == False
-        ).all()
-        
-        nodes_data = [node.to_dict() for node in nodes]
-        connections_data = [conn.to_dict() for conn in connections]
+        # サマリーの数値は常に集計クエリの結果だけで作る（マップの大きさによらず数十行）
+        analytics = AnalyticsEngine.summarize(SessionGraphStats.load(db, request.user_session.id))
         
-        # 分析実行
-        distribution = AnalyticsEngine.calculate_category_distribution(nodes_data)
-        balance_score = AnalyticsEngine.calculate_balance_score(nodes_data)
-        flow_quality = AnalyticsEngine.analyze_flow_quality(nodes_data, connections_data)
-        completion_score = AnalyticsEngine.calculate_completion_score(nodes_data, connections_data)
-        suggestions = AnalyticsEngine.suggest_next_steps(nodes_data, connections_data)
-        insights = AnalyticsEngine.generate_insights(nodes_data, connections_data)
+        # グラフ全体を読むのは構造が変わってスパイラル分析がキャッシュに無いときだけ
+        spiral = get_cached_spiral(request.user_session.id, structure_version)
+        if spiral is None:
+            spiral = analyze_spiral(SessionGraph.load(db, request.user_session.id))
+            cache_spiral(request.user_session.id, structure_version, spiral)
+        analytics['spiral'] = spiral
         
         return jsonify({
             'success': True,
-            'analytics': {
-                'total_nodes': len(nodes_data),
-                'total_connections': len(connections_data),
-                'category_distribution': distribution,
-                'balance_score': balance_score,
-                'flow_quality': flow_quality,
-                'completion_score': completion_score,
-                'suggestions': suggestions,
-                'insights': insights
-            }
+            'analytics': analytics
         })
     
     except Exception as e:
@@ -725,9 +936,13 @@ def get_activity_log():
     try:
         limit = int(request.args.get('limit', 50))
         
+        # 保持期間内に絞って古い月次パーティションを走査対象から外す
+        since = datetime.utcnow() - timedelta(days=Config.ACTIVITY_LOG_RETENTION_DAYS)
+        
         db = get_session()
-        activities = db.query(ActivityLog).filter_by(
-            session_id=request.user_session.id
+        activities = db.query(ActivityLog).filter(
+            ActivityLog.session_id == request.user_session.id,
+            ActivityLog.created_at >= since
         ).order_by(ActivityLog.created_at.desc()).limit(limit).all()
         
         return jsonify({
@@ -964,9 +1179,11 @@ def add_reaction(node_id):
         
         db = get_session()
         
-        # ノードの存在確認
+        # ノードの存在確認（自分のセッションのノードのみ。シャード構成では他のセッションの
+        # ノードは別のデータベースにあり、このシャードには無い）
         node = db.query(KnowledgeNode).filter_by(
             id=node_id,
+            session_id=request.user_session.id,
             is_deleted=False
         ).first()
         
@@ -1013,28 +1230,31 @@ def get_node_reactions(node_id):
     try:
         db = get_session()
         
-        reactions = db.query(NodeReaction).filter_by(node_id=node_id).all()
+        # ノードの存在確認（自分のセッションのノードのみ。add_reaction と同じ）
+        node = db.query(KnowledgeNode).filter_by(
+            id=node_id,
+            session_id=request.user_session.id,
+            is_deleted=False
+        ).first()
+        
+        if not node:
+            return jsonify({'success': False, 'error': 'ノードが見つかりません'}), 404
         
-        # リアクションタイプ別にカウント
+        # 件数は node_stats から読み、全リアクションの行は読まない
+        stats = db.get(NodeStats, node_id)
         reaction_counts = {
-            'likes': 0,
-            'stars': 0,
-            'bookmarks': 0
+            'likes': stats.like_count if stats else 0,
+            'stars': stats.star_count if stats else 0,
+            'bookmarks': stats.bookmark_count if stats else 0
         }
         
-        user_reactions = []
-        
-        for reaction in reactions:
-            if reaction.reaction_type == 'like':
-                reaction_counts['likes'] += 1
-            elif reaction.reaction_type == 'star':
-                reaction_counts['stars'] += 1
-            elif reaction.reaction_type == 'bookmark':
-                reaction_counts['bookmarks'] += 1
-            
-            # 自分のリアクション
-            if reaction.session_id == request.user_session.id:
-                user_reactions.append(reaction.reaction_type)
+        # 自分のリアクション
+        user_reactions = [
+            reaction_type for (reaction_type,) in db.query(NodeReaction.reaction_type).filter_by(
+                node_id=node_id,
+                session_id=request.user_session.id
+            )
+        ]
         
         return jsonify({
             'success': True,
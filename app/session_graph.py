@@ -0,0 +1,281 @@
+"""
+セッションのグラフのコンパクトな表現（SessionGraph）
+
+分析・レイアウト・スパイラル分析はノードの id・カテゴリと接続の向きしか使わないのに、
+to_dict() の辞書（タイトル・説明・メタデータ・日時の文字列を含む）のリストと、
+id 文字列をキーにした辞書・集合で処理していた。ここではノードを 0..n-1 の番号で表し、
+  - ids:        番号 → id 文字列（list）
+  - codes:      番号 → カテゴリ番号（array('b')。CATEGORIES の順、不明なカテゴリは -1）
+  - out / in:   接続の CSR（offsets[i]:offsets[i + 1] が i の行き先 / 出元。array('i')）
+  - dangling:   行き先のノードが生きていない接続の出元（分析の接続数には数える）
+だけを持つ。DB の行から1回だけ作り、分析（AnalyticsEngine）・レイアウト（app/layout.py）・
+スパイラル分析（app/graph_analysis.py）で使い回す。__slots__ なのでそのまま pickle して
+レイアウトのワーカープロセスにも渡せる。
+
+分析サマリーの数値（ノード数・カテゴリ分布・カテゴリ間の接続数・孤立ノード数）には
+グラフ全体は要らないので、SessionGraphStats が同じメソッドを集計クエリ2本の結果で返す。
+DB から届くのはカテゴリの組ごとの数十行で、マップの大きさによらない。分析サマリーは常にこちらを使い、
+SessionGraph を読むのはスパイラル分析をグラフ構造の版ごとに計算し直すときだけ。
+"""
+from array import array
+
+from .database import read_only_text
+
+CATEGORIES = ('socialization', 'externalization', 'combination', 'internalization')
+CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORIES)}
+
+# 生存ノード（レイアウトの初期配置がこの順で決まるので id 順）
+GRAPH_NODES_QUERY = read_only_text("""
+    SELECT id, category FROM knowledge_nodes
+    WHERE session_id = :sid AND is_deleted = false
+    ORDER BY id
+""")
+
+# 出元が生きている接続（行き先が削除済みのものは dangling になる）
+GRAPH_EDGES_QUERY = read_only_text("""
+    SELECT nc.source_node_id, nc.target_node_id
+    FROM node_connections nc
+    JOIN knowledge_nodes s ON s.id = nc.source_node_id
+    WHERE s.session_id = :sid AND NOT s.is_deleted
+""")
+
+
+# カテゴリごとの生存ノード数と孤立ノード数（出元としての接続も、生きた出元からの接続も無いもの）
+NODE_STATS_QUERY = read_only_text("""
+    SELECT kn.category,
+           count(*) AS nodes,
+           count(*) FILTER (
+               WHERE NOT EXISTS (
+                   SELECT 1 FROM node_connections nc WHERE nc.source_node_id = kn.id
+               )
+               AND NOT EXISTS (
+                   SELECT 1 FROM node_connections nc
+                   JOIN knowledge_nodes s ON s.id = nc.source_node_id
+                   WHERE nc.target_node_id = kn.id AND s.session_id = :sid AND NOT s.is_deleted
+               )
+           ) AS isolated
+    FROM knowledge_nodes kn
+    WHERE kn.session_id = :sid AND NOT kn.is_deleted
+    GROUP BY kn.category
+""")
+
+# (出元のカテゴリ, 行き先のカテゴリ) ごとの接続数。GRAPH_EDGES_QUERY と同じく出元が生きている接続で、
+# 行き先が生きていないもの（dangling）は行き先のカテゴリが NULL の行になる
+EDGE_STATS_QUERY = read_only_text("""
+    SELECT s.category, t.category, count(*) AS connections
+    FROM node_connections nc
+    JOIN knowledge_nodes s ON s.id = nc.source_node_id
+    LEFT JOIN knowledge_nodes t
+      ON t.id = nc.target_node_id AND t.session_id = :sid AND NOT t.is_deleted
+    WHERE s.session_id = :sid AND NOT s.is_deleted
+    GROUP BY s.category, t.category
+""")
+
+
+def _csr(sources, targets, size):
+    """(sources[k], targets[k]) の組から offsets と行き先の配列を作る（計数ソート）"""
+    offsets = array('i', bytes(4 * (size + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+    filled = array('i', offsets[:-1])
+    adjacency = array('i', bytes(4 * len(sources)))
+    for source, target in zip(sources, targets):
+        adjacency[filled[source]] = target
+        filled[source] += 1
+    return offsets, adjacency
+
+
+class SessionGraph:
+    """ノード番号・カテゴリ番号の配列と CSR の隣接で表したセッションのグラフ"""
+
+    __slots__ = ('ids', 'codes', 'out_offsets', 'out_targets', 'in_offsets', 'in_targets', 'dangling', '_index')
+
+    def __init__(self, ids, codes, sources, targets, dangling=()):
+        self.ids = ids
+        self.codes = codes
+        size = len(ids)
+        self.out_offsets, self.out_targets = _csr(sources, targets, size)
+        self.in_offsets, self.in_targets = _csr(targets, sources, size)
+        self.dangling = array('i', dangling)
+        self._index = None
+
+    @classmethod
+    def from_rows(cls, node_rows, edge_rows):
+        """ノードの行 (id, category) と接続の行 (source_id, target_id) から作る"""
+        ids = []
+        codes = array('b')
+        for node_id, category in node_rows:
+            ids.append(str(node_id))
+            codes.append(CATEGORY_CODES.get(category, -1))
+        index = {node_id: i for i, node_id in enumerate(ids)}
+
+        sources, targets, dangling = array('i'), array('i'), array('i')
+        for source_id, target_id in edge_rows:
+            source = index.get(str(source_id))
+            if source is None:
+                continue
+            target = index.get(str(target_id))
+            if target is None:
+                dangling.append(source)
+            else:
+                sources.append(source)
+                targets.append(target)
+
+        graph = cls(ids, codes, sources, targets, dangling)
+        graph._index = index
+        return graph
+
+    @classmethod
+    def from_dicts(cls, nodes, connections=()):
+        """to_dict() のノード・接続のリストから作る"""
+        return cls.from_rows(
+            ((node['id'], node['category']) for node in nodes),
+            ((conn['source_id'], conn['target_id']) for conn in connections),
+        )
+
+    @classmethod
+    def load(cls, db, session_id):
+        """セッションの生存ノードと接続を読んで作る（Flask 側）"""
+        return cls.from_rows(
+            db.execute(GRAPH_NODES_QUERY, {'sid': session_id}).all(),
+            db.execute(GRAPH_EDGES_QUERY, {'sid': session_id}).all(),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getstate__(self):
+        # 番号の辞書は大きいので送らず、必要になったら作り直す
+        return (self.ids, self.codes, self.out_offsets, self.out_targets,
+                self.in_offsets, self.in_targets, self.dangling)
+
+    def __setstate__(self, state):
+        (self.ids, self.codes, self.out_offsets, self.out_targets,
+         self.in_offsets, self.in_targets, self.dangling) = state
+        self._index = None
+
+    @property
+    def edge_count(self):
+        """両端が生きている接続の数"""
+        return len(self.out_targets)
+
+    @property
+    def connection_count(self):
+        """出元が生きている接続の数（分析の接続数）"""
+        return len(self.out_targets) + len(self.dangling)
+
+    def index_of(self, node_id):
+        if self._index is None:
+            self._index = {node_id: i for i, node_id in enumerate(self.ids)}
+        return self._index.get(str(node_id))
+
+    def category(self, i):
+        code = self.codes[i]
+        return CATEGORIES[code] if code >= 0 else None
+
+    def successors(self, i):
+        return self.out_targets[self.out_offsets[i]:self.out_offsets[i + 1]]
+
+    def predecessors(self, i):
+        return self.in_targets[self.in_offsets[i]:self.in_offsets[i + 1]]
+
+    def edges(self):
+        """両端が生きている接続 (出元の番号, 行き先の番号)"""
+        offsets, targets = self.out_offsets, self.out_targets
+        for source in range(len(self.ids)):
+            for k in range(offsets[source], offsets[source + 1]):
+                yield source, targets[k]
+
+    def nodes_of(self, code):
+        return [i for i, c in enumerate(self.codes) if c == code]
+
+    def category_counts(self):
+        """カテゴリ番号ごとのノード数"""
+        counts = [0] * len(CATEGORIES)
+        for code in self.codes:
+            if code >= 0:
+                counts[code] += 1
+        return counts
+
+    def flow_matrix(self):
+        """matrix[出元のカテゴリ][行き先のカテゴリ] = 接続数"""
+        matrix = [[0] * len(CATEGORIES) for _ in CATEGORIES]
+        codes = self.codes
+        for source, target in self.edges():
+            if codes[source] >= 0 and codes[target] >= 0:
+                matrix[codes[source]][codes[target]] += 1
+        return matrix
+
+    def isolated_count(self):
+        """どの接続にも含まれないノードの数"""
+        out_offsets, in_offsets = self.out_offsets, self.in_offsets
+        has_dangling = set(self.dangling)
+        return sum(
+            1 for i in range(len(self.ids))
+            if out_offsets[i] == out_offsets[i + 1] and in_offsets[i] == in_offsets[i + 1]
+            and i not in has_dangling
+        )
+
+    def ideal_flows(self):
+        """SECI の理想的な遷移（次のフェーズへの接続）だけを残したグラフ（重複は1本にまとめる）"""
+        codes = self.codes
+        pairs = sorted({
+            (source, target) for source, target in self.edges()
+            if codes[source] >= 0 and codes[target] == (codes[source] + 1) % len(CATEGORIES)
+        })
+        graph = SessionGraph(
+            self.ids, self.codes,
+            array('i', (s for s, _ in pairs)), array('i', (t for _, t in pairs)),
+        )
+        graph._index = self._index
+        return graph
+
+
+class SessionGraphStats:
+    """分析サマリーに要る集計だけを持つ SessionGraph の代わり（AnalyticsEngine にそのまま渡せる）"""
+
+    __slots__ = ('node_count', 'connection_count', 'counts', 'matrix', 'isolated')
+
+    def __init__(self, node_rows, edge_rows):
+        """node_rows: (category, nodes, isolated)、edge_rows: (出元のカテゴリ, 行き先のカテゴリ, 接続数)"""
+        self.node_count = 0
+        self.isolated = 0
+        self.counts = [0] * len(CATEGORIES)
+        for category, nodes, isolated in node_rows:
+            self.node_count += nodes
+            self.isolated += isolated
+            code = CATEGORY_CODES.get(category, -1)
+            if code >= 0:
+                self.counts[code] += nodes
+
+        # 行き先が生きていない・カテゴリが不明な接続は接続数にだけ数える（SessionGraph と同じ）
+        self.connection_count = 0
+        self.matrix = [[0] * len(CATEGORIES) for _ in CATEGORIES]
+        for source_category, target_category, connections in edge_rows:
+            self.connection_count += connections
+            source = CATEGORY_CODES.get(source_category, -1)
+            target = CATEGORY_CODES.get(target_category, -1)
+            if source >= 0 and target >= 0:
+                self.matrix[source][target] += connections
+
+    @classmethod
+    def load(cls, db, session_id):
+        """集計クエリで作る（Flask 側）"""
+        return cls(
+            db.execute(NODE_STATS_QUERY, {'sid': session_id}).all(),
+            db.execute(EDGE_STATS_QUERY, {'sid': session_id}).all(),
+        )
+
+    def __len__(self):
+        return self.node_count
+
+    def category_counts(self):
+        return list(self.counts)
+
+    def flow_matrix(self):
+        return [list(row) for row in self.matrix]
+
+    def isolated_count(self):
+        return self.isolated
@@ -98,6 +98,17 @@ function updateFlowQuality() {
     document.getElementById('flowScore').textContent = flowQuality.score + '%';
     document.getElementById('idealFlows').textContent = flowQuality.ideal_flows;
     document.getElementById('totalFlows').textContent = flowQuality.total_flows;
+    
+    // スパイラル（4フェーズを一周する循環）
+    const spiral = analyticsData.spiral;
+    if (spiral) {
+        const chain = spiral.longest_chain;
+        document.getElementById('spiralCycles').textContent =
+            spiral.complete_cycles + (spiral.truncated ? '+' : '');
+        document.getElementById('longestChain').textContent = chain.length + (chain.capped ? '+' : '');
+        document.getElementById('spiralCoverage').textContent =
+            `${spiral.nodes_in_cycles}個のノード（${spiral.coverage_percentage}%）がスパイラルに含まれています。`;
+    }
 }
 
 // 完成度円グラフ
@@ -0,0 +1,209 @@
+/**
+ * Canvas によるマップ描画（ノード数が多いときに mapper.js が SVG の代わりに使う）
+ *
+ * ノードと接続を1枚の canvas に描く。SVG のように要素ごとのイベントが無いので、
+ * ホバー・クリック・ドラッグの当たり判定は d3.quadtree で最も近いノードを探す。
+ * 四分木はシミュレーションが動いたら作り直し、フィルターで隠したカテゴリは入れない
+ * （SVG 側の pointer-events: none と同じ扱い）。
+ */
+
+const CanvasRenderer = {
+    NODE_RADIUS: 20,
+    // これより縮小したらラベルと矢印を省く（文字が読めず描画コストだけかかる）
+    LABEL_MIN_SCALE: 0.8,
+
+    canvas: null,
+    context: null,
+    width: 0,
+    height: 0,
+    ratio: 1,
+    nodes: [],
+    links: [],
+    transform: d3.zoomIdentity,
+    visibleCategories: null,
+    hovered: null,
+    tree: null,
+    drawPending: false,
+
+    // 描画先の canvas を container の最背面に作る（SVG はその上でイベントを受ける）
+    init(container) {
+        this.canvas = document.createElement('canvas');
+        this.canvas.className = 'map-canvas-layer';
+        container.insertBefore(this.canvas, container.firstChild);
+        this.context = this.canvas.getContext('2d');
+        this.resize(container.clientWidth, container.clientHeight);
+        this.show(false);
+    },
+
+    resize(width, height) {
+        this.ratio = window.devicePixelRatio || 1;
+        this.width = width;
+        this.height = height;
+        this.canvas.width = Math.round(width * this.ratio);
+        this.canvas.height = Math.round(height * this.ratio);
+        this.canvas.style.width = width + 'px';
+        this.canvas.style.height = height + 'px';
+        this.requestDraw();
+    },
+
+    show(on) {
+        this.canvas.style.display = on ? '' : 'none';
+        if (!on) this.hovered = null;
+    },
+
+    // links は source / target がノードのオブジェクト（d3.forceLink 初期化後のもの）
+    setData(nodes, links) {
+        this.nodes = nodes;
+        this.links = links;
+        if (this.hovered && !nodes.includes(this.hovered)) this.hovered = null;
+        this.markMoved();
+    },
+
+    setTransform(transform) {
+        this.transform = transform;
+        this.requestDraw();
+    },
+
+    // null ならすべて表示
+    setVisibleCategories(categories) {
+        this.visibleCategories = categories;
+        this.markMoved();
+    },
+
+    setHovered(node) {
+        if (node === this.hovered) return;
+        this.hovered = node;
+        this.requestDraw();
+    },
+
+    // 位置が変わった（シミュレーションの tick・ドラッグ）
+    markMoved() {
+        this.tree = null;
+        this.requestDraw();
+    },
+
+    isVisible(node) {
+        return !this.visibleCategories || this.visibleCategories.has(node.category);
+    },
+
+    // 画面座標 (px, py) にあるノード（無ければ null）
+    findNode(px, py) {
+        if (!this.tree) {
+            this.tree = d3.quadtree()
+                .x(d => d.x)
+                .y(d => d.y)
+                .addAll(this.nodes.filter(node => this.isVisible(node)));
+        }
+        const [x, y] = this.transform.invert([px, py]);
+        return this.tree.find(x, y, this.NODE_RADIUS) || null;
+    },
+
+    // 1フレームに1回だけ描く
+    requestDraw() {
+        if (this.drawPending || !this.context) return;
+        this.drawPending = true;
+        requestAnimationFrame(() => {
+            this.drawPending = false;
+            this.draw();
+        });
+    },
+
+    draw() {
+        const ctx = this.context;
+        const { k, x, y } = this.transform;
+        const r = this.NODE_RADIUS;
+        ctx.setTransform(1, 0, 0, 1, 0, 0);
+        ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
+        ctx.setTransform(this.ratio * k, 0, 0, this.ratio * k, this.ratio * x, this.ratio * y);
+
+        // 画面外のノードは描かない（ワールド座標の表示範囲 + 半径分）
+        const [x0, y0] = this.transform.invert([0, 0]);
+        const [x1, y1] = this.transform.invert([this.width, this.height]);
+        const inView = d => d.x >= x0 - r && d.x <= x1 + r && d.y >= y0 - r && d.y <= y1 + r;
+        const detailed = k >= this.LABEL_MIN_SCALE;
+
+        // 接続: 表示・非表示それぞれ1本のパスにまとめて描く
+        const shown = new Path2D();
+        const dimmed = new Path2D();
+        const arrows = new Path2D();
+        this.links.forEach(link => {
+            const source = link.source;
+            const target = link.target;
+            if (!inView(source) && !inView(target)) return;
+            const path = this.isVisible(source) && this.isVisible(target) ? shown : dimmed;
+            path.moveTo(source.x, source.y);
+            path.lineTo(target.x, target.y);
+            if (detailed && path === shown) this.addArrow(arrows, source, target);
+        });
+        ctx.lineWidth = 2;
+        ctx.strokeStyle = '#999';
+        ctx.globalAlpha = 0.1;
+        ctx.stroke(dimmed);
+        ctx.globalAlpha = 0.6;
+        ctx.stroke(shown);
+        ctx.fillStyle = '#999';
+        ctx.fill(arrows);
+
+        // ノード: カテゴリ × 表示/非表示ごとに1本のパス
+        const groups = new Map();
+        const labels = [];
+        this.nodes.forEach(node => {
+            if (!inView(node)) return;
+            const visible = this.isVisible(node);
+            const key = node.category + (visible ? '' : ':dimmed');
+            let group = groups.get(key);
+            if (!group) {
+                group = { category: node.category, visible, path: new Path2D() };
+                groups.set(key, group);
+            }
+            group.path.moveTo(node.x + r, node.y);
+            group.path.arc(node.x, node.y, r, 0, 2 * Math.PI);
+            if (detailed && visible) labels.push(node);
+        });
+        ctx.lineWidth = 3;
+        ctx.strokeStyle = 'white';
+        groups.forEach(group => {
+            ctx.globalAlpha = group.visible ? 1 : 0.2;
+            ctx.fillStyle = CATEGORY_INFO[group.category].color;
+            ctx.fill(group.path);
+            ctx.stroke(group.path);
+        });
+        ctx.globalAlpha = 1;
+
+        if (this.hovered && inView(this.hovered)) {
+            ctx.lineWidth = 5;
+            ctx.beginPath();
+            ctx.arc(this.hovered.x, this.hovered.y, r, 0, 2 * Math.PI);
+            ctx.stroke();
+        }
+
+        if (labels.length) {
+            ctx.fillStyle = '#333';
+            ctx.font = '500 12px sans-serif';
+            ctx.textAlign = 'center';
+            ctx.textBaseline = 'alphabetic';
+            labels.forEach(node => {
+                const title = node.title.length > 15 ? node.title.substring(0, 15) + '...' : node.title;
+                ctx.fillText(title, node.x, node.y + 35);
+            });
+        }
+    },
+
+    // 接続の矢印（SVG のマーカーと同じく相手のノードの縁の手前に置く）
+    addArrow(path, source, target) {
+        const dx = target.x - source.x;
+        const dy = target.y - source.y;
+        const length = Math.hypot(dx, dy);
+        if (length < this.NODE_RADIUS * 2) return;
+        const ux = dx / length;
+        const uy = dy / length;
+        const tipX = target.x - ux * (this.NODE_RADIUS + 2);
+        const tipY = target.y - uy * (this.NODE_RADIUS + 2);
+        path.moveTo(tipX, tipY);
+        path.lineTo(tipX - ux * 9 - uy * 4.5, tipY - uy * 9 + ux * 4.5);
+        path.lineTo(tipX - ux * 9 + uy * 4.5, tipY - uy * 9 - ux * 4.5);
+        path.closePath();
+    }
+};
+
+window.CanvasRenderer = CanvasRenderer;
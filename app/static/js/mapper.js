@@ -7,10 +7,32 @@
 
 let nodes = [];
 let connections = [];
-let svg, g, simulation;
+// id → ノード（updateVisualization で作り直す）
+let nodeById = new Map();
+let svg, g, simulation, zoomBehavior, clusterLayer;
 let currentNode = null;
 let transform = d3.zoomIdentity;
 
+// 大きいセッションは表示範囲ごとに読む（サーバーが viewport: true を返したとき）
+let viewportMode = false;
+let viewportTotal = 0;
+let viewportTimer = null;
+const VIEWPORT_DEBOUNCE = 250;
+const VIEWPORT_PADDING = 0.25;
+// 範囲読み込み中にこの拡大率より縮小したらクラスタ要約を描く
+const CLUSTER_ZOOM_THRESHOLD = 0.5;
+const CLUSTER_MIN_SCALE = 0.02;
+let clustered = false;
+
+// ノード数がこれを超えたら SVG の代わりに canvas（canvas_renderer.js）で描く
+const CANVAS_NODE_THRESHOLD = 1000;
+let canvasMode = false;
+
+// 差分同期（/api/changes）のカーソル。null なら全件を取り直す
+let changeCursor = null;
+let syncInFlight = null;
+const CHANGE_POLL_INTERVAL = 10000;
+
 // D3.js初期化
 function initializeD3() {
     const canvas = document.getElementById('mapCanvas');
@@ -28,11 +50,30 @@ function initializeD3() {
         .on('zoom', (event) => {
             transform = event.transform;
             g.attr('transform', transform);
+            if (canvasMode) CanvasRenderer.setTransform(transform);
+        })
+        .on('end', scheduleViewportLoad);
+    
+    // canvas 描画中のノード操作（ノード上で押したときだけドラッグになるよう zoom より先に登録）
+    CanvasRenderer.init(canvas);
+    svg.call(canvasDrag())
+        .on('mousemove.canvas', (event) => {
+            if (!canvasMode) return;
+            const node = canvasNodeAt(...d3.pointer(event));
+            CanvasRenderer.setHovered(node);
+            svg.style('cursor', node ? 'pointer' : null);
+        })
+        .on('click.canvas', (event) => {
+            if (!canvasMode) return;
+            const node = canvasNodeAt(...d3.pointer(event));
+            if (node) showNodeDetail(node);
         });
     
     svg.call(zoom);
+    zoomBehavior = zoom;
     
     g = svg.append('g');
+    clusterLayer = g.append('g').attr('class', 'cluster-layer');
     
     // 矢印マーカー定義
     svg.append('defs').selectAll('marker')
@@ -73,9 +114,22 @@ function initializeD3() {
 // データロード
 async function loadData() {
     try {
-        const response = await apiRequest('/nodes');
+        const response = await apiRequest(`/nodes?bbox=${viewportBBox().join(',')}`);
         nodes = response.nodes || [];
         connections = response.connections || [];
+        changeCursor = response.cursor ?? null;
+        viewportMode = Boolean(response.viewport);
+        viewportTotal = response.total || 0;
+        // 大きいマップは全体が見えるところまで縮小できるようにする
+        zoomBehavior.scaleExtent([viewportMode ? CLUSTER_MIN_SCALE : 0.5, 3]);
+        // 保存済みの位置から始める（端末ごとに配置が変わらないように）
+        nodes.forEach(node => {
+            if (node.position && (node.position.x || node.position.y)) {
+                node.x = node.position.x;
+                node.y = node.position.y;
+            }
+            if (viewportMode) pinToSavedPosition(node);
+        });
         updateVisualization();
         updateStats();
     } catch (error) {
@@ -83,13 +137,244 @@ async function loadData() {
     }
 }
 
+// 表示範囲（ワールド座標。先読みのため上下左右に広げる）
+function viewportBBox() {
+    const canvas = document.getElementById('mapCanvas');
+    const width = canvas.clientWidth;
+    const height = canvas.clientHeight;
+    const padX = width * VIEWPORT_PADDING;
+    const padY = height * VIEWPORT_PADDING;
+    const [x0, y0] = transform.invert([-padX, -padY]);
+    const [x1, y1] = transform.invert([width + padX, height + padY]);
+    return [x0, y0, x1, y1].map(v => Math.round(v));
+}
+
+// 範囲読み込みのノードは保存位置に固定する（一部だけのシミュレーションで動かさない）
+function pinToSavedPosition(node) {
+    const position = node.position || { x: 0, y: 0 };
+    node.x = node.fx = position.x;
+    node.y = node.fy = position.y;
+}
+
+function scheduleViewportLoad() {
+    if (!viewportMode) return;
+    clearTimeout(viewportTimer);
+    viewportTimer = setTimeout(() => {
+        if (transform.k < CLUSTER_ZOOM_THRESHOLD) {
+            loadClusters();
+        } else {
+            showClusters(false);
+            loadViewport();
+        }
+    }, VIEWPORT_DEBOUNCE);
+}
+
+function showClusters(on) {
+    clustered = on;
+    d3.select('#mapCanvas').classed('map-clustered', on);
+    if (!on) clusterLayer.selectAll('*').remove();
+}
+
+// 縮小表示: ノードの代わりにクラスタ（重心・件数・カテゴリ内訳）と接続数を描く
+async function loadClusters() {
+    try {
+        const response = await apiRequest(`/nodes/clusters?zoom=${transform.k}&bbox=${viewportBBox().join(',')}`);
+        if (transform.k >= CLUSTER_ZOOM_THRESHOLD) return;  // 応答待ちの間に拡大された
+        renderClusters(response);
+    } catch (error) {
+        console.error('クラスタ要約の読み込みエラー:', error);
+    }
+}
+
+function renderClusters(response) {
+    showClusters(true);
+    const byId = new Map(response.clusters.map(c => [c.id, c]));
+    // 画面上の大きさを拡大率に依らず一定にする
+    const scale = 1 / transform.k;
+    const radius = c => (8 + 4 * Math.sqrt(c.count)) * scale;
+    const dominant = c => Object.entries(c.categories).sort((a, b) => b[1] - a[1])[0][0];
+    
+    clusterLayer.selectAll('.cluster-link')
+        .data(response.edges.filter(e => byId.has(e.source) && byId.has(e.target)))
+        .join('line')
+        .attr('class', 'cluster-link')
+        .attr('x1', e => byId.get(e.source).x)
+        .attr('y1', e => byId.get(e.source).y)
+        .attr('x2', e => byId.get(e.target).x)
+        .attr('y2', e => byId.get(e.target).y)
+        .attr('stroke-width', e => (1 + Math.log2(e.weight)) * scale);
+    
+    const cluster = clusterLayer.selectAll('.cluster')
+        .data(response.clusters, c => c.id)
+        .join(enter => {
+            const group = enter.append('g').attr('class', 'cluster');
+            group.append('circle');
+            group.append('text').attr('dy', '0.35em');
+            return group;
+        })
+        .attr('transform', c => `translate(${c.x},${c.y})`);
+    cluster.select('circle')
+        .attr('r', radius)
+        .attr('fill', c => CATEGORY_INFO[dominant(c)].color);
+    cluster.select('text')
+        .style('font-size', `${11 * scale}px`)
+        .text(c => c.count);
+}
+
+// パン・ズーム後の表示範囲のノードと接続を読み足す
+async function loadViewport() {
+    try {
+        const response = await apiRequest(`/nodes?bbox=${viewportBBox().join(',')}`);
+        if (!response.viewport) {
+            // ノードが減って全件表示に戻った
+            return loadData();
+        }
+        const nodeById = new Map(nodes.map(n => [n.id, n]));
+        let added = false;
+        response.nodes.forEach(node => {
+            if (nodeById.has(node.id)) return;
+            pinToSavedPosition(node);
+            nodeById.set(node.id, node);
+            added = true;
+        });
+        const connectionIds = new Set(connections.map(c => c.id));
+        response.connections.forEach(conn => {
+            if (connectionIds.has(conn.id)) return;
+            connections.push(conn);
+            added = true;
+        });
+        viewportTotal = response.total;
+        if (added) {
+            nodes = Array.from(nodeById.values());
+            updateVisualization();
+            updateStats();
+        }
+    } catch (error) {
+        console.error('表示範囲の読み込みエラー:', error);
+    }
+}
+
+// 差分同期: カーソル以降の変更だけを取得してその場で反映
+function syncChanges() {
+    // 同時に走らせない（保存直後とポーリングが重なった場合は実行中のものを待つ）
+    if (!syncInFlight) {
+        syncInFlight = fetchChanges().finally(() => { syncInFlight = null; });
+    }
+    return syncInFlight;
+}
+
+async function fetchChanges() {
+    if (changeCursor === null) {
+        return loadData();
+    }
+    try {
+        const response = await apiRequest(`/changes?since=${changeCursor}`);
+        if (response.reset) {
+            return loadData();
+        }
+        if (applyChanges(response)) {
+            updateVisualization();
+            updateStats();
+        }
+        changeCursor = response.cursor;
+    } catch (error) {
+        console.error('差分同期エラー:', error);
+    }
+}
+
+// 変更をノード・接続の配列に反映（変化があれば true）
+function applyChanges(delta) {
+    const deletedNodes = new Set(delta.deleted.nodes);
+    const deletedConnections = new Set(delta.deleted.connections);
+    if (!delta.nodes.length && !delta.connections.length && !deletedNodes.size && !deletedConnections.size) {
+        return false;
+    }
+    
+    const nodeById = new Map(nodes.map(n => [n.id, n]));
+    delta.nodes.forEach(changed => {
+        const existing = nodeById.get(changed.id);
+        if (existing) {
+            // 別のタブで位置が保存されていればそこへ動かす（シミュレーションの状態は残す）
+            const moved = existing.position && changed.position &&
+                (existing.position.x !== changed.position.x || existing.position.y !== changed.position.y);
+            Object.assign(existing, changed);
+            if (moved) {
+                existing.x = changed.position.x;
+                existing.y = changed.position.y;
+                if (viewportMode) pinToSavedPosition(existing);
+            }
+        } else {
+            const position = changed.position || {};
+            if (position.x || position.y) {
+                changed.x = position.x;
+                changed.y = position.y;
+            }
+            if (viewportMode) pinToSavedPosition(changed);
+            nodeById.set(changed.id, changed);
+        }
+    });
+    deletedNodes.forEach(id => nodeById.delete(id));
+    nodes = Array.from(nodeById.values());
+    
+    const connectionById = new Map(connections.map(c => [c.id, c]));
+    delta.connections.forEach(changed => {
+        connectionById.set(changed.id, Object.assign(connectionById.get(changed.id) || {}, changed));
+    });
+    deletedConnections.forEach(id => connectionById.delete(id));
+    // 端のノードが消えた接続も外す
+    connections = Array.from(connectionById.values())
+        .filter(c => !deletedNodes.has(c.source_id) && !deletedNodes.has(c.target_id));
+    
+    if (currentNode && deletedNodes.has(currentNode.id)) {
+        currentNode = null;
+    }
+    return true;
+}
+
 // ビジュアライゼーション更新
 function updateVisualization() {
     if (!g) return;
     
-    // リンク描画
+    // リンク描画（両端のノードを読み込み済みのものだけ）
+    nodeById = new Map(nodes.map(n => [n.id, n]));
+    const drawnConnections = connections.filter(c => nodeById.has(c.source_id) && nodeById.has(c.target_id));
+    const links = drawnConnections.map(c => ({
+        source: c.source_id,
+        target: c.target_id,
+        id: c.id
+    }));
+    
+    canvasMode = nodes.length > CANVAS_NODE_THRESHOLD;
+    CanvasRenderer.show(canvasMode);
+    let tick;
+    if (canvasMode) {
+        g.selectAll('.node, .link').remove();
+        svg.style('cursor', null);
+        tick = () => CanvasRenderer.markMoved();
+    } else {
+        tick = renderSvg(drawnConnections);
+    }
+    
+    // Simulation更新
+    simulation.nodes(nodes);
+    simulation.force('link').links(links);
+    
+    if (canvasMode) {
+        // forceLink が source / target をノードに置き換えた後のリンクをそのまま描く
+        CanvasRenderer.setData(nodes, links);
+        CanvasRenderer.setTransform(transform);
+        CanvasRenderer.setVisibleCategories(checkedCategories());
+    }
+    
+    simulation.alpha(1).restart();
+    
+    simulation.on('tick', tick);
+}
+
+// SVG でノードと接続を描き、tick で位置を更新する関数を返す
+function renderSvg(drawnConnections) {
     const link = g.selectAll('.link')
-        .data(connections, d => d.id);
+        .data(drawnConnections, d => d.id);
     
     link.exit().remove();
     
@@ -137,26 +422,40 @@ function updateVisualization() {
     nodeAll.select('text')
         .text(d => d.title.length > 15 ? d.title.substring(0, 15) + '...' : d.title);
     
-    // Simulation更新
-    simulation.nodes(nodes);
-    simulation.force('link').links(connections.map(c => ({
-        source: c.source_id,
-        target: c.target_id,
-        id: c.id
-    })));
-    
-    simulation.alpha(1).restart();
-    
-    simulation.on('tick', () => {
+    return () => {
         linkAll.attr('d', d => {
-            const source = nodes.find(n => n.id === d.source_id);
-            const target = nodes.find(n => n.id === d.target_id);
+            const source = nodeById.get(d.source_id);
+            const target = nodeById.get(d.target_id);
             if (!source || !target) return '';
             return `M${source.x},${source.y} L${target.x},${target.y}`;
         });
         
         nodeAll.attr('transform', d => `translate(${d.x},${d.y})`);
-    });
+    };
+}
+
+// canvas 描画中に画面座標にあるノード（クラスタ表示中は無し）
+function canvasNodeAt(px, py) {
+    return clustered ? null : CanvasRenderer.findNode(px, py);
+}
+
+// canvas 描画中のドラッグ。座標は画面座標で受け取り、ワールド座標に直して共通の処理へ渡す
+function canvasDrag() {
+    const toWorld = (event) => {
+        const [x, y] = transform.invert([event.x, event.y]);
+        return { active: event.active, x, y };
+    };
+    return d3.drag()
+        .subject((event) => {
+            const node = canvasMode ? canvasNodeAt(event.x, event.y) : null;
+            return node && { node, x: transform.applyX(node.x), y: transform.applyY(node.y) };
+        })
+        .on('start', event => dragstarted(toWorld(event), event.subject.node))
+        .on('drag', event => {
+            dragged(toWorld(event), event.subject.node);
+            CanvasRenderer.markMoved();
+        })
+        .on('end', event => dragended(toWorld(event), event.subject.node));
 }
 
 // ドラッグイベント
@@ -194,7 +493,8 @@ async function updateNodePosition(nodeId, x, y) {
 
 // 統計更新
 async function updateStats() {
-    document.getElementById('nodeCount').textContent = nodes.length;
+    // 範囲読み込み中は読み込み済みではなくセッション全体の件数
+    document.getElementById('nodeCount').textContent = viewportMode ? viewportTotal : nodes.length;
     document.getElementById('connectionCount').textContent = connections.length;
     
     // 完成度スコア取得
@@ -250,7 +550,7 @@ document.getElementById('nodeForm').addEventListener('submit', async (e) => {
             }
             
             closeModal('nodeModal');
-            await loadData();
+            await syncChanges();
         } catch (error) {
             console.error('保存エラー:', error);
         }
@@ -398,7 +698,7 @@ document.getElementById('deleteNodeBtn').addEventListener('click', async () => {
         await apiRequest(`/nodes/${currentNode.id}`, { method: 'DELETE' });
         showNotification('ノードを削除しました');
         closeModal('nodeDetailModal');
-        await loadData();
+        await syncChanges();
     } catch (error) {
         console.error('削除エラー:', error);
     }
@@ -407,18 +707,49 @@ document.getElementById('deleteNodeBtn').addEventListener('click', async () => {
 // 自動配置ボタン
 document.getElementById('autoLayoutBtn').addEventListener('click', () => {
     if (simulation) {
-        // ノードの固定を解除
-        nodes.forEach(node => {
-            node.fx = null;
-            node.fy = null;
+        requestServerLayout();
+    }
+});
+
+// サーバー側の自動配置（大きいグラフは計算が終わるまで再送して待つ）
+const LAYOUT_POLL_INTERVAL = 2000;
+const LAYOUT_MAX_POLLS = 60;
+
+async function requestServerLayout(polls = 0) {
+    const canvas = document.getElementById('mapCanvas');
+    try {
+        const response = await apiRequest('/layout', {
+            method: 'POST',
+            body: JSON.stringify({
+                apply: true,
+                center: { x: canvas.clientWidth / 2, y: canvas.clientHeight / 2 }
+            })
         });
-        
-        // シミュレーションを再開
-        simulation.alpha(1).restart();
-        
+        if (response.status === 'pending') {
+            if (polls === 0) showNotification('自動配置を計算しています...');
+            if (polls < LAYOUT_MAX_POLLS) {
+                setTimeout(() => requestServerLayout(polls + 1), LAYOUT_POLL_INTERVAL);
+            }
+            return;
+        }
+        applyLayout(response.positions);
         showNotification('自動配置を実行しました');
+    } catch (error) {
+        console.error('自動配置エラー:', error);
     }
-});
+}
+
+// 配置を反映してノードを固定（ドラッグすると固定が外れる）
+function applyLayout(positions) {
+    nodes.forEach(node => {
+        const position = positions[node.id];
+        if (!position) return;
+        node.position = position;
+        node.x = node.fx = position.x;
+        node.y = node.fy = position.y;
+    });
+    simulation.alpha(0.1).restart();
+}
 
 // エクスポートボタン
 document.getElementById('exportBtn').addEventListener('click', () => {
@@ -573,26 +904,38 @@ document.querySelectorAll('.category-filter').forEach(checkbox => {
     });
 });
 
-// ノードフィルター
+// フィルターで表示中のカテゴリ
+function checkedCategories() {
+    return new Set(
+        Array.from(document.querySelectorAll('.category-filter:checked'))
+            .map(cb => cb.value)
+            .filter(v => v !== 'all')
+    );
+}
+
+// ノードフィルター（接続の両端は id → ノードの Map で引く）
 function filterNodes() {
-    const checkedCategories = Array.from(document.querySelectorAll('.category-filter:checked'))
-        .map(cb => cb.value)
-        .filter(v => v !== 'all');
+    const checked = checkedCategories();
+    
+    if (canvasMode) {
+        CanvasRenderer.setVisibleCategories(checked);
+        return;
+    }
     
     g.selectAll('.node')
         .style('opacity', d => {
-            return checkedCategories.includes(d.category) ? 1 : 0.2;
+            return checked.has(d.category) ? 1 : 0.2;
         })
         .style('pointer-events', d => {
-            return checkedCategories.includes(d.category) ? 'all' : 'none';
+            return checked.has(d.category) ? 'all' : 'none';
         });
     
     g.selectAll('.link')
         .style('opacity', d => {
-            const source = nodes.find(n => n.id === d.source_id);
-            const target = nodes.find(n => n.id === d.target_id);
-            const sourceVisible = source && checkedCategories.includes(source.category);
-            const targetVisible = target && checkedCategories.includes(target.category);
+            const source = nodeById.get(d.source_id);
+            const target = nodeById.get(d.target_id);
+            const sourceVisible = source && checked.has(source.category);
+            const targetVisible = target && checked.has(target.category);
             return (sourceVisible && targetVisible) ? 0.6 : 0.1;
         });
 }
@@ -602,6 +945,14 @@ document.addEventListener('DOMContentLoaded', () => {
     initializeD3();
     loadData();
     
+    // 他のタブでの変更を差分で取り込む（非表示のタブでは止める）
+    setInterval(() => {
+        if (!document.hidden) syncChanges();
+    }, CHANGE_POLL_INTERVAL);
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) syncChanges();
+    });
+    
     // 定期的にデータを更新（30秒ごと）
     setInterval(() => {
         updateStats();
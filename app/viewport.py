@@ -0,0 +1,186 @@
+"""
+表示範囲（ビューポート）単位のノード取得（GET /api/nodes?bbox=x0,y0,x1,y1）
+
+ノード数が VIEWPORT_MIN_NODES を超えるセッションでは、マッパーは表示範囲内のノードと
+それに接する接続だけを取得し、パン・ズームのたびに足りない範囲を追加で読む。
+
+位置の空間インデックスは DB ではなくプロセス内のグリッドで持つ。
+node_positions に GiST インデックスを張ると、ドラッグ保存が HOT 更新でなくなる
+（migrations/005_node_positions.sql）ため。グリッドはセッションごとに作り、
+差分同期のカーソル（app/changes.py）が進んだら作り直す。カーソルはノード・位置の
+変更で必ず進むので、古いグリッドを使い続けることはない。
+
+Flask 側（routes.py）と非同期パス（async_api.py）の両方から使う。
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from .database import read_only_text
+
+# これ以下のノード数なら bbox を無視して全件を返す（マッパーは従来どおり全体を描く）
+VIEWPORT_MIN_NODES = int(os.getenv('VIEWPORT_MIN_NODES', '500'))
+# 1回の応答に含めるノードの上限（縮小表示で範囲が広すぎる場合）
+VIEWPORT_MAX_NODES = int(os.getenv('VIEWPORT_MAX_NODES', '2000'))
+# グリッドを保持するセッション数（プロセスごと）
+VIEWPORT_GRID_CACHE_SESSIONS = int(os.getenv('VIEWPORT_GRID_CACHE_SESSIONS', '256'))
+
+MIN_CELL_SIZE = 64.0
+
+# セッションの生存ノードの位置（位置の行が無いノードは原点）
+POINTS_QUERY = read_only_text("""
+    SELECT kn.id, COALESCE(np.x, 0), COALESCE(np.y, 0)
+    FROM knowledge_nodes kn
+    LEFT JOIN node_positions np ON np.node_id = kn.id
+    WHERE kn.session_id = :sid AND kn.is_deleted = false
+""")
+
+
+def parse_bbox(value):
+    """'x0,y0,x1,y1' を (min_x, min_y, max_x, max_y) に（不正なら ValueError）"""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(p) for p in parts):
+        raise ValueError(value)
+    x0, y0, x1, y1 = parts
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+class SpatialGrid:
+    """点 (id, x, y) の一様グリッド（セルの一辺は点の密度から決める）"""
+
+    def __init__(self, points):
+        self.count = len(points)
+        self.cells = {}
+        if not points:
+            self.cell_size = MIN_CELL_SIZE
+            return
+        xs = [x for _, x, _ in points]
+        ys = [y for _, _, y in points]
+        extent = max(max(xs) - min(xs), max(ys) - min(ys))
+        # 1セルに平均2〜4点程度
+        self.cell_size = max(MIN_CELL_SIZE, extent / math.sqrt(self.count) * 2)
+        for point in points:
+            key = (int(point[1] // self.cell_size), int(point[2] // self.cell_size))
+            self.cells.setdefault(key, []).append(point)
+
+    def __len__(self):
+        return self.count
+
+    def query(self, bbox):
+        """範囲内の点の id"""
+        min_x, min_y, max_x, max_y = bbox
+        size = self.cell_size
+        cx0, cy0 = int(min_x // size), int(min_y // size)
+        cx1, cy1 = int(max_x // size), int(max_y // size)
+
+        # 範囲のセル数が使用中のセル数より多い（縮小表示）なら使用中のセルだけを見る
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            candidates = (
+                points for (cx, cy), points in self.cells.items()
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1
+            )
+        else:
+            candidates = (
+                self.cells[(cx, cy)]
+                for cx in range(cx0, cx1 + 1)
+                for cy in range(cy0, cy1 + 1)
+                if (cx, cy) in self.cells
+            )
+        return [
+            node_id
+            for points in candidates
+            for node_id, x, y in points
+            if min_x <= x <= max_x and min_y <= y <= max_y
+        ]
+
+
+_grids = OrderedDict()
+_grids_lock = threading.Lock()
+
+
+def cached_grid(session_id, cursor):
+    """カーソルが同じならキャッシュ済みのグリッド（無ければ None）"""
+    with _grids_lock:
+        entry = _grids.get(str(session_id))
+        if entry is None or entry[0] != cursor:
+            return None
+        _grids.move_to_end(str(session_id))
+        return entry[1]
+
+
+def store_grid(session_id, cursor, rows):
+    """POINTS_QUERY の結果からグリッドを作ってキャッシュする"""
+    grid = SpatialGrid([(str(node_id), x, y) for node_id, x, y in rows])
+    with _grids_lock:
+        _grids[str(session_id)] = (cursor, grid)
+        _grids.move_to_end(str(session_id))
+        while len(_grids) > VIEWPORT_GRID_CACHE_SESSIONS:
+            _grids.popitem(last=False)
+    return grid
+
+
+def visible_node_ids(grid, bbox):
+    """範囲内のノード id と、上限で切り詰めたかどうか"""
+    ids = grid.query(bbox)
+    if len(ids) > VIEWPORT_MAX_NODES:
+        return ids[:VIEWPORT_MAX_NODES], True
+    return ids, False
+
+
+def viewport_statements(session_id, node_ids):
+    """範囲内のノードと、それに接する接続（両端が生きているもの）を読む文"""
+    from sqlalchemy import and_, or_, select
+    from sqlalchemy.orm import aliased
+    from .models import KnowledgeNode, NodeConnection
+
+    nodes_stmt = select(KnowledgeNode).where(
+        KnowledgeNode.session_id == session_id,
+        KnowledgeNode.is_deleted == False,
+        KnowledgeNode.id.in_(node_ids)
+    )
+    source = aliased(KnowledgeNode)
+    target = aliased(KnowledgeNode)
+    connections_stmt = select(NodeConnection).join(
+        source, NodeConnection.source_node_id == source.id
+    ).join(
+        target, NodeConnection.target_node_id == target.id
+    ).where(
+        source.session_id == session_id,
+        and_(source.is_deleted == False, target.is_deleted == False),
+        or_(NodeConnection.source_node_id.in_(node_ids), NodeConnection.target_node_id.in_(node_ids))
+    )
+    return nodes_stmt, connections_stmt
+
+
+def viewport_response(nodes, connections, bbox, cursor, total, truncated):
+    return {
+        'success': True,
+        'viewport': True,
+        'bbox': list(bbox),
+        'nodes': [node.to_dict() for node in nodes],
+        'connections': [conn.to_dict() for conn in connections],
+        'cursor': cursor,
+        'total': total,
+        'truncated': truncated,
+        'cached': False,
+    }
+
+
+def session_grid(db, session_id, cursor):
+    """セッションのグリッド（Flask 側）"""
+    grid = cached_grid(session_id, cursor)
+    if grid is None:
+        grid = store_grid(session_id, cursor, db.execute(POINTS_QUERY, {'sid': session_id}).all())
+    return grid
+
+
+def load_viewport(db, session_id, grid, bbox, cursor):
+    """範囲内のノードと接続（Flask 側）"""
+    node_ids, truncated = visible_node_ids(grid, bbox)
+    nodes, connections = [], []
+    if node_ids:
+        nodes_stmt, connections_stmt = viewport_statements(session_id, node_ids)
+        nodes = db.execute(nodes_stmt).scalars().all()
+        connections = db.execute(connections_stmt).scalars().all()
+    return viewport_response(nodes, connections, bbox, cursor, len(grid), truncated)
@@ -0,0 +1,99 @@
+"""
+起動時のウォームアップ（gunicorn の preload / post_fork から呼ぶ）
+
+マスターで1回だけ行う準備（マッパー構成、テンプレートのコンパイル）は
+fork 後のワーカーに copy-on-write で共有される。
+接続と文のキャッシュはプロセスごとなので fork 後にワーカーで温める。
+"""
+import logging
+import time
+import uuid
+
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+
+from . import database
+from .cache_manager import get_cache
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_master(app):
+    """マスタープロセスでの準備（DB / Redis には接続しない）"""
+    started = time.perf_counter()
+
+    # 全モデルのマッパーとリレーションを構成しておく
+    from . import models  # noqa: F401
+    configure_mappers()
+
+    # Jinja テンプレートをコンパイルして環境のキャッシュに載せる
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    logger.info(f"master prepared in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+def _warm_statements():
+    """よく使うクエリを1回ずつ実行して SQLAlchemy のコンパイル済みキャッシュを温める"""
+    from .models import Session as UserSession, KnowledgeNode, NodeConnection, ActivityLog
+
+    db = database.get_session()
+    dummy_id = uuid.uuid4()
+    try:
+        db.query(UserSession).filter_by(session_key=str(dummy_id)).first()
+        db.query(KnowledgeNode).filter_by(session_id=dummy_id, is_deleted=False).all()
+        db.query(KnowledgeNode).filter_by(session_id=dummy_id, is_deleted=False).count()
+        db.query(NodeConnection).join(
+            KnowledgeNode,
+            NodeConnection.source_node_id == KnowledgeNode.id
+        ).filter(
+            KnowledgeNode.session_id == dummy_id,
+            KnowledgeNode.is_deleted == False
+        ).all()
+        db.query(ActivityLog).filter_by(session_id=dummy_id).order_by(
+            ActivityLog.created_at.desc()
+        ).limit(1).all()
+    finally:
+        database.db_session.remove()
+
+
+def warm_worker(app, db_connections=2):
+    """fork 直後のワーカーで接続と各種キャッシュを温める（失敗しても起動は続ける）"""
+    started = time.perf_counter()
+
+    # 親から引き継いだプールの接続はソケットを共有してしまうので使わない
+    for shard in database.shards:
+        shard.dispose(close=False)
+
+    for shard in database.shards:
+        try:
+            engine = shard.get_engine()
+            connections = [engine.connect() for _ in range(db_connections)]
+            for conn in connections:
+                conn.execute(text('SELECT 1'))
+            for conn in connections:
+                conn.close()  # プールに戻す
+            shard.replica_available()
+            # コンパイル済み文のキャッシュはエンジンごと
+            with app.app_context():
+                g.shard_index = shard.index
+                _warm_statements()
+        except Exception as e:
+            logger.warning(f"database warm-up of shard {shard.index} failed: {e}")
+
+    try:
+        client = get_cache()
+        if client is not None:
+            client.ping()
+        session_redis = app.config.get('SESSION_REDIS')
+        if session_redis is not None:
+            session_redis.ping()
+    except Exception as e:
+        logger.warning(f"redis warm-up failed: {e}")
+
+    # ルーティングとレスポンス生成の初回コストを払っておく
+    with app.test_client() as client:
+        client.get('/health')
+
+    logger.info(f"worker warmed in {(time.perf_counter() - started) * 1000:.0f}ms")
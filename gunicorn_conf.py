@@ -1,27 +1,71 @@
-"""Gunicorn設定ファイル"""
-import os
-import multiprocessing
-
-# サーバーソケット
-bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
-
-# ワーカー設定
-workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
-worker_class = 'sync'
-worker_connections = 1000
-timeout = 120
-keepalive = 5
-
-# ログ設定
-accesslog = '-'
-errorlog = '-'
-loglevel = 'info'
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
-
-# プロセス名
-proc_name = 'seci-knowledge-mapper'
-
-# セキュリティヘッダー
-limit_request_line = 4096
-limit_request_fields = 100
-limit_request_field_size = 8190
\ No newline at end of file
+"""Gunicorn設定ファイル"""
+import os
+
+# gevent はアプリ（threading / socket / psycopg2）を読み込む前にパッチを当てる
+if os.getenv('DEPLOY_PROFILE', '').lower() == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+from app.profiles import get_profile
+
+profile = get_profile()
+
+# アプリ（asgi プロファイルでは非同期の読み取りパスを前に置いた asgi:app）
+wsgi_app = profile.app_uri
+
+# サーバーソケット
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+# ワーカー設定（DEPLOY_PROFILE で決まる。プールサイズも同じプロファイルから取る）
+workers = profile.workers
+worker_class = profile.worker_class
+threads = profile.threads
+worker_connections = profile.worker_connections
+timeout = 120
+keepalive = 5
+
+# ログ設定
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+# プロセス名
+proc_name = 'seci-knowledge-mapper'
+
+# セキュリティヘッダー
+limit_request_line = 4096
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+# ===== プリロードとウォームアップ =====
+# マスターでアプリを読み込み、マッパーとテンプレートを準備してから fork する。
+# ワーカーはそれを copy-on-write で共有し、post_fork で接続とキャッシュだけ温める。
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+warmup_enabled = os.getenv('GUNICORN_WARMUP', '1') == '1'
+warmup_db_connections = int(os.getenv('GUNICORN_WARMUP_DB_CONNECTIONS', str(profile.pool_size)))
+
+
+def _flask_app(app):
+    """ASGI ラッパー（app.async_api）なら中の Flask アプリを返す"""
+    return getattr(app, 'flask_app', app)
+
+
+def when_ready(server):
+    """マスターでの準備（preload 時のみ。ワーカー fork 前に呼ばれる）"""
+    server.log.info(profile.describe())
+    if not preload_app:
+        return
+    from app.warmup import prepare_master
+    prepare_master(_flask_app(server.app.wsgi()))
+
+
+def post_fork(server, worker):
+    """fork 直後のワーカーでプールを作り直し、接続とキャッシュを温める"""
+    if not warmup_enabled:
+        return
+    from app.warmup import warm_worker
+    # preload 時はマスターで読み込み済みのアプリがそのまま返る
+    warm_worker(_flask_app(worker.app.wsgi()), db_connections=warmup_db_connections)
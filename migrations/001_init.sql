@@ -1,4 +1,5 @@
 -- SECIモデル知識マッピングツール データベース初期化スクリプト
+-- （マイグレーション 001: 既存DBにも再適用できるよう冪等に書く）
 
 -- 拡張機能の有効化
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
@@ -14,8 +15,14 @@ CREATE TABLE IF NOT EXISTS sessions (
     ip_address INET
 );
 
--- SECIカテゴリ定義
-CREATE TYPE seci_category AS ENUM ('socialization', 'externalization', 'combination', 'internalization');
+-- SECIカテゴリ定義（CREATE TYPE には IF NOT EXISTS が無いため存在確認してから作る）
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'seci_category') THEN
+        CREATE TYPE seci_category AS ENUM ('socialization', 'externalization', 'combination', 'internalization');
+    END IF;
+END
+$$;
 
 -- 知識ノードテーブル
 CREATE TABLE IF NOT EXISTS knowledge_nodes (
@@ -241,5 +248,3 @@ COMMENT ON TABLE activity_logs IS 'ユーザーアクティビティログ';
 
 -- 初期データの挿入（オプション）
 -- サンプルデータを追加する場合はここに記述
-
-COMMIT;
@@ -0,0 +1,48 @@
+-- migrate:no-transaction
+-- セッション単位のホットクエリ向け部分インデックス／カバリングインデックス
+--
+-- ほぼ全てのクエリが knowledge_nodes を session_id AND is_deleted = false で絞り込む。
+-- 既存の単一列インデックスには論理削除済みの行も残り続けるため、
+-- 生存行だけを持つ部分インデックスを追加する。
+-- （is_deleted = false は PostgreSQL により NOT is_deleted に正規化されるため、
+--   ORM の filter_by(is_deleted=False) でもこの述語で部分インデックスが選ばれる）
+--
+-- マイグレーションは起動時に走るので、書き込みを止めないよう CONCURRENTLY で作る
+-- （トランザクションの中では実行できないので no-transaction）。
+-- 途中で失敗すると作りかけの INVALID なインデックスが残り IF NOT EXISTS では作り直されないため、
+-- 各インデックスは DROP INDEX CONCURRENTLY IF EXISTS してから作る（再実行しても同じ結果になる）。
+
+-- ノード一覧・件数チェック: セッション内の生存ノードを作成順に
+DROP INDEX CONCURRENTLY IF EXISTS idx_knowledge_nodes_session_live;
+CREATE INDEX CONCURRENTLY idx_knowledge_nodes_session_live
+    ON knowledge_nodes (session_id, created_at)
+    WHERE NOT is_deleted;
+
+-- マッパー／分析が使うグラフ骨格列（id, category, 位置）のカバリングインデックス
+-- description / metadata を読まない投影は Index Only Scan で完結する
+DROP INDEX CONCURRENTLY IF EXISTS idx_knowledge_nodes_session_graph;
+CREATE INDEX CONCURRENTLY idx_knowledge_nodes_session_graph
+    ON knowledge_nodes (session_id, category)
+    INCLUDE (id, position_x, position_y)
+    WHERE NOT is_deleted;
+
+-- 接続一覧: source 側で結合し、ターゲットと種別をヒープを読まずに返す
+DROP INDEX CONCURRENTLY IF EXISTS idx_node_connections_source_covering;
+CREATE INDEX CONCURRENTLY idx_node_connections_source_covering
+    ON node_connections (source_node_id)
+    INCLUDE (id, target_node_id, connection_type, strength);
+
+-- コメント: ノード単位のトップレベル／返信一覧を作成順に
+DROP INDEX CONCURRENTLY IF EXISTS idx_node_comments_node_parent_created;
+CREATE INDEX CONCURRENTLY idx_node_comments_node_parent_created
+    ON node_comments (node_id, parent_comment_id, created_at);
+
+-- アクティビティログ: セッション単位の新しい順
+DROP INDEX CONCURRENTLY IF EXISTS idx_activity_logs_session_created;
+CREATE INDEX CONCURRENTLY idx_activity_logs_session_created
+    ON activity_logs (session_id, created_at DESC);
+
+ANALYZE knowledge_nodes;
+ANALYZE node_connections;
+ANALYZE node_comments;
+ANALYZE activity_logs;
@@ -0,0 +1,86 @@
+-- activity_logs を created_at の月次レンジパーティションに変換
+--
+-- 保持期間の削除を DELETE ではなくパーティションの DROP で行い、
+-- デッドタプルとインデックスの膨張を無くす。
+-- 主キーにはパーティションキーを含める必要があるため (id, created_at) とする。
+
+-- 月次パーティションを当月から months_ahead ヶ月先まで作成（作成数を返す）
+CREATE OR REPLACE FUNCTION ensure_activity_log_partitions(months_ahead integer DEFAULT 3)
+RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', CURRENT_DATE)::date;
+    part_start date;
+    part_name text;
+    created integer := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        part_start := (month_start + make_interval(months => i))::date;
+        part_name := 'activity_logs_p' || to_char(part_start, 'YYYYMM');
+        IF to_regclass('public.' || part_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF activity_logs FOR VALUES FROM (%L) TO (%L)',
+                part_name, part_start, (part_start + interval '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 既存の通常テーブルなら、パーティションテーブルを作ってデータを移す
+DO $$
+DECLARE
+    first_month date;
+    last_month date;
+    m date;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('public.activity_logs')) = 'r' THEN
+        CREATE TABLE activity_logs_partitioned (
+            id UUID NOT NULL DEFAULT uuid_generate_v4(),
+            session_id UUID NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+            action_type VARCHAR(100) NOT NULL,
+            target_type VARCHAR(100),
+            target_id UUID,
+            details JSONB DEFAULT '{}',
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+
+        -- 既存データの範囲（未来日時の行も含む）をカバーするパーティションを先に作る
+        SELECT date_trunc('month', COALESCE(min(created_at), CURRENT_TIMESTAMP))::date,
+               date_trunc('month', GREATEST(max(created_at), CURRENT_TIMESTAMP))::date
+          INTO first_month, last_month
+          FROM activity_logs;
+
+        m := first_month;
+        WHILE m <= last_month LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF activity_logs_partitioned FOR VALUES FROM (%L) TO (%L)',
+                'activity_logs_p' || to_char(m, 'YYYYMM'), m, (m + interval '1 month')::date
+            );
+            m := (m + interval '1 month')::date;
+        END LOOP;
+
+        INSERT INTO activity_logs_partitioned
+            (id, session_id, action_type, target_type, target_id, details, created_at)
+        SELECT id, session_id, action_type, target_type, target_id, details,
+               COALESCE(created_at, CURRENT_TIMESTAMP)
+          FROM activity_logs;
+
+        DROP TABLE activity_logs;
+        ALTER TABLE activity_logs_partitioned RENAME TO activity_logs;
+        ALTER TABLE activity_logs RENAME CONSTRAINT activity_logs_partitioned_pkey TO activity_logs_pkey;
+        ALTER TABLE activity_logs
+            RENAME CONSTRAINT activity_logs_partitioned_session_id_fkey TO activity_logs_session_id_fkey;
+    END IF;
+END
+$$;
+
+-- 親テーブルに作ったインデックスは全パーティションに伝播する
+CREATE INDEX IF NOT EXISTS idx_activity_logs_session_created ON activity_logs (session_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_created ON activity_logs (created_at);
+
+SELECT ensure_activity_log_partitions(3);
+
+COMMENT ON TABLE activity_logs IS 'ユーザーアクティビティログ（created_at による月次パーティション）';
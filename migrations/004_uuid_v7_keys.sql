@@ -0,0 +1,33 @@
+-- 主キーのデフォルトを UUIDv7（時刻順）に変更
+--
+-- uuid_generate_v4() のランダムなキーは B-tree の全体に挿入が散らばり、
+-- ページ分割とキャッシュミスが増える。v7 は先頭 48bit がミリ秒の時刻なので
+-- 新しい行は右端のページに追記される。既存行のキーはそのまま。
+-- アプリ側の ORM は app/ids.py の uuid7() で同じ形式のキーを作る。
+
+-- RFC 9562 の UUIDv7（ミリ秒時刻 + 乱数。version / variant ビットを設定）
+CREATE OR REPLACE FUNCTION uuid_generate_v7()
+RETURNS uuid AS $$
+DECLARE
+    unix_ts_ms bytea;
+    uuid_bytes bytea;
+BEGIN
+    unix_ts_ms := substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint) FROM 3);
+    -- gen_random_uuid() の variant ビット（10xx）はそのまま使う
+    uuid_bytes := uuid_send(gen_random_uuid());
+    uuid_bytes := overlay(uuid_bytes PLACING unix_ts_ms FROM 1 FOR 6);
+    uuid_bytes := set_byte(uuid_bytes, 6, (b'0111' || get_byte(uuid_bytes, 6)::bit(4))::bit(8)::int);
+    RETURN encode(uuid_bytes, 'hex')::uuid;
+END
+$$ LANGUAGE plpgsql VOLATILE;
+
+ALTER TABLE sessions ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE knowledge_nodes ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE node_connections ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE analytics_metrics ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE activity_logs ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE tags ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE node_tags ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE node_versions ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE node_reactions ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE node_comments ALTER COLUMN id SET DEFAULT uuid_generate_v7();
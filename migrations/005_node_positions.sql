@@ -0,0 +1,45 @@
+-- ノードの位置を幅の狭い node_positions テーブルへ分離
+--
+-- ドラッグのたびに knowledge_nodes の行（description / metadata を含む太いタプル）を
+-- 書き換え、updated_at トリガーも走っていた。位置だけを別テーブルに持てば、
+-- 位置の保存は (node_id, x, y, updated_at) の小さな行の更新で済む。
+-- x / y / updated_at にはインデックスを張らず、fillfactor で同じページに空きを残すので
+-- 更新は HOT（ヒープのみ・インデックス更新なし）になる。
+-- 位置列を含んでいたカバリングインデックスも位置なしで作り直す。
+
+CREATE TABLE IF NOT EXISTS node_positions (
+    node_id UUID PRIMARY KEY REFERENCES knowledge_nodes(id) ON DELETE CASCADE,
+    x FLOAT NOT NULL DEFAULT 0,
+    y FLOAT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITH (fillfactor = 70);
+
+-- 既存ノードの位置を移す（位置列がまだ残っている場合のみ）
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'knowledge_nodes' AND column_name = 'position_x'
+    ) THEN
+        INSERT INTO node_positions (node_id, x, y)
+        SELECT id, COALESCE(position_x, 0), COALESCE(position_y, 0)
+        FROM knowledge_nodes
+        ON CONFLICT (node_id) DO NOTHING;
+    END IF;
+END
+$$;
+
+DROP INDEX IF EXISTS idx_knowledge_nodes_session_graph;
+CREATE INDEX IF NOT EXISTS idx_knowledge_nodes_session_graph
+    ON knowledge_nodes (session_id, category)
+    INCLUDE (id)
+    WHERE NOT is_deleted;
+
+ALTER TABLE knowledge_nodes
+    DROP COLUMN IF EXISTS position_x,
+    DROP COLUMN IF EXISTS position_y;
+
+COMMENT ON TABLE node_positions IS 'ノードの表示位置（ドラッグ保存を HOT 更新にするため分離）';
+
+ANALYZE node_positions;
+ANALYZE knowledge_nodes;
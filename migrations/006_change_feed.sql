@@ -0,0 +1,149 @@
+-- 差分同期（GET /api/changes）用の変更シーケンス
+--
+-- セッションごとのカーソル session_change_cursors.last_seq を、ノード・位置・接続の
+-- INSERT / UPDATE のたびにトリガーで1つ進め、その値を行の change_seq に書く。
+-- カーソル行はトランザクション終了までロックされるので、同じセッションの変更は
+-- 番号順にコミットされる（「since より大きい番号」を読めば取りこぼしが無い）。
+-- 物理削除は deleted_records に墓石として残す。論理削除（is_deleted）は
+-- change_seq が進むので通常の変更として返る。
+--
+-- change_seq にはインデックスを張らない。node_positions の位置更新を HOT のまま保つため
+-- （1セッションのノードは MAX_NODES_PER_USER 件までなので session_id で絞れば足りる）。
+
+CREATE TABLE IF NOT EXISTS session_change_cursors (
+    session_id UUID PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    -- これ以下の番号の墓石は削除済み。since がこれより小さいクライアントは全件を取り直す
+    pruned_through BIGINT NOT NULL DEFAULT 0
+) WITH (fillfactor = 50);
+
+CREATE TABLE IF NOT EXISTS deleted_records (
+    session_id UUID NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    change_seq BIGINT NOT NULL,
+    entity_type VARCHAR(20) NOT NULL,
+    entity_id UUID NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (session_id, change_seq)
+);
+CREATE INDEX IF NOT EXISTS idx_deleted_records_deleted_at ON deleted_records(deleted_at);
+
+ALTER TABLE knowledge_nodes ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE node_positions ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE node_connections ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+
+-- セッションのカーソルを1つ進めて返す（カーソル行はコミットまでロックされる）
+CREATE OR REPLACE FUNCTION next_change_seq(p_session_id UUID)
+RETURNS BIGINT AS $$
+    INSERT INTO session_change_cursors AS c (session_id, last_seq)
+    VALUES (p_session_id, 1)
+    ON CONFLICT (session_id) DO UPDATE SET last_seq = c.last_seq + 1
+    RETURNING last_seq;
+$$ LANGUAGE sql VOLATILE;
+
+CREATE OR REPLACE FUNCTION stamp_node_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_seq := next_change_seq(NEW.session_id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stamp_position_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    node_session UUID;
+BEGIN
+    SELECT session_id INTO node_session FROM knowledge_nodes WHERE id = NEW.node_id;
+    IF node_session IS NOT NULL THEN
+        NEW.change_seq := next_change_seq(node_session);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stamp_connection_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    node_session UUID;
+BEGIN
+    SELECT session_id INTO node_session FROM knowledge_nodes WHERE id = NEW.source_node_id;
+    IF node_session IS NOT NULL THEN
+        NEW.change_seq := next_change_seq(node_session);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ノードの物理削除: 生きていたノードは墓石を残す。
+-- 論理削除済みノード（墓石コンパクション）は削除が既に配信済みなので、
+-- その番号までを pruned_through に含めて、それより古いカーソルには全件取り直しをさせる
+CREATE OR REPLACE FUNCTION record_node_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- セッションごと消えている（sessions からのカスケード）なら何も残さない
+    IF NOT EXISTS (SELECT 1 FROM sessions WHERE id = OLD.session_id) THEN
+        RETURN OLD;
+    END IF;
+    IF OLD.is_deleted THEN
+        UPDATE session_change_cursors
+        SET pruned_through = GREATEST(pruned_through, OLD.change_seq)
+        WHERE session_id = OLD.session_id;
+    ELSE
+        INSERT INTO deleted_records (session_id, change_seq, entity_type, entity_id)
+        VALUES (OLD.session_id, next_change_seq(OLD.session_id), 'node', OLD.id);
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 接続の物理削除: 両端が生きている接続だけ墓石を残す
+-- （端のノードが消えた接続はクライアント側でノードと一緒に外れる）
+CREATE OR REPLACE FUNCTION record_connection_delete()
+RETURNS TRIGGER AS $$
+DECLARE
+    node_session UUID;
+BEGIN
+    SELECT session_id INTO node_session FROM knowledge_nodes
+    WHERE id = OLD.source_node_id AND NOT is_deleted;
+    IF node_session IS NOT NULL AND EXISTS (
+        SELECT 1 FROM knowledge_nodes WHERE id = OLD.target_node_id AND NOT is_deleted
+    ) THEN
+        INSERT INTO deleted_records (session_id, change_seq, entity_type, entity_id)
+        VALUES (node_session, next_change_seq(node_session), 'connection', OLD.id);
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS stamp_knowledge_nodes_change ON knowledge_nodes;
+CREATE TRIGGER stamp_knowledge_nodes_change
+    BEFORE INSERT OR UPDATE ON knowledge_nodes
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_node_change();
+
+DROP TRIGGER IF EXISTS stamp_node_positions_change ON node_positions;
+CREATE TRIGGER stamp_node_positions_change
+    BEFORE INSERT OR UPDATE ON node_positions
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_position_change();
+
+DROP TRIGGER IF EXISTS stamp_node_connections_change ON node_connections;
+CREATE TRIGGER stamp_node_connections_change
+    BEFORE INSERT OR UPDATE ON node_connections
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_connection_change();
+
+DROP TRIGGER IF EXISTS record_knowledge_nodes_delete ON knowledge_nodes;
+CREATE TRIGGER record_knowledge_nodes_delete
+    AFTER DELETE ON knowledge_nodes
+    FOR EACH ROW
+    EXECUTE FUNCTION record_node_delete();
+
+DROP TRIGGER IF EXISTS record_node_connections_delete ON node_connections;
+CREATE TRIGGER record_node_connections_delete
+    AFTER DELETE ON node_connections
+    FOR EACH ROW
+    EXECUTE FUNCTION record_connection_delete();
+
+COMMENT ON TABLE session_change_cursors IS 'セッションごとの変更カーソル（差分同期）';
+COMMENT ON TABLE deleted_records IS '物理削除された行の墓石（差分同期）';
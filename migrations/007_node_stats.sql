@@ -0,0 +1,216 @@
+-- ノードごとの集計（タグ・いいね・スター・ブックマーク・生きているコメント・バージョンの数）を
+-- node_stats テーブルに持ち、各テーブルへの書き込みのたびにトリガーで増減する
+--
+-- node_statistics ビューはノードごとに tags・reactions（3回）・comments・versions を LEFT JOIN し、
+-- 直積で膨らんだ行を COUNT(DISTINCT ...) で数え直していた（件数の積に比例する）。
+-- ビューは同じ列のまま node_stats を読むだけにする。
+--
+-- 行はノードに最初の書き込みがあったときに作る（無いノードはすべて 0）。
+-- 減らす側は UPDATE だけにする。ノードの物理削除でカスケード削除される子の行のトリガーが、
+-- 消えたノードの node_stats を作り直さないように（node_stats もカスケードで消える）。
+
+CREATE TABLE IF NOT EXISTS node_stats (
+    node_id UUID PRIMARY KEY REFERENCES knowledge_nodes(id) ON DELETE CASCADE,
+    tag_count INTEGER NOT NULL DEFAULT 0,
+    like_count INTEGER NOT NULL DEFAULT 0,
+    star_count INTEGER NOT NULL DEFAULT 0,
+    bookmark_count INTEGER NOT NULL DEFAULT 0,
+    comment_count INTEGER NOT NULL DEFAULT 0,
+    version_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITH (fillfactor = 70);
+
+-- 集計を増減する（増やすときは行が無ければ作る。減らすときは行がある場合だけ）
+CREATE OR REPLACE FUNCTION adjust_node_stats(
+    p_node_id UUID,
+    p_tags INTEGER DEFAULT 0,
+    p_likes INTEGER DEFAULT 0,
+    p_stars INTEGER DEFAULT 0,
+    p_bookmarks INTEGER DEFAULT 0,
+    p_comments INTEGER DEFAULT 0,
+    p_versions INTEGER DEFAULT 0
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_tags = 0 AND p_likes = 0 AND p_stars = 0 AND p_bookmarks = 0
+       AND p_comments = 0 AND p_versions = 0 THEN
+        RETURN;
+    END IF;
+
+    UPDATE node_stats SET
+        tag_count = tag_count + p_tags,
+        like_count = like_count + p_likes,
+        star_count = star_count + p_stars,
+        bookmark_count = bookmark_count + p_bookmarks,
+        comment_count = comment_count + p_comments,
+        version_count = version_count + p_versions,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE node_id = p_node_id;
+
+    IF NOT FOUND AND GREATEST(p_tags, p_likes, p_stars, p_bookmarks, p_comments, p_versions) > 0 THEN
+        INSERT INTO node_stats AS s (
+            node_id, tag_count, like_count, star_count, bookmark_count, comment_count, version_count
+        )
+        SELECT p_node_id, GREATEST(p_tags, 0), GREATEST(p_likes, 0), GREATEST(p_stars, 0),
+               GREATEST(p_bookmarks, 0), GREATEST(p_comments, 0), GREATEST(p_versions, 0)
+        WHERE EXISTS (SELECT 1 FROM knowledge_nodes WHERE id = p_node_id)
+        ON CONFLICT (node_id) DO UPDATE SET
+            tag_count = s.tag_count + p_tags,
+            like_count = s.like_count + p_likes,
+            star_count = s.star_count + p_stars,
+            bookmark_count = s.bookmark_count + p_bookmarks,
+            comment_count = s.comment_count + p_comments,
+            version_count = s.version_count + p_versions,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION count_node_tag()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM adjust_node_stats(OLD.node_id, p_tags => -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM adjust_node_stats(NEW.node_id, p_tags => 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- reaction_type ごとに like / star / bookmark の列を増減する（それ以外の種類は数えない）
+CREATE OR REPLACE FUNCTION count_node_reaction()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM adjust_node_stats(
+            OLD.node_id,
+            p_likes => -(OLD.reaction_type = 'like')::int,
+            p_stars => -(OLD.reaction_type = 'star')::int,
+            p_bookmarks => -(OLD.reaction_type = 'bookmark')::int
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM adjust_node_stats(
+            NEW.node_id,
+            p_likes => (NEW.reaction_type = 'like')::int,
+            p_stars => (NEW.reaction_type = 'star')::int,
+            p_bookmarks => (NEW.reaction_type = 'bookmark')::int
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 生きているコメント（is_deleted が FALSE）だけを数える。論理削除・復元は UPDATE で増減する
+CREATE OR REPLACE FUNCTION count_node_comment()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.is_deleted IS FALSE THEN
+        PERFORM adjust_node_stats(OLD.node_id, p_comments => -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_deleted IS FALSE THEN
+        PERFORM adjust_node_stats(NEW.node_id, p_comments => 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION count_node_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM adjust_node_stats(OLD.node_id, p_versions => -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM adjust_node_stats(NEW.node_id, p_versions => 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE は集計に関わる列が変わったときだけ（コメント本文の編集などでは走らせない）
+DROP TRIGGER IF EXISTS count_node_tags_stats ON node_tags;
+CREATE TRIGGER count_node_tags_stats
+    AFTER INSERT OR DELETE OR UPDATE OF node_id ON node_tags
+    FOR EACH ROW
+    EXECUTE FUNCTION count_node_tag();
+
+DROP TRIGGER IF EXISTS count_node_reactions_stats ON node_reactions;
+CREATE TRIGGER count_node_reactions_stats
+    AFTER INSERT OR DELETE OR UPDATE OF node_id, reaction_type ON node_reactions
+    FOR EACH ROW
+    EXECUTE FUNCTION count_node_reaction();
+
+DROP TRIGGER IF EXISTS count_node_comments_stats ON node_comments;
+CREATE TRIGGER count_node_comments_stats
+    AFTER INSERT OR DELETE OR UPDATE OF node_id, is_deleted ON node_comments
+    FOR EACH ROW
+    EXECUTE FUNCTION count_node_comment();
+
+DROP TRIGGER IF EXISTS count_node_versions_stats ON node_versions;
+CREATE TRIGGER count_node_versions_stats
+    AFTER INSERT OR DELETE OR UPDATE OF node_id ON node_versions
+    FOR EACH ROW
+    EXECUTE FUNCTION count_node_version();
+
+-- 既存の行から作り直す。トリガーの作成で4テーブルに SHARE ROW EXCLUSIVE ロックを取っており、
+-- このトランザクションが終わるまで書き込みは待つので、数え直しとトリガーの間で取りこぼさない
+INSERT INTO node_stats (
+    node_id, tag_count, like_count, star_count, bookmark_count, comment_count, version_count
+)
+SELECT
+    kn.id,
+    COALESCE(t.tag_count, 0),
+    COALESCE(r.like_count, 0),
+    COALESCE(r.star_count, 0),
+    COALESCE(r.bookmark_count, 0),
+    COALESCE(c.comment_count, 0),
+    COALESCE(v.version_count, 0)
+FROM knowledge_nodes kn
+LEFT JOIN (
+    SELECT node_id, count(*) AS tag_count FROM node_tags GROUP BY node_id
+) t ON t.node_id = kn.id
+LEFT JOIN (
+    SELECT node_id,
+           count(*) FILTER (WHERE reaction_type = 'like') AS like_count,
+           count(*) FILTER (WHERE reaction_type = 'star') AS star_count,
+           count(*) FILTER (WHERE reaction_type = 'bookmark') AS bookmark_count
+    FROM node_reactions GROUP BY node_id
+) r ON r.node_id = kn.id
+LEFT JOIN (
+    SELECT node_id, count(*) AS comment_count FROM node_comments
+    WHERE is_deleted IS FALSE GROUP BY node_id
+) c ON c.node_id = kn.id
+LEFT JOIN (
+    SELECT node_id, count(*) AS version_count FROM node_versions GROUP BY node_id
+) v ON v.node_id = kn.id
+WHERE t.node_id IS NOT NULL OR r.node_id IS NOT NULL
+   OR c.node_id IS NOT NULL OR v.node_id IS NOT NULL
+ON CONFLICT (node_id) DO UPDATE SET
+    tag_count = EXCLUDED.tag_count,
+    like_count = EXCLUDED.like_count,
+    star_count = EXCLUDED.star_count,
+    bookmark_count = EXCLUDED.bookmark_count,
+    comment_count = EXCLUDED.comment_count,
+    version_count = EXCLUDED.version_count,
+    updated_at = CURRENT_TIMESTAMP;
+
+-- ビュー: ノード統計（列と型は 001 のまま。node_stats の行が無いノードは 0）
+CREATE OR REPLACE VIEW node_statistics AS
+SELECT
+    kn.id as node_id,
+    kn.title,
+    kn.category,
+    COALESCE(ns.tag_count, 0)::bigint as tag_count,
+    COALESCE(ns.like_count, 0)::bigint as like_count,
+    COALESCE(ns.star_count, 0)::bigint as star_count,
+    COALESCE(ns.bookmark_count, 0)::bigint as bookmark_count,
+    COALESCE(ns.comment_count, 0)::bigint as comment_count,
+    COALESCE(ns.version_count, 0)::bigint as version_count
+FROM knowledge_nodes kn
+LEFT JOIN node_stats ns ON ns.node_id = kn.id
+WHERE kn.is_deleted = FALSE;
+
+COMMENT ON TABLE node_stats IS 'ノードごとのタグ・リアクション・コメント・バージョン数（トリガーで更新）';
@@ -0,0 +1,69 @@
+-- activity_logs の DEFAULT パーティションと、既定のパーティションが受けた行の移し替え
+--
+-- 003 は当月から3ヶ月先までしか月次パーティションを作らず、それ以降の月は
+-- クリーンアップジョブの ensure_activity_log_partitions に頼っていた。ジョブが動いていないと
+-- 範囲外の月になった時点で ActivityLog の INSERT がすべて失敗する。
+-- DEFAULT パーティションで範囲外の行も受ける。ジョブを動かさない環境では
+-- python -m app.init_db --partitions で ensure_activity_log_partitions を呼ぶ。
+--
+-- DEFAULT に行がある月のパーティションは CREATE TABLE ... PARTITION OF で作れない
+-- （DEFAULT の制約に反する）ので、その月の行を新しいテーブルへ移してから ATTACH する。
+
+CREATE OR REPLACE FUNCTION ensure_activity_log_partitions(months_ahead integer DEFAULT 3)
+RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', CURRENT_DATE)::date;
+    part_start date;
+    part_end date;
+    part_name text;
+    has_default boolean := to_regclass('public.activity_logs_default') IS NOT NULL;
+    created integer := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        part_start := (month_start + make_interval(months => i))::date;
+        part_end := (part_start + interval '1 month')::date;
+        part_name := 'activity_logs_p' || to_char(part_start, 'YYYYMM');
+        IF to_regclass('public.' || part_name) IS NOT NULL THEN
+            CONTINUE;
+        END IF;
+
+        IF has_default AND EXISTS (
+            SELECT 1 FROM activity_logs_default
+            WHERE created_at >= part_start AND created_at < part_end
+        ) THEN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE activity_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                part_name
+            );
+            EXECUTE format(
+                'WITH moved AS ('
+                '    DELETE FROM activity_logs_default WHERE created_at >= %L AND created_at < %L RETURNING *'
+                ') INSERT INTO %I SELECT * FROM moved',
+                part_start, part_end, part_name
+            );
+            EXECUTE format(
+                'ALTER TABLE activity_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                part_name, part_start, part_end
+            );
+        ELSE
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF activity_logs FOR VALUES FROM (%L) TO (%L)',
+                part_name, part_start, part_end
+            );
+        END IF;
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('public.activity_logs')) = 'p'
+       AND to_regclass('public.activity_logs_default') IS NULL THEN
+        CREATE TABLE activity_logs_default PARTITION OF activity_logs DEFAULT;
+    END IF;
+END
+$$;
+
+SELECT ensure_activity_log_partitions(3);
@@ -0,0 +1,74 @@
+-- セッションのグラフ構造の版（session_change_cursors.structure_seq）
+--
+-- 006 のカーソル（last_seq）は位置の更新でも進むので、カテゴリと接続の向きだけで決まる
+-- 結果（スパイラル分析）のキャッシュの版に使うとドラッグのたびに無効になる。
+-- structure_seq はノードの追加・物理削除・論理削除/復元・カテゴリの変更と、
+-- 接続の追加・削除・付け替えのときだけ進める。
+--
+-- カーソル行は同じ書き込みで stamp_* / record_* トリガーが作る（またはロックしている）ので
+-- ここでは UPDATE だけを行う。セッションごと消えるカスケード削除では行が無く何もしない。
+
+ALTER TABLE session_change_cursors ADD COLUMN IF NOT EXISTS structure_seq BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION bump_structure_seq(p_session_id UUID)
+RETURNS VOID AS $$
+    UPDATE session_change_cursors SET structure_seq = structure_seq + 1
+    WHERE session_id = p_session_id;
+$$ LANGUAGE sql VOLATILE;
+
+CREATE OR REPLACE FUNCTION bump_node_structure()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM bump_structure_seq(OLD.session_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.session_id IS DISTINCT FROM OLD.session_id) THEN
+        PERFORM bump_structure_seq(NEW.session_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 接続は出元のノードのセッションの版を進める
+CREATE OR REPLACE FUNCTION bump_connection_structure()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM bump_structure_seq(session_id) FROM knowledge_nodes WHERE id = OLD.source_node_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_structure_seq(session_id) FROM knowledge_nodes WHERE id = NEW.source_node_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_knowledge_nodes_structure ON knowledge_nodes;
+CREATE TRIGGER bump_knowledge_nodes_structure
+    AFTER INSERT OR DELETE ON knowledge_nodes
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_node_structure();
+
+-- タイトル・説明・メタデータの編集では進めない
+DROP TRIGGER IF EXISTS bump_knowledge_nodes_structure_update ON knowledge_nodes;
+CREATE TRIGGER bump_knowledge_nodes_structure_update
+    AFTER UPDATE OF category, is_deleted, session_id ON knowledge_nodes
+    FOR EACH ROW
+    WHEN (OLD.category IS DISTINCT FROM NEW.category
+          OR OLD.is_deleted IS DISTINCT FROM NEW.is_deleted
+          OR OLD.session_id IS DISTINCT FROM NEW.session_id)
+    EXECUTE FUNCTION bump_node_structure();
+
+DROP TRIGGER IF EXISTS bump_node_connections_structure ON node_connections;
+CREATE TRIGGER bump_node_connections_structure
+    AFTER INSERT OR DELETE ON node_connections
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_connection_structure();
+
+DROP TRIGGER IF EXISTS bump_node_connections_structure_update ON node_connections;
+CREATE TRIGGER bump_node_connections_structure_update
+    AFTER UPDATE OF source_node_id, target_node_id ON node_connections
+    FOR EACH ROW
+    WHEN (OLD.source_node_id IS DISTINCT FROM NEW.source_node_id
+          OR OLD.target_node_id IS DISTINCT FROM NEW.target_node_id)
+    EXECUTE FUNCTION bump_connection_structure();
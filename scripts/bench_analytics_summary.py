@@ -0,0 +1,79 @@
+"""
+分析サマリーの数値を SessionGraph（全ノード・全接続の行）で作る場合と、
+SessionGraphStats（集計クエリ2本）で作る場合の比較
+
+使い方:
+    DATABASE_URL=postgresql://... python scripts/bench_analytics_summary.py --sizes 1000,10000,50000
+
+bench_query_plans.py と同じデータをサイズごとに投入し、次を出力する（--repeat 回の中央値）。
+  - graph rows / graph ms:  GRAPH_NODES_QUERY + GRAPH_EDGES_QUERY の行数と、読んで summarize するまでの時間
+                            （スパイラル分析のキャッシュが無いときの経路）
+  - stats rows / stats ms:  NODE_STATS_QUERY + EDGE_STATS_QUERY の行数と、読んで summarize するまでの時間
+                            （キャッシュがあるときの経路）
+summarize の結果が両者で一致することも確かめる。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from app.analytics import AnalyticsEngine  # noqa: E402
+from app.session_graph import (  # noqa: E402
+    EDGE_STATS_QUERY, GRAPH_EDGES_QUERY, GRAPH_NODES_QUERY, NODE_STATS_QUERY, SessionGraph, SessionGraphStats,
+)
+from bench_query_plans import seed  # noqa: E402
+
+
+def measure(conn, sid, repeat, build, first, second):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        first_rows = conn.execute(first, {'sid': sid}).all()
+        second_rows = conn.execute(second, {'sid': sid}).all()
+        summary = AnalyticsEngine.summarize(build(first_rows, second_rows))
+        times.append((time.perf_counter() - started) * 1000)
+    return len(first_rows) + len(second_rows), statistics.median(times), summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--deleted-ratio', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        raise RuntimeError('DATABASE_URL is not set')
+    if db_url.startswith('postgres://'):
+        db_url = db_url.replace('postgres://', 'postgresql://', 1)
+
+    engine = create_engine(db_url)
+    print(f'{"nodes":>7s} {"graph rows":>11s} {"graph ms":>9s} {"stats rows":>11s} {"stats ms":>9s}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        sid, _ = seed(engine, size, args.deleted_ratio)
+        try:
+            with engine.connect() as conn:
+                graph_rows, graph_ms, graph_summary = measure(
+                    conn, sid, args.repeat, SessionGraph.from_rows, GRAPH_NODES_QUERY, GRAPH_EDGES_QUERY
+                )
+                stats_rows, stats_ms, stats_summary = measure(
+                    conn, sid, args.repeat, SessionGraphStats, NODE_STATS_QUERY, EDGE_STATS_QUERY
+                )
+            if graph_summary != stats_summary:
+                raise AssertionError(f'summary mismatch at {size} nodes')
+            print(f'{size:7d} {graph_rows:11d} {graph_ms:9.1f} {stats_rows:11d} {stats_ms:9.1f}')
+        finally:
+            with engine.begin() as conn:
+                conn.execute(text('DELETE FROM sessions WHERE id = :sid'), {'sid': sid})
+
+
+if __name__ == '__main__':
+    main()
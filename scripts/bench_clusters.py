@@ -0,0 +1,67 @@
+"""
+縮小表示のクラスタ要約（app/clusters.py）のベンチマーク
+
+使い方:
+    python scripts/bench_clusters.py --sizes 1000,10000,50000 --levels=-6,-4,-2
+
+DB は使わない。一様に散らばった点と接続（1ノードあたり --edges-per-node 本）で
+レベルごとの要約を作り、サイズ・レベルごとに次を出力する。
+  - build ms:   要約の構築時間（カーソルが進んだ後の最初のリクエストのコスト）
+  - json KB:    Redis に保存する JSON の大きさ
+  - clusters:   クラスタ数 / クラスタ間の接続数（全体）
+  - screen:     --viewport の画面1枚分の bbox で返すクラスタ数（マッパーが描くグリフ数）
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.clusters import build_cluster_level, cluster_response  # noqa: E402
+from app.session_graph import CATEGORIES  # noqa: E402
+from app.layout import IDEAL_DISTANCE  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--levels', default='-6,-4,-2')
+    parser.add_argument('--edges-per-node', type=float, default=1.5)
+    parser.add_argument('--viewport', default='1600x900')
+    args = parser.parse_args()
+
+    width, height = (float(v) for v in args.viewport.split('x'))
+    rng = random.Random(1)
+
+    print(f'{"nodes":>7s} {"level":>6s} {"build ms":>9s} {"json KB":>8s} {"clusters":>14s} {"screen":>7s}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        side = IDEAL_DISTANCE * math.sqrt(size)
+        nodes = [
+            (f'node-{i}', CATEGORIES[i % 4], rng.uniform(0, side), rng.uniform(0, side))
+            for i in range(size)
+        ]
+        edges = [
+            (nodes[rng.randrange(size)][0], nodes[rng.randrange(size)][0])
+            for _ in range(int(size * args.edges_per_node))
+        ]
+
+        for level in (int(v) for v in args.levels.split(',')):
+            started = time.perf_counter()
+            summary = build_cluster_level(nodes, edges, level)
+            build_ms = (time.perf_counter() - started) * 1000
+            size_kb = len(json.dumps(summary)) / 1024
+
+            # 左上から画面1枚分（ワールド座標では 2^-level 倍）
+            scale = 2.0 ** -level
+            screen = cluster_response(summary, level, 0, False, (0, 0, width * scale, height * scale))
+            totals = f'{len(summary["clusters"])}/{len(summary["edges"])}'
+            print(f'{size:7d} {level:6d} {build_ms:9.1f} {size_kb:8.1f} {totals:>14s} '
+                  f'{len(screen["clusters"]):7d}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+SECI スパイラル分析（app/graph_analysis.py）のベンチマーク
+
+使い方:
+    python scripts/bench_graph_analysis.py --sizes 1000,10000,50000 --edges-per-node 1.5
+
+DB は使わない。SECI のグラフに近い合成グラフ（--ideal の割合の接続が次のフェーズへ、
+残りは任意のノードへ）を作り、サイズごとに次を出力する。
+  - csr ms:      SessionGraph と理想的な遷移の部分グラフ（ideal_flows）の構築時間
+  - cycles ms:   完全な循環の数え上げの時間（wedges はその手間 = 中間ノードの 入次数×出次数 の和）
+  - chain ms:    最長の連鎖（SPIRAL_MAX_CHAIN 本で打ち切り）の時間
+  - cycles:      完全な循環の数（+ は SPIRAL_MAX_WEDGES で打ち切り）
+  - in cycles:   循環に含まれるノードの割合
+  - chain:       最長の連鎖の長さ（+ は上限に達した = スパイラルが回り続けている）
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import graph_analysis  # noqa: E402
+from app.session_graph import CATEGORIES, CATEGORY_CODES, SessionGraph  # noqa: E402
+
+
+def make_graph(size, edges_per_node, ideal, seed=1):
+    rng = random.Random(seed)
+    nodes = [(f'node-{i}', CATEGORIES[i % 4]) for i in range(size)]
+    by_phase = [[node_id for node_id, category in nodes if category == phase] for phase in CATEGORIES]
+    edges = []
+    for i in range(int(size * edges_per_node)):
+        source_id, category = nodes[rng.randrange(size)]
+        if rng.random() < ideal:
+            target_id = rng.choice(by_phase[(CATEGORY_CODES[category] + 1) % 4])
+        else:
+            target_id = nodes[rng.randrange(size)][0]
+        edges.append((source_id, target_id))
+    return nodes, edges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--edges-per-node', type=float, default=1.5)
+    parser.add_argument('--ideal', type=float, default=0.6)
+    args = parser.parse_args()
+
+    print(f'{"nodes":>7s} {"csr ms":>8s} {"cycles ms":>10s} {"wedges":>9s} {"chain ms":>9s} '
+          f'{"cycles":>8s} {"in cycles":>10s} {"chain":>6s}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        nodes, edges = make_graph(size, args.edges_per_node, args.ideal)
+
+        started = time.perf_counter()
+        graph = SessionGraph.from_rows(nodes, edges).ideal_flows()
+        csr_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        cycles = graph_analysis.count_cycles(graph)
+        cycles_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        chain = graph_analysis.longest_chain(graph)
+        chain_ms = (time.perf_counter() - started) * 1000
+
+        count = f'{cycles["complete_cycles"]}{"+" if cycles["truncated"] else ""}'
+        length = f'{chain["length"]}{"+" if chain["capped"] else ""}'
+        print(f'{size:7d} {csr_ms:8.1f} {cycles_ms:10.1f} {cycles["work"]:9d} {chain_ms:9.1f} '
+              f'{count:>8s} {cycles["nodes_in_cycles"] / size * 100:9.1f}% {length:>6s}')
+
+
+if __name__ == '__main__':
+    main()
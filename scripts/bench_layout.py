@@ -0,0 +1,88 @@
+"""
+サーバー側レイアウト（app/layout.py）のベンチマーク
+
+使い方:
+    python scripts/bench_layout.py --sizes 1000,5000,10000,50000
+    python scripts/bench_layout.py --sizes 50000 --iterations 5   # 大きいグラフは回数を絞って1回あたりを見る
+
+DB は使わない。SECI のグラフに近い合成グラフ（同じカテゴリ内の接続が多く、
+次のカテゴリへの接続が少しある）を作り、サイズごとに次を出力する。
+  - hash ms:     キャッシュキー（構造ハッシュ）の計算時間（キャッシュヒット時のコスト）
+  - iters:       反復回数（--iterations 未指定なら default_iterations）
+  - ms/iter:     1反復（四分木の構築 + Barnes–Hut の反発力 + 引力）の時間
+  - total s:     配置全体の時間
+  - edge/k:      接続の平均長さ / 理想距離
+  - cluster %:   自分のカテゴリの象限に置かれたノードの割合
+
+参考値（純 Python）: ms/iter は 1千ノード約 40、1万約 570、5万約 4200。
+反復は最低 40 回なので 5万ノードは1件約 3分かかる（LAYOUT_PENDING_SECONDS との関係は app/layout.py）。
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import layout  # noqa: E402
+from app.session_graph import SessionGraph  # noqa: E402
+
+CATEGORIES = list(layout.CATEGORY_ANCHORS)
+
+
+def make_graph(node_count, edges_per_node, seed=1):
+    rng = random.Random(seed)
+    nodes = [(f'node-{i}', CATEGORIES[i % 4]) for i in range(node_count)]
+    by_category = {c: [node_id for node_id, cat in nodes if cat == c] for c in CATEGORIES}
+    edges = []
+    for node_id, category in nodes:
+        next_category = CATEGORIES[(CATEGORIES.index(category) + 1) % 4]
+        for _ in range(int(edges_per_node) + (rng.random() < edges_per_node % 1)):
+            pool = by_category[category] if rng.random() < 0.7 else by_category[next_category]
+            edges.append((node_id, rng.choice(pool)))
+    return nodes, edges
+
+
+def clustered_ratio(nodes, positions):
+    ok = 0
+    for node_id, category in nodes:
+        ax, ay = layout.CATEGORY_ANCHORS[category]
+        x, y = positions[node_id]
+        ok += (x > 0) == (ax > 0) and (y > 0) == (ay > 0)
+    return ok / len(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,5000,10000,50000')
+    parser.add_argument('--edges-per-node', type=float, default=1.5)
+    parser.add_argument('--iterations', type=int, default=None)
+    parser.add_argument('--theta', type=float, default=layout.THETA)
+    args = parser.parse_args()
+
+    print(f'{"nodes":>7s} {"edges":>7s} {"hash ms":>8s} {"iters":>6s} {"ms/iter":>8s} '
+          f'{"total s":>8s} {"edge/k":>7s} {"cluster %":>10s}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        nodes, edges = make_graph(size, args.edges_per_node)
+        graph = SessionGraph.from_rows(nodes, edges)
+        iterations = args.iterations if args.iterations is not None else layout.default_iterations(size)
+
+        started = time.perf_counter()
+        layout.structural_hash(graph)
+        hash_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        positions = layout.compute_layout(graph, iterations=iterations, theta=args.theta)
+        total = time.perf_counter() - started
+
+        lengths = [math.dist(positions[s], positions[t]) for s, t in edges if s != t]
+        edge_ratio = sum(lengths) / len(lengths) / layout.IDEAL_DISTANCE
+        print(f'{size:7d} {len(edges):7d} {hash_ms:8.1f} {iterations:6d} '
+              f'{total * 1000 / max(iterations, 1):8.1f} {total:8.1f} {edge_ratio:7.2f} '
+              f'{clustered_ratio(nodes, positions) * 100:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
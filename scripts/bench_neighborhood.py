@@ -0,0 +1,123 @@
+"""
+周辺 k ホップの部分グラフ（app/neighborhood.py の再帰 CTE）のベンチマーク
+
+使い方:
+    DATABASE_URL=postgresql://... python scripts/bench_neighborhood.py --nodes 5000 --explain
+
+bench_query_plans.py と同じデータを投入し、中心のノードから depth = 1..NEIGHBORHOOD_MAX_DEPTH、
+direction = out / both について次を出力する。
+  - cte ms / queries:  再帰 CTE 1本で探索した時間（クエリは1本）
+  - bfs ms / queries:  これまでのクライアントと同じく、訪れたノードごとに直接の接続を読んで
+                       広げた場合の時間とクエリ数（get_node を繰り返すのに相当。往復の遅延は含まない）
+  - nodes:            部分グラフのノード数（NEIGHBORHOOD_MAX_NODES で切り詰め）
+--explain を付けると最大深さの CTE の EXPLAIN (ANALYZE, BUFFERS) も出す。
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from app.neighborhood import (  # noqa: E402
+    NEIGHBORHOOD_MAX_DEPTH, NEIGHBORHOOD_MAX_FANOUT, NEIGHBORHOOD_MAX_NODES,
+    NEIGHBORHOOD_QUERY, walk_params,
+)
+from bench_query_plans import seed  # noqa: E402
+
+ADJACENT_QUERY = {
+    'out': text("""
+        SELECT nc.target_node_id FROM node_connections nc
+        JOIN knowledge_nodes n ON n.id = nc.target_node_id
+        WHERE nc.source_node_id = :nid AND n.session_id = :sid AND NOT n.is_deleted
+    """),
+    'in': text("""
+        SELECT nc.source_node_id FROM node_connections nc
+        JOIN knowledge_nodes n ON n.id = nc.source_node_id
+        WHERE nc.target_node_id = :nid AND n.session_id = :sid AND NOT n.is_deleted
+    """),
+}
+
+
+def bfs(conn, sid, center, depth, direction):
+    """訪れたノードごとに直接の接続を読む幅優先探索（ノード数, クエリ数）"""
+    seen = {center}
+    frontier = [center]
+    queries = 0
+    for _ in range(depth):
+        next_frontier = []
+        for node_id in frontier:
+            adjacent = set()
+            for side in ('out', 'in'):
+                if direction in (side, 'both'):
+                    adjacent.update(
+                        str(row[0]) for row in conn.execute(ADJACENT_QUERY[side], {'nid': node_id, 'sid': sid})
+                    )
+                    queries += 1
+            for neighbor in sorted(adjacent)[:NEIGHBORHOOD_MAX_FANOUT]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+        if len(seen) > NEIGHBORHOOD_MAX_NODES:
+            break
+    return min(len(seen), NEIGHBORHOOD_MAX_NODES), queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--deleted-ratio', type=float, default=0.1)
+    parser.add_argument('--explain', action='store_true')
+    parser.add_argument('--keep', action='store_true', help='ベンチデータを削除しない')
+    args = parser.parse_args()
+
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        raise RuntimeError('DATABASE_URL is not set')
+    if db_url.startswith('postgres://'):
+        db_url = db_url.replace('postgres://', 'postgresql://', 1)
+
+    engine = create_engine(db_url)
+    sid, _ = seed(engine, args.nodes, args.deleted_ratio)
+    try:
+        with engine.connect() as conn:
+            # 生きていて接続の多いノードを中心にする
+            center = str(conn.execute(text("""
+                SELECT kn.id FROM knowledge_nodes kn
+                JOIN node_connections nc ON nc.source_node_id = kn.id
+                WHERE kn.session_id = :sid AND NOT kn.is_deleted
+                GROUP BY kn.id ORDER BY count(*) DESC LIMIT 1
+            """), {'sid': sid}).scalar())
+
+            print(f'{"direction":>9s} {"depth":>5s} {"cte ms":>8s} {"bfs ms":>8s} {"bfs queries":>12s} {"nodes":>6s}')
+            for direction in ('out', 'both'):
+                for depth in range(1, NEIGHBORHOOD_MAX_DEPTH + 1):
+                    params = walk_params(sid, center, depth, direction)
+                    started = time.perf_counter()
+                    rows = conn.execute(NEIGHBORHOOD_QUERY, params).all()
+                    cte_ms = (time.perf_counter() - started) * 1000
+
+                    started = time.perf_counter()
+                    _, queries = bfs(conn, sid, center, depth, direction)
+                    bfs_ms = (time.perf_counter() - started) * 1000
+
+                    nodes = min(len(rows), NEIGHBORHOOD_MAX_NODES)
+                    print(f'{direction:>9s} {depth:5d} {cte_ms:8.1f} {bfs_ms:8.1f} {queries:12d} {nodes:6d}')
+
+            if args.explain:
+                params = walk_params(sid, center, NEIGHBORHOOD_MAX_DEPTH, 'both')
+                plan = conn.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {NEIGHBORHOOD_QUERY.text}'), params)
+                print('\n'.join(row[0] for row in plan))
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text('DELETE FROM sessions WHERE id = :sid'), {'sid': sid})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+ノード統計の比較: 001 の node_statistics（6テーブルの LEFT JOIN + COUNT(DISTINCT)）と
+007 の node_stats（トリガーで更新する集計テーブル）を読むビュー
+
+使い方:
+    DATABASE_URL=postgresql://... python scripts/bench_node_stats.py --nodes 2000 --per-node 5
+
+bench_query_plans.py と同じセッション・ノードを投入し、生きているノードそれぞれに
+タグ・いいね/スター/ブックマーク・コメント（一部は論理削除）・バージョンを --per-node 件前後ずつ付けて、
+次を出力する（--repeat 回の中央値）。
+  - legacy ms:   001 のビューと同じ SELECT（ベンチのセッションのノードに絞る）
+  - view ms:     node_statistics（node_stats を LEFT JOIN するだけ）
+  - write ms:    子の行の投入にかかった時間（トリガーの分を含む）
+両者の結果が一致することも確かめる。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from bench_query_plans import seed  # noqa: E402
+
+LEGACY_QUERY = """
+    SELECT
+        kn.id as node_id,
+        COUNT(DISTINCT nt.tag_id) as tag_count,
+        COUNT(DISTINCT nr.id) FILTER (WHERE nr.reaction_type = 'like') as like_count,
+        COUNT(DISTINCT nr2.id) FILTER (WHERE nr2.reaction_type = 'star') as star_count,
+        COUNT(DISTINCT nr3.id) FILTER (WHERE nr3.reaction_type = 'bookmark') as bookmark_count,
+        COUNT(DISTINCT nc.id) FILTER (WHERE nc.is_deleted = FALSE) as comment_count,
+        COUNT(DISTINCT nv.id) as version_count
+    FROM knowledge_nodes kn
+    LEFT JOIN node_tags nt ON kn.id = nt.node_id
+    LEFT JOIN node_reactions nr ON kn.id = nr.node_id AND nr.reaction_type = 'like'
+    LEFT JOIN node_reactions nr2 ON kn.id = nr2.node_id AND nr2.reaction_type = 'star'
+    LEFT JOIN node_reactions nr3 ON kn.id = nr3.node_id AND nr3.reaction_type = 'bookmark'
+    LEFT JOIN node_comments nc ON kn.id = nc.node_id
+    LEFT JOIN node_versions nv ON kn.id = nv.node_id
+    WHERE kn.is_deleted = FALSE AND kn.session_id = :sid
+    GROUP BY kn.id
+    ORDER BY kn.id
+"""
+
+VIEW_QUERY = """
+    SELECT ns.node_id, ns.tag_count, ns.like_count, ns.star_count,
+           ns.bookmark_count, ns.comment_count, ns.version_count
+    FROM node_statistics ns
+    JOIN knowledge_nodes kn ON kn.id = ns.node_id
+    WHERE kn.session_id = :sid
+    ORDER BY ns.node_id
+"""
+
+
+def attach(engine, sid, per_node):
+    """生きているノードに子の行を付け、タグを返す（後片付け用）"""
+    with engine.connect() as conn:
+        node_ids = [str(row[0]) for row in conn.execute(text(
+            "SELECT id FROM knowledge_nodes WHERE session_id = :sid AND NOT is_deleted"
+        ), {'sid': sid})]
+    tag_ids = [str(uuid.uuid4()) for _ in range(per_node * 2)]
+    # リアクションはセッションごとに一意なので、リアクションする側のセッションを作る
+    reactor_ids = [str(uuid.uuid4()) for _ in range(per_node)]
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO tags (id, name) VALUES (:id, :name)"), [
+            {'id': tag_id, 'name': f'bench-{tag_id[:8]}'} for tag_id in tag_ids
+        ])
+        conn.execute(text("INSERT INTO sessions (id, session_key) VALUES (:id, :key)"), [
+            {'id': reactor_id, 'key': f'bench-{reactor_id}'} for reactor_id in reactor_ids
+        ])
+        conn.execute(text("INSERT INTO node_tags (node_id, tag_id) VALUES (:node_id, :tag_id)"), [
+            {'node_id': node_id, 'tag_id': tag_id}
+            for node_id in node_ids for tag_id in random.sample(tag_ids, random.randint(0, per_node))
+        ])
+        conn.execute(text("""
+            INSERT INTO node_reactions (node_id, session_id, reaction_type) VALUES (:node_id, :sid, :type)
+        """), [
+            {'node_id': node_id, 'sid': reactor_id, 'type': reaction_type}
+            for node_id in node_ids
+            for reactor_id in random.sample(reactor_ids, random.randint(0, per_node))
+            for reaction_type in ('like', 'star', 'bookmark') if random.random() < 0.5
+        ])
+        conn.execute(text("""
+            INSERT INTO node_comments (node_id, session_id, comment_text, is_deleted)
+            VALUES (:node_id, :sid, 'bench comment', :deleted)
+        """), [
+            {'node_id': node_id, 'sid': sid, 'deleted': random.random() < 0.2}
+            for node_id in node_ids for _ in range(random.randint(0, per_node))
+        ])
+        conn.execute(text("""
+            INSERT INTO node_versions (node_id, title, category, version_number)
+            SELECT id, title, category, :number FROM knowledge_nodes
+            WHERE session_id = :sid AND NOT is_deleted AND random() < 0.8
+        """), [{'sid': sid, 'number': number} for number in range(1, per_node + 1)])
+    write_ms = (time.perf_counter() - started) * 1000
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in ('node_tags', 'node_reactions', 'node_comments', 'node_versions', 'node_stats'):
+            conn.execute(text(f'VACUUM ANALYZE {table}'))
+    return tag_ids, reactor_ids, write_ms
+
+
+def timed(conn, sql, sid, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = conn.execute(text(sql), {'sid': sid}).all()
+        times.append((time.perf_counter() - started) * 1000)
+    return [tuple(row) for row in rows], statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=2000)
+    parser.add_argument('--per-node', type=int, default=5)
+    parser.add_argument('--deleted-ratio', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        raise RuntimeError('DATABASE_URL is not set')
+    if db_url.startswith('postgres://'):
+        db_url = db_url.replace('postgres://', 'postgresql://', 1)
+
+    engine = create_engine(db_url)
+    sid, _ = seed(engine, args.nodes, args.deleted_ratio)
+    tag_ids, reactor_ids = [], []
+    try:
+        tag_ids, reactor_ids, write_ms = attach(engine, sid, args.per_node)
+        with engine.connect() as conn:
+            legacy_rows, legacy_ms = timed(conn, LEGACY_QUERY, sid, args.repeat)
+            view_rows, view_ms = timed(conn, VIEW_QUERY, sid, args.repeat)
+        if legacy_rows != view_rows:
+            raise AssertionError('node_statistics does not match the legacy query')
+        print(f'{"nodes":>7s} {"per node":>9s} {"legacy ms":>10s} {"view ms":>8s} {"write ms":>9s}')
+        print(f'{len(view_rows):7d} {args.per_node:9d} {legacy_ms:10.1f} {view_ms:8.1f} {write_ms:9.1f}')
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text('DELETE FROM sessions WHERE id = ANY(CAST(:ids AS uuid[]))'), {'ids': [sid, *reactor_ids]})
+            conn.execute(text('DELETE FROM tags WHERE id = ANY(CAST(:ids AS uuid[]))'), {'ids': tag_ids})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+位置保存（ドラッグ）の更新コスト比較ベンチマーク（005_node_positions.sql）
+
+使い方:
+    DATABASE_URL=postgresql://... python scripts/bench_position_updates.py --nodes 5000 --updates 50000
+
+次の2つの作業用テーブルを作り、ランダムなノードの位置を1件ずつ更新する。
+  - wide:   005 以前の knowledge_nodes（description / metadata と位置列を同じ行に持ち、
+            位置を含むカバリングインデックスと updated_at トリガーあり）
+  - narrow: node_positions（node_id, x, y, updated_at のみ。fillfactor 70）
+それぞれの更新スループット（updates/s）、HOT 更新の割合、テーブルとインデックスの
+サイズの増加を出力する。作業用テーブルは最後に DROP する。005 が適用済みのDBで実行すること。
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+
+from sqlalchemy import create_engine, text
+
+TABLES = {
+    'wide': """
+        CREATE TABLE bench_pos_wide (
+            id UUID PRIMARY KEY,
+            session_id UUID NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            category seci_category NOT NULL,
+            metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+            position_x FLOAT DEFAULT 0,
+            position_y FLOAT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_deleted BOOLEAN DEFAULT FALSE
+        );
+        CREATE INDEX ON bench_pos_wide (session_id, category)
+            INCLUDE (id, position_x, position_y) WHERE NOT is_deleted;
+        CREATE INDEX ON bench_pos_wide (created_at);
+        CREATE TRIGGER bench_pos_wide_updated_at BEFORE UPDATE ON bench_pos_wide
+            FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+    """,
+    'narrow': """
+        CREATE TABLE bench_pos_narrow (
+            node_id UUID PRIMARY KEY,
+            x FLOAT NOT NULL DEFAULT 0,
+            y FLOAT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITH (fillfactor = 70);
+    """,
+}
+
+SEED = {
+    'wide': """
+        INSERT INTO bench_pos_wide (id, session_id, title, description, category, metadata)
+        SELECT unnest(CAST(:ids AS uuid[])), CAST(:sid AS uuid), 'bench node', repeat('x', 400),
+               'combination', '{"source": "bench", "tags": ["a", "b", "c"]}'::jsonb
+    """,
+    'narrow': """
+        INSERT INTO bench_pos_narrow (node_id) SELECT unnest(CAST(:ids AS uuid[]))
+    """,
+}
+
+UPDATE = {
+    'wide': "UPDATE bench_pos_wide SET position_x = :x, position_y = :y WHERE id = :id",
+    'narrow': "UPDATE bench_pos_narrow SET x = :x, y = :y, updated_at = now() WHERE node_id = :id",
+}
+
+
+def sizes(conn, table):
+    row = conn.execute(text(
+        "SELECT pg_relation_size(CAST(:t AS regclass)), pg_indexes_size(CAST(:t AS regclass))"
+    ), {'t': table}).one()
+    return row[0], row[1]
+
+
+def update_stats(conn, table):
+    # 統計はバックエンド終了時かコミット後しばらくして反映される（PG15 以降は即時反映できる）
+    try:
+        conn.execute(text("SELECT pg_stat_force_next_flush()"))
+    except Exception:
+        conn.rollback()
+        time.sleep(1)
+    conn.commit()
+    return conn.execute(text(
+        "SELECT n_tup_upd, n_tup_hot_upd FROM pg_stat_user_tables WHERE relname = :t"
+    ), {'t': table}).one()
+
+
+def run(conn, kind, node_count, updates):
+    table = f'bench_pos_{kind}'
+    conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    for statement in TABLES[kind].split(';'):
+        if statement.strip():
+            conn.execute(text(statement))
+    ids = [str(uuid.uuid4()) for _ in range(node_count)]
+    conn.execute(text(SEED[kind]), {'ids': ids, 'sid': str(uuid.uuid4())})
+    conn.commit()
+    conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+    heap_before, index_before = sizes(conn, table)
+    upd_before, hot_before = update_stats(conn, table)
+
+    started = time.perf_counter()
+    for _ in range(updates):
+        conn.execute(text(UPDATE[kind]), {
+            'id': random.choice(ids),
+            'x': random.uniform(0, 2000),
+            'y': random.uniform(0, 2000),
+        })
+        conn.commit()
+    rate = updates / (time.perf_counter() - started)
+
+    heap_after, index_after = sizes(conn, table)
+    upd_after, hot_after = update_stats(conn, table)
+    updated = max(upd_after - upd_before, 1)
+    return {
+        'rate': rate,
+        'hot_pct': (hot_after - hot_before) * 100 / updated,
+        'heap_growth_mb': (heap_after - heap_before) / 1024 / 1024,
+        'index_growth_mb': (index_after - index_before) / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--updates', type=int, default=20000)
+    args = parser.parse_args()
+
+    db_url = os.environ['DATABASE_URL'].replace('postgres://', 'postgresql://', 1)
+    engine = create_engine(db_url)
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        print(f'{"table":8s} {"updates/s":>10s} {"HOT %":>7s} {"heap +MB":>9s} {"index +MB":>10s}')
+        for kind in TABLES:
+            try:
+                result = run(conn, kind, args.nodes, args.updates)
+                print(f'{kind:8s} {result["rate"]:10.0f} {result["hot_pct"]:7.1f} '
+                      f'{result["heap_growth_mb"]:9.2f} {result["index_growth_mb"]:10.2f}')
+            finally:
+                conn.execute(text(f"DROP TABLE IF EXISTS bench_pos_{kind}"))
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
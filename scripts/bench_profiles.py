@@ -0,0 +1,172 @@
+"""
+デプロイプロファイルの負荷試験（sync / gthread / gevent の比較）
+
+使い方:
+    DATABASE_URL=postgresql://... REDIS_URL=redis://... python scripts/bench_profiles.py --clients 32 --duration 30
+
+プロファイルごとに gunicorn を起動し、--clients 本のクライアント（それぞれ別セッション）から
+読み取り中心のリクエストを送り続けて次を出力する。
+  - スループット（req/s）と p50 / p99 レイテンシ
+  - エラー数（5xx / 接続エラー / プール待ちタイムアウト）
+  - 試験中に観測した PostgreSQL の接続数の最大値（pg_stat_activity）と理論上限
+gevent プロファイルには gevent と psycogreen、asgi プロファイルには uvicorn / asyncpg / a2wsgi が必要。
+
+非同期の読み取りパスと同期パスの比較（1プロセスあたりの同時読み取り数を見る）:
+    python scripts/bench_profiles.py --profiles gthread,asgi --workers 1 --clients 200
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+from sqlalchemy import create_engine, text
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.profiles import PROFILES, get_profile  # noqa: E402
+
+# 読み取り中心のリクエスト（先頭でノードを数件作ってから回す）
+READ_PATHS = ['/api/nodes', '/api/analytics/summary', '/api/search?q=bench', '/api/activity']
+CATEGORIES = ['socialization', 'externalization', 'combination', 'internalization']
+
+
+def wait_ready(base_url, timeout):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            if requests.get(f'{base_url}/health', timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def seed_client(client, base_url, nodes):
+    for i in range(nodes):
+        client.post(f'{base_url}/api/nodes', json={
+            'title': f'bench node {i}',
+            'description': 'bench',
+            'category': CATEGORIES[i % len(CATEGORIES)],
+        }, timeout=10)
+
+
+def client_loop(base_url, stop_at, latencies, errors, lock, seed_nodes):
+    client = requests.Session()
+    try:
+        client.get(f'{base_url}/', timeout=10)  # セッション作成
+        seed_client(client, base_url, seed_nodes)
+    except requests.RequestException:
+        with lock:
+            errors['connect'] += 1
+        return
+
+    local, i = [], 0
+    while time.monotonic() < stop_at:
+        path = READ_PATHS[i % len(READ_PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = client.get(f'{base_url}{path}', timeout=30)
+            if response.status_code >= 500:
+                with lock:
+                    errors['5xx'] += 1
+                continue
+        except requests.RequestException:
+            with lock:
+                errors['connect'] += 1
+            continue
+        local.append((time.perf_counter() - started) * 1000)
+
+    with lock:
+        latencies.extend(local)
+
+
+def sample_connections(engine, stop_event, peak):
+    sql = text("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()")
+    while not stop_event.is_set():
+        with engine.connect() as conn:
+            peak['connections'] = max(peak['connections'], conn.execute(sql).scalar())
+        stop_event.wait(0.25)
+
+
+def run_profile(name, args, engine):
+    profile = get_profile(name)
+    env = {**os.environ, 'DEPLOY_PROFILE': name, 'PORT': str(args.port)}
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+        profile.workers = args.workers
+
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_conf.py'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        if not wait_ready(base_url, 60):
+            print(f'{name:8s} failed to start')
+            return
+
+        latencies, errors, lock = [], {'5xx': 0, 'connect': 0}, threading.Lock()
+        peak, stop_event = {'connections': 0}, threading.Event()
+        sampler = threading.Thread(target=sample_connections, args=(engine, stop_event, peak), daemon=True)
+        sampler.start()
+
+        stop_at = time.monotonic() + args.duration
+        clients = [
+            threading.Thread(target=client_loop, args=(base_url, stop_at, latencies, errors, lock, args.seed_nodes))
+            for _ in range(args.clients)
+        ]
+        started = time.monotonic()
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+        elapsed = time.monotonic() - started
+        stop_event.set()
+        sampler.join()
+
+        if latencies:
+            latencies.sort()
+            p50 = statistics.median(latencies)
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        else:
+            p50 = p99 = float('nan')
+        print(
+            f'{name:8s} {len(latencies) / elapsed:9.1f} {p50:9.1f} {p99:9.1f} '
+            f'{errors["5xx"]:6d} {errors["connect"]:6d} {peak["connections"]:8d} {profile.max_db_connections:8d}'
+        )
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='比較するプロファイル（カンマ区切り）')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=0, help='WEB_CONCURRENCY を固定して比べる場合に指定')
+    parser.add_argument('--seed-nodes', type=int, default=5)
+    parser.add_argument('--port', type=int, default=18081)
+    args = parser.parse_args()
+
+    db_url = os.environ['DATABASE_URL'].replace('postgres://', 'postgresql://', 1)
+    engine = create_engine(db_url, pool_size=1)
+    try:
+        print(f'{"profile":8s} {"req/s":>9s} {"p50 ms":>9s} {"p99 ms":>9s} {"5xx":>6s} {"conn":>6s} {"pg peak":>8s} {"pg max":>8s}')
+        for name in args.profiles.split(','):
+            run_profile(name.strip(), args, engine)
+    finally:
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
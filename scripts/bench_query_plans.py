@@ -0,0 +1,168 @@
+"""
+ホットクエリの実行計画ベンチマーク（002_session_hot_indexes.sql の前後比較）
+
+使い方:
+    DATABASE_URL=postgresql://... python scripts/bench_query_plans.py --nodes 5000 --deleted-ratio 0.3
+
+ベンチ用セッションを1つ作ってデータを投入し、
+  1) 002 で追加したインデックスをトランザクション内で DROP した状態（before）
+  2) インデックスありの状態（after）
+の EXPLAIN (ANALYZE, BUFFERS) を並べて出力する。before はロールバックするので
+インデックスは残るが、DROP INDEX はテーブルに排他ロックを取るため本番DBでは実行しないこと。
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+
+from sqlalchemy import create_engine, text
+
+NEW_INDEXES = [
+    'idx_knowledge_nodes_session_live',
+    'idx_knowledge_nodes_session_graph',
+    'idx_node_connections_source_covering',
+    'idx_node_comments_node_parent_created',
+    'idx_activity_logs_session_created',
+]
+
+CATEGORIES = ['socialization', 'externalization', 'combination', 'internalization']
+
+QUERIES = {
+    'ノード一覧 (get_nodes)': """
+        SELECT * FROM knowledge_nodes
+        WHERE session_id = :sid AND is_deleted = false
+    """,
+    'ノード数チェック (create_node)': """
+        SELECT count(*) FROM knowledge_nodes
+        WHERE session_id = :sid AND is_deleted = false
+    """,
+    'グラフ骨格 (analytics)': """
+        SELECT kn.id, kn.category, np.x, np.y FROM knowledge_nodes kn
+        LEFT JOIN node_positions np ON np.node_id = kn.id
+        WHERE kn.session_id = :sid AND kn.is_deleted = false
+    """,
+    '接続一覧 (get_nodes)': """
+        SELECT nc.id, nc.source_node_id, nc.target_node_id, nc.connection_type, nc.strength
+        FROM node_connections nc
+        JOIN knowledge_nodes kn ON nc.source_node_id = kn.id
+        WHERE kn.session_id = :sid AND kn.is_deleted = false
+    """,
+    'コメント一覧 (get_node_comments)': """
+        SELECT * FROM node_comments
+        WHERE node_id = :node_id AND parent_comment_id IS NULL AND is_deleted = false
+        ORDER BY created_at DESC
+    """,
+    'アクティビティ (get_activity_log)': """
+        SELECT * FROM activity_logs
+        WHERE session_id = :sid
+        ORDER BY created_at DESC LIMIT 50
+    """,
+}
+
+
+def seed(engine, node_count, deleted_ratio):
+    """ベンチ用セッションとデータを投入"""
+    sid = str(uuid.uuid4())
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO sessions (id, session_key) VALUES (:id, :key)"
+        ), {'id': sid, 'key': f'bench-{sid}'})
+
+        node_ids = [str(uuid.uuid4()) for _ in range(node_count)]
+        conn.execute(text("""
+            INSERT INTO knowledge_nodes
+                (id, session_id, title, description, category, is_deleted)
+            VALUES (:id, :sid, :title, :description, CAST(:category AS seci_category), :deleted)
+        """), [
+            {
+                'id': node_id,
+                'sid': sid,
+                'title': f'node {i}',
+                'description': 'x' * 200,
+                'category': random.choice(CATEGORIES),
+                'deleted': random.random() < deleted_ratio,
+            }
+            for i, node_id in enumerate(node_ids)
+        ])
+        conn.execute(text("""
+            INSERT INTO node_positions (node_id, x, y) VALUES (:id, :x, :y)
+        """), [
+            {'id': node_id, 'x': random.uniform(0, 2000), 'y': random.uniform(0, 2000)}
+            for node_id in node_ids
+        ])
+
+        pairs = {
+            (random.choice(node_ids), random.choice(node_ids))
+            for _ in range(node_count * 2)
+        }
+        conn.execute(text("""
+            INSERT INTO node_connections (source_node_id, target_node_id)
+            VALUES (:source, :target)
+        """), [{'source': s, 'target': t} for s, t in pairs if s != t])
+
+        conn.execute(text("""
+            INSERT INTO node_comments (node_id, session_id, comment_text)
+            VALUES (:node_id, :sid, 'bench comment')
+        """), [{'node_id': node_ids[0], 'sid': sid} for _ in range(200)])
+
+        conn.execute(text("""
+            INSERT INTO activity_logs (session_id, action_type, created_at)
+            VALUES (:sid, 'node_updated', now() - make_interval(mins => :age))
+        """), [{'sid': sid, 'age': i} for i in range(node_count)])
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in ('knowledge_nodes', 'node_positions', 'node_connections', 'node_comments', 'activity_logs'):
+            conn.execute(text(f'VACUUM ANALYZE {table}'))
+
+    return sid, node_ids[0]
+
+
+def explain(conn, sql, params):
+    rows = conn.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {sql}'), params).fetchall()
+    return '\n'.join(row[0] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--deleted-ratio', type=float, default=0.3)
+    parser.add_argument('--keep', action='store_true', help='ベンチデータを削除しない')
+    args = parser.parse_args()
+
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        raise RuntimeError('DATABASE_URL is not set')
+    if db_url.startswith('postgres://'):
+        db_url = db_url.replace('postgres://', 'postgresql://', 1)
+
+    engine = create_engine(db_url)
+    started = time.perf_counter()
+    sid, node_id = seed(engine, args.nodes, args.deleted_ratio)
+    print(f'seeded {args.nodes} nodes in {time.perf_counter() - started:.1f}s (session {sid})')
+    params = {'sid': sid, 'node_id': node_id}
+
+    try:
+        for label, sql in QUERIES.items():
+            print('=' * 70)
+            print(label)
+
+            with engine.connect() as conn:
+                trans = conn.begin()
+                for name in NEW_INDEXES:
+                    conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+                print('--- before')
+                print(explain(conn, sql, params))
+                trans.rollback()
+
+            with engine.connect() as conn:
+                print('--- after')
+                print(explain(conn, sql, params))
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text('DELETE FROM sessions WHERE id = :sid'), {'sid': sid})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+SessionGraph（app/session_graph.py）と to_dict() の辞書のリストのメモリ・処理時間の比較
+
+使い方:
+    python scripts/bench_session_graph.py --sizes 1000,10000,50000 --edges-per-node 1.5
+
+DB は使わない。KnowledgeNode / NodeConnection の to_dict() と同じ形の辞書（UUID・日時の文字列、
+短いタイトルと説明）を作り、サイズごとに次を出力する。メモリは tracemalloc で測った
+確保量をノード数で割ったもの（接続の分も含む）。
+  - dicts B/node:   ノード・接続の辞書のリスト（これまでの分析サマリーの入力）
+  - graph B/node:   同じグラフの SessionGraph（id の文字列・カテゴリ番号・CSR）
+  - build ms:       DB の行に相当するタプルから SessionGraph を作る時間
+  - summary ms:     AnalyticsEngine.summarize（分析サマリー全体）の時間
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.analytics import AnalyticsEngine  # noqa: E402
+from app.session_graph import CATEGORIES, SessionGraph  # noqa: E402
+
+
+def make_rows(size, edges_per_node, seed=1):
+    rng = random.Random(seed)
+    nodes = [(str(uuid.UUID(int=rng.getrandbits(128))), CATEGORIES[i % 4]) for i in range(size)]
+    edges = [
+        (nodes[rng.randrange(size)][0], nodes[rng.randrange(size)][0])
+        for _ in range(int(size * edges_per_node))
+    ]
+    return nodes, edges
+
+
+def as_dicts(nodes, edges):
+    """to_dict() と同じ形"""
+    now = datetime(2024, 1, 1)
+    node_dicts = [
+        {
+            'id': node_id,
+            'session_id': '0190a0a0-0000-7000-8000-000000000000',
+            'title': f'ノード {i}',
+            'description': f'ノード {i} の説明',
+            'category': category,
+            'metadata': {},
+            'position': {'x': float(i), 'y': float(i)},
+            'created_at': (now + timedelta(seconds=i)).isoformat(),
+            'updated_at': (now + timedelta(seconds=i)).isoformat(),
+            'is_deleted': False,
+        }
+        for i, (node_id, category) in enumerate(nodes)
+    ]
+    connection_dicts = [
+        {
+            'id': str(uuid.UUID(int=i)),
+            'source_id': source,
+            'target_id': target,
+            'connection_type': 'related',
+            'strength': 1,
+            'metadata': {},
+            'created_at': now.isoformat(),
+        }
+        for i, (source, target) in enumerate(edges)
+    ]
+    return node_dicts, connection_dicts
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--edges-per-node', type=float, default=1.5)
+    args = parser.parse_args()
+
+    print(f'{"nodes":>7s} {"dicts B/node":>13s} {"graph B/node":>13s} {"build ms":>9s} {"summary ms":>11s}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        nodes, edges = make_rows(size, args.edges_per_node)
+
+        dicts, dict_bytes = measure(lambda: as_dicts(nodes, edges))
+        del dicts
+        graph, graph_bytes = measure(lambda: SessionGraph.from_rows(nodes, edges))
+
+        started = time.perf_counter()
+        SessionGraph.from_rows(nodes, edges)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        AnalyticsEngine.summarize(graph)
+        summary_ms = (time.perf_counter() - started) * 1000
+
+        print(f'{size:7d} {dict_bytes / size:13.0f} {graph_bytes / size:13.0f} {build_ms:9.1f} {summary_ms:11.1f}')
+
+
+if __name__ == '__main__':
+    main()
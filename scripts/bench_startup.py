@@ -0,0 +1,84 @@
+"""
+起動ベンチマーク: gunicorn 起動から「最初の速いリクエスト」までの時間
+
+使い方:
+    DATABASE_URL=postgresql://... REDIS_URL=redis://... python scripts/bench_startup.py --path / --fast-ms 50
+
+GUNICORN_PRELOAD / GUNICORN_WARMUP の組み合わせごとに gunicorn を起動し、
+  - 最初に 200 が返るまでの時間
+  - 応答時間が --fast-ms 以下になった最初のリクエストまでの時間
+を計測する。リクエストは新しいクッキーで送るので、毎回セッション作成を含む。
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+VARIANTS = [
+    ('lazy (no preload, no warm-up)', {'GUNICORN_PRELOAD': '0', 'GUNICORN_WARMUP': '0'}),
+    ('warm-up only', {'GUNICORN_PRELOAD': '0', 'GUNICORN_WARMUP': '1'}),
+    ('preload + warm-up', {'GUNICORN_PRELOAD': '1', 'GUNICORN_WARMUP': '1'}),
+]
+
+
+def request_ms(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=10) as response:
+        response.read()
+        status = response.status
+    return status, (time.perf_counter() - started) * 1000
+
+
+def measure(env_overrides, port, path, fast_ms, timeout):
+    env = {**os.environ, **env_overrides, 'PORT': str(port)}
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_conf.py'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{port}{path}'
+    started = time.perf_counter()
+    first_ok = first_fast = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                status, elapsed = request_ms(url)
+            except OSError:
+                time.sleep(0.01)
+                continue
+            now = (time.perf_counter() - started) * 1000
+            if status == 200 and first_ok is None:
+                first_ok = now
+            if status == 200 and elapsed <= fast_ms:
+                first_fast = now
+                break
+        return first_ok, first_fast
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--fast-ms', type=float, default=50)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"variant":35s} {"first 200 (ms)":>16s} {"first fast (ms)":>16s}')
+    for label, overrides in VARIANTS:
+        for _ in range(args.runs):
+            first_ok, first_fast = measure(overrides, args.port, args.path, args.fast_ms, args.timeout)
+            fmt = lambda v: f'{v:16.0f}' if v is not None else f'{"timeout":>16s}'
+            print(f'{label:35s} {fmt(first_ok)} {fmt(first_fast)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+主キーの UUIDv4 / UUIDv7 比較ベンチマーク（004_uuid_v7_keys.sql）
+
+使い方:
+    DATABASE_URL=postgresql://... python scripts/bench_uuid_keys.py --rows 500000 --batch 1000
+
+knowledge_nodes と同じ形（UUID 主キー + session_id + 本文）の作業用テーブルを作り、
+  - app: Python で生成したキー（uuid.uuid4 / app.ids.uuid7）を INSERT
+  - sql: 列デフォルト（gen_random_uuid() / uuid_generate_v7()）で INSERT
+のそれぞれで挿入スループット（rows/s）、主キーインデックスのサイズ、
+pgstattuple 拡張があればリーフページの密度と断片化率を出力する。
+作業用テーブルは最後に DROP する。004 が適用済みのDBで実行すること。
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ids import uuid7  # noqa: E402
+
+GENERATORS = {
+    'v4': (uuid.uuid4, 'gen_random_uuid()'),
+    'v7': (uuid7, 'uuid_generate_v7()'),
+}
+
+
+def create_table(conn, name, default_sql):
+    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    conn.execute(text(f"""
+        CREATE TABLE {name} (
+            id UUID PRIMARY KEY DEFAULT {default_sql},
+            session_id UUID NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    conn.commit()
+
+
+def insert_rows(conn, name, rows, batch, generator=None):
+    session_id = str(uuid.uuid4())
+    started = time.perf_counter()
+    for offset in range(0, rows, batch):
+        count = min(batch, rows - offset)
+        if generator is None:
+            conn.execute(text(f"""
+                INSERT INTO {name} (session_id, title)
+                SELECT CAST(:sid AS uuid), 'bench ' || g FROM generate_series(1, :count) g
+            """), {'sid': session_id, 'count': count})
+        else:
+            conn.execute(text(f"""
+                INSERT INTO {name} (id, session_id, title)
+                SELECT unnest(CAST(:ids AS uuid[])), CAST(:sid AS uuid), 'bench'
+            """), {'ids': [str(generator()) for _ in range(count)], 'sid': session_id})
+        conn.commit()
+    return rows / (time.perf_counter() - started)
+
+
+def index_stats(conn, name, has_pgstattuple):
+    index_name = f"{name}_pkey"
+    stats = {
+        'index_mb': conn.execute(text("SELECT pg_relation_size(:idx)"), {'idx': index_name}).scalar() / 1024 / 1024,
+    }
+    if has_pgstattuple:
+        row = conn.execute(text(
+            "SELECT avg_leaf_density, leaf_fragmentation FROM pgstatindex(:idx)"
+        ), {'idx': index_name}).one()
+        stats['leaf_density'] = row[0]
+        stats['leaf_fragmentation'] = row[1]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    db_url = os.environ['DATABASE_URL'].replace('postgres://', 'postgresql://', 1)
+    engine = create_engine(db_url)
+    with engine.connect() as conn:
+        has_pgstattuple = conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pgstattuple')"
+        )).scalar()
+        conn.commit()
+
+        print(f'{"keys":10s} {"rows/s":>10s} {"index MB":>10s} {"leaf dens%":>11s} {"leaf frag%":>11s}')
+        for version, (generator, default_sql) in GENERATORS.items():
+            for mode in ('app', 'sql'):
+                name = f'bench_keys_{version}_{mode}'
+                create_table(conn, name, default_sql)
+                try:
+                    rate = insert_rows(conn, name, args.rows, args.batch,
+                                       generator if mode == 'app' else None)
+                    conn.execute(text(f"ANALYZE {name}"))
+                    stats = index_stats(conn, name, has_pgstattuple)
+                    conn.commit()
+                    density = f"{stats['leaf_density']:11.1f}" if has_pgstattuple else f'{"-":>11s}'
+                    frag = f"{stats['leaf_fragmentation']:11.1f}" if has_pgstattuple else f'{"-":>11s}'
+                    print(f'{version + "/" + mode:10s} {rate:10.0f} {stats["index_mb"]:10.1f} {density} {frag}')
+                finally:
+                    conn.rollback()
+                    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    conn.commit()
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+表示範囲のノード取得（app/viewport.py のグリッド）のベンチマーク
+
+使い方:
+    python scripts/bench_viewport.py --sizes 1000,10000,50000 --viewport 1600x900
+
+DB は使わない。一様に散らばった点（1ノードあたり IDEAL_DISTANCE 四方程度の密度）で
+グリッドを作り、サイズごとに次を出力する。
+  - build ms:   グリッドの構築時間（カーソルが進んだ後の最初のリクエストのコスト）
+  - query us:   表示範囲1回分の検索時間（ランダムな位置で平均）
+  - scan us:    同じ範囲を全点の線形走査で探した場合
+  - visible:    範囲内のノード数の平均（= 応答に含まれるノード数）
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.layout import IDEAL_DISTANCE  # noqa: E402
+from app.viewport import SpatialGrid  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--viewport', default='1600x900')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    width, height = (float(v) for v in args.viewport.split('x'))
+    rng = random.Random(1)
+
+    print(f'{"nodes":>7s} {"build ms":>9s} {"query us":>9s} {"scan us":>9s} {"visible":>8s}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        side = IDEAL_DISTANCE * math.sqrt(size)
+        points = [(f'node-{i}', rng.uniform(0, side), rng.uniform(0, side)) for i in range(size)]
+
+        started = time.perf_counter()
+        grid = SpatialGrid(points)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        boxes = []
+        for _ in range(args.queries):
+            x0 = rng.uniform(0, max(side - width, 0))
+            y0 = rng.uniform(0, max(side - height, 0))
+            boxes.append((x0, y0, x0 + width, y0 + height))
+
+        started = time.perf_counter()
+        visible = sum(len(grid.query(box)) for box in boxes)
+        query_us = (time.perf_counter() - started) * 1e6 / len(boxes)
+
+        started = time.perf_counter()
+        for x0, y0, x1, y1 in boxes:
+            [node_id for node_id, x, y in points if x0 <= x <= x1 and y0 <= y <= y1]
+        scan_us = (time.perf_counter() - started) * 1e6 / len(boxes)
+
+        print(f'{size:7d} {build_ms:9.1f} {query_us:9.1f} {scan_us:9.1f} {visible / len(boxes):8.1f}')
+
+
+if __name__ == '__main__':
+    main()
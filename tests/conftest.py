@@ -0,0 +1,69 @@
+"""
+テストの共通設定（実DB（PostgreSQL）に対するテストのフィクスチャ）
+
+使い方:
+    TEST_DATABASE_URL=postgresql://.../seci_test python -m pytest -q tests
+
+engine を使うテストは TEST_DATABASE_URL が無ければスキップする（DATABASE_URL は本番を指しうるので使わない）。
+最初にマイグレーションを適用し、テストごとに作ったセッションは終わったら削除する
+（ノード以下はカスケードで消える）。
+グラフ・グリッド・レイアウト・ID などの純 Python のテストは DB 無しで動く
+（スケジューラのテストは fakeredis[lua] が要る。無ければスキップ）。
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from app.init_db import migrate  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def engine():
+    db_url = os.getenv('TEST_DATABASE_URL')
+    if not db_url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    if db_url.startswith('postgres://'):
+        db_url = db_url.replace('postgres://', 'postgresql://', 1)
+
+    migrate(db_url)
+    engine = create_engine(db_url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def make_session(engine):
+    """sessions の行を作る関数（テスト後に削除）"""
+    created = []
+
+    def make():
+        with engine.begin() as conn:
+            sid = conn.execute(text(
+                "INSERT INTO sessions (session_key) VALUES (md5(random()::text)) RETURNING id"
+            )).scalar()
+        created.append(sid)
+        return sid
+
+    yield make
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM sessions WHERE id = ANY(:ids)"), {'ids': created})
+
+
+def add_node(conn, session_id, title, category='socialization', is_deleted=False):
+    return conn.execute(text("""
+        INSERT INTO knowledge_nodes (session_id, title, category, is_deleted)
+        VALUES (:sid, :title, :category, :is_deleted)
+        RETURNING id
+    """), {'sid': session_id, 'title': title, 'category': category, 'is_deleted': is_deleted}).scalar()
+
+
+def connect(conn, source_id, target_id):
+    conn.execute(text("""
+        INSERT INTO node_connections (source_node_id, target_node_id) VALUES (:source, :target)
+    """), {'source': source_id, 'target': target_id})
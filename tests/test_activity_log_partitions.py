@@ -0,0 +1,81 @@
+"""
+期限切れの activity_logs パーティションの切り離しと DROP を実DBで確かめる
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.cleanup_service import CleanupService
+
+EXPIRED = 'activity_logs_p200001'
+CUTOFF = datetime(2001, 1, 1)
+
+
+@pytest.fixture
+def service(engine, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', engine.url.render_as_string(hide_password=False))
+    monkeypatch.delenv('DATABASE_SHARD_URLS', raising=False)
+    monkeypatch.setenv('REDIS_URL', 'redis://127.0.0.1:1/0')
+    service = CleanupService()
+    service.partition_detach_lock_timeout_ms = 200
+    yield service
+    for shard_engine in service.engines:
+        shard_engine.dispose()
+
+
+@pytest.fixture
+def expired_partition(engine, make_session):
+    sid = make_session()
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE {EXPIRED} PARTITION OF activity_logs
+            FOR VALUES FROM ('2000-01-01') TO ('2000-02-01')
+        """))
+        conn.execute(text("""
+            INSERT INTO activity_logs (session_id, action_type, created_at)
+            SELECT :sid, 'test', TIMESTAMP '2000-01-15' FROM generate_series(1, 3)
+        """), {'sid': sid})
+    yield
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS {EXPIRED}'))
+
+
+def partition_exists(engine):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT to_regclass('public.{EXPIRED}')")).scalar() is not None
+
+
+def drop_expired(service):
+    session = sessionmaker(bind=service.engines[0])()
+    try:
+        return service.drop_expired_activity_log_partitions(session, CUTOFF)
+    finally:
+        session.close()
+
+
+def test_drop_counts_rows(engine, service, expired_partition):
+    assert drop_expired(service) == {EXPIRED: 3}
+    assert not partition_exists(engine)
+
+
+def test_detach_gives_way_to_readers(engine, service, expired_partition):
+    # DEFAULT パーティションがあるので通常の DETACH。読み取り中のトランザクションがあれば待たずに次回へ
+    with engine.connect() as reader:
+        reader.execute(text("SELECT count(*) FROM activity_logs"))
+        assert drop_expired(service) == {}
+        reader.rollback()
+    assert partition_exists(engine)
+    assert drop_expired(service) == {EXPIRED: 3}
+
+
+def test_concurrent_detach_without_default_partition(engine, service, expired_partition):
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE activity_logs DETACH PARTITION activity_logs_default"))
+    try:
+        assert drop_expired(service) == {EXPIRED: 3}
+        assert not partition_exists(engine)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE activity_logs ATTACH PARTITION activity_logs_default DEFAULT"))
@@ -0,0 +1,188 @@
+"""
+app/cleanup_scheduler.py のリースと再開位置を fakeredis で確かめる（DB 不要）
+
+  - リースを持つのは1インスタンスだけで、解放すれば他が取れる
+  - スライスの途中・保存の直前にリースを失ったら、再開位置とメトリクスを書かない
+  - Redis スイープは SCAN が一周するまで休ませず、別のインスタンスが再開位置から続ける
+  - DBのタスクは何も消えなかったときだけ休ませる
+"""
+import json
+import time
+
+import pytest
+
+from app.cleanup_scheduler import CURSOR_KEY, LEADER_KEY, METRICS_KEY_PREFIX, CleanupScheduler, LeaseLost
+from app.cleanup_service import REDIS_SWEEP_PATTERNS, CleanupService
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def make_scheduler(server, monkeypatch):
+    """fakeredis につないだ CleanupService とスケジューラを作る関数（DBには接続しない）"""
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://u:p@127.0.0.1:1/x')
+    monkeypatch.delenv('DATABASE_SHARD_URLS', raising=False)
+    monkeypatch.setenv('REDIS_URL', 'redis://127.0.0.1:1/0')
+
+    def make(run=(), **tasks):
+        """tasks はタスク名ごとの差し替え。run と tasks に無いタスクは期限を先にして実行させない"""
+        service = CleanupService()
+        service.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        service.redis_scan_count = 5
+        service.redis_sweep_rate = 0
+        scheduler = CleanupScheduler(service)
+        scheduler.tasks = [(name, tasks.get(name, task)) for name, task in scheduler.tasks]
+        for name in scheduler._next_run:
+            if name not in tasks and name not in run:
+                scheduler._next_run[name] = float('inf')
+        return scheduler
+
+    return make
+
+
+def steal_lease(scheduler):
+    scheduler.redis_client.set(LEADER_KEY, 'other-instance')
+
+
+def metrics(scheduler, name):
+    return scheduler.redis_client.hgetall(METRICS_KEY_PREFIX + name)
+
+
+def test_single_leader(make_scheduler):
+    a, b = make_scheduler(), make_scheduler()
+    assert a._hold_lease()
+    assert not b._hold_lease()
+    # 延長しても持ち主は変わらない
+    assert a._hold_lease()
+    assert a.redis_client.get(LEADER_KEY) == a.instance_id
+    assert a.redis_client.pttl(LEADER_KEY) > 0
+
+    a.release()
+    assert not a.is_leader
+    assert b._hold_lease()
+    # 他のインスタンスのリースは解放しない
+    a.release()
+    assert b.redis_client.get(LEADER_KEY) == b.instance_id
+
+
+def test_lost_lease_is_not_retaken(make_scheduler):
+    a = make_scheduler()
+    assert a._hold_lease()
+    steal_lease(a)
+    with pytest.raises(LeaseLost):
+        a._keep_lease()
+    a.redis_client.delete(LEADER_KEY)
+    # 空いていても _keep_lease では取り直さない
+    with pytest.raises(LeaseLost):
+        a._keep_lease()
+    assert not a.redis_client.exists(LEADER_KEY)
+
+
+def test_lease_lost_mid_task_saves_nothing(make_scheduler):
+    calls = []
+
+    def task(time_budget=None):
+        calls.append(time_budget)
+        steal_lease(scheduler)
+        scheduler.service.batch_hook()
+        return 10
+
+    scheduler = make_scheduler(sessions=task)
+    assert scheduler._hold_lease()
+    assert scheduler.run_slice() == 'sessions'
+    assert calls == [scheduler.slice_seconds]
+    assert metrics(scheduler, 'sessions') == {}
+    # 休ませない（次のリーダーがすぐ続けられる）
+    assert scheduler._next_run['sessions'] <= time.monotonic()
+
+
+def test_lease_lost_before_save_keeps_new_leaders_state(make_scheduler):
+    def task(time_budget=None):
+        steal_lease(scheduler)
+        scheduler.redis_client.hset(CURSOR_KEY, 'redis_cache', json.dumps({'session:*': 42}))
+        scheduler.service._redis_cursors = {}
+        return 0
+
+    scheduler = make_scheduler(redis_cache=task)
+    assert scheduler._hold_lease()
+    assert scheduler.run_slice() == 'redis_cache'
+    assert json.loads(scheduler.redis_client.hget(CURSOR_KEY, 'redis_cache')) == {'session:*': 42}
+    assert metrics(scheduler, 'redis_cache') == {}
+    assert not scheduler.is_leader
+
+
+def test_partial_redis_sweep_is_resumed_until_caught_up(make_scheduler):
+    a = make_scheduler(run=('redis_cache',))
+    a.slice_seconds = 0  # 1ページごとに時間切れにする
+    client = a.redis_client
+    for pattern in REDIS_SWEEP_PATTERNS[:2]:
+        prefix = pattern.rstrip('*')
+        for i in range(30):
+            client.set(f'{prefix}stale{i}', 'x')
+            client.set(f'{prefix}fresh{i}', 'x', ex=3600)
+
+    assert a._hold_lease()
+    assert a.run_slice() == 'redis_cache'
+    saved = json.loads(client.hget(CURSOR_KEY, 'redis_cache'))
+    assert saved == a.service._redis_cursors and saved
+    # SCAN の途中なので休ませない
+    assert a._next_run['redis_cache'] <= time.monotonic()
+    assert metrics(a, 'redis_cache')['slices'] == '1'
+
+    # 別のインスタンスが保存された再開位置から続ける
+    a.release()
+    b = make_scheduler(run=('redis_cache',))
+    b.slice_seconds = 0
+    assert b._hold_lease()
+    # 1スライス1ページで、全パターンの SCAN が一周したら休む
+    for _ in range(1000):
+        b.run_slice()
+        if b._next_run['redis_cache'] > time.monotonic():
+            break
+    else:
+        pytest.fail('Redis sweep never caught up')
+    assert b.service._redis_cursors == {}
+    assert json.loads(client.hget(CURSOR_KEY, 'redis_cache')) == {}
+    assert not any(client.exists(f'{p.rstrip("*")}stale{i}') for p in REDIS_SWEEP_PATTERNS[:2] for i in range(30))
+    assert all(client.exists(f'{p.rstrip("*")}fresh{i}') for p in REDIS_SWEEP_PATTERNS[:2] for i in range(30))
+    assert int(metrics(b, 'redis_cache')['total_rows_removed']) == 60
+
+
+def test_db_task_rests_only_when_nothing_removed(make_scheduler):
+    results = iter([3, {'node_connections': 2, 'node_comments': 1}, 0])
+    scheduler = make_scheduler(sessions=lambda time_budget=None: next(results))
+    assert scheduler._hold_lease()
+
+    for _ in range(2):
+        assert scheduler.run_slice() == 'sessions'
+        assert scheduler._next_run['sessions'] <= time.monotonic()
+    assert scheduler.run_slice() == 'sessions'
+    assert scheduler._next_run['sessions'] > time.monotonic()
+    assert scheduler.run_slice() is None
+
+    recorded = metrics(scheduler, 'sessions')
+    assert recorded['total_rows_removed'] == '6'
+    assert recorded['slices'] == '3'
+    assert recorded['last_rows_removed'] == '0'
+    assert recorded['instance'] == scheduler.instance_id
+
+
+def test_tasks_take_turns(make_scheduler):
+    ran = []
+
+    def task(name):
+        def run(time_budget=None):
+            ran.append(name)
+            return 1
+        return run
+
+    scheduler = make_scheduler(sessions=task('sessions'), tombstones=task('tombstones'))
+    assert scheduler._hold_lease()
+    for _ in range(4):
+        scheduler.run_slice()
+    assert ran == ['sessions', 'tombstones', 'sessions', 'tombstones']
@@ -0,0 +1,84 @@
+"""
+app/clusters.py のズームレベルとクラスタ要約を確かめる（DB 不要）
+
+要約の件数・カテゴリ別件数・重心・セル間の接続数を、ノードごとにセルを求めて数え直した結果と比べる。
+"""
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from app.clusters import (
+    MAX_LEVEL, MIN_LEVEL, build_cluster_level, cell_size_for_level, cluster_response, level_for_zoom, parse_zoom,
+)
+from app.session_graph import CATEGORIES
+
+
+def test_parse_zoom():
+    assert parse_zoom('0.25') == 0.25
+    for value in [None, '', 'abc', '0', '-1', 'nan', 'inf']:
+        assert parse_zoom(value) is None
+
+
+def test_level_for_zoom():
+    assert level_for_zoom(1) == 0
+    assert level_for_zoom(4) == MAX_LEVEL
+    assert level_for_zoom(0.5) == -1
+    assert level_for_zoom(0.3) == -2
+    assert level_for_zoom(1e-9) == MIN_LEVEL
+    # 1段縮小するとセルは2倍
+    assert cell_size_for_level(-1) == cell_size_for_level(0) * 2
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_summary_matches_brute_force(seed):
+    rng = random.Random(seed)
+    level = rng.randint(MIN_LEVEL, MAX_LEVEL)
+    size = cell_size_for_level(level)
+    spread = size * rng.choice([1, 5, 20])
+    nodes = [
+        (f'n{i}', rng.choice(CATEGORIES), rng.uniform(-spread, spread), rng.uniform(-spread, spread))
+        for i in range(rng.randint(1, 200))
+    ]
+    edges = [(rng.choice(nodes)[0], rng.choice(nodes)[0]) for _ in range(rng.randint(0, 300))]
+    # 片方が要約に含まれない接続は数えない
+    edges.append(('n0', 'gone'))
+
+    summary = build_cluster_level(nodes, edges, level)
+
+    cell_of = {node_id: f'{math.floor(x / size)}:{math.floor(y / size)}' for node_id, _, x, y in nodes}
+    members = {}
+    for node in nodes:
+        members.setdefault(cell_of[node[0]], []).append(node)
+
+    assert summary['cell_size'] == size
+    assert {c['id'] for c in summary['clusters']} == set(members)
+    for cluster in summary['clusters']:
+        group = members[cluster['id']]
+        assert cluster['count'] == len(group)
+        assert cluster['categories'] == {**dict.fromkeys(CATEGORIES, 0), **Counter(c for _, c, _, _ in group)}
+        assert cluster['x'] == pytest.approx(sum(x for _, _, x, _ in group) / len(group), abs=0.051)
+        assert cluster['y'] == pytest.approx(sum(y for _, _, _, y in group) / len(group), abs=0.051)
+        assert cluster['bbox'][0] <= cluster['x'] <= cluster['bbox'][2]
+
+    weights = Counter(
+        (cell_of[s], cell_of[t]) for s, t in edges
+        if s in cell_of and t in cell_of and cell_of[s] != cell_of[t]
+    )
+    assert {(e['source'], e['target']): e['weight'] for e in summary['edges']} == dict(weights)
+
+
+def test_response_filters_by_bbox():
+    nodes = [('a', 'socialization', 10, 10), ('b', 'combination', 1000, 1000), ('c', 'internalization', -1000, 10)]
+    edges = [('a', 'b'), ('b', 'c'), ('c', 'a')]
+    summary = build_cluster_level(nodes, edges, 0)
+
+    response = cluster_response(summary, 0, 'cursor', False, (-2000, 0, 100, 100))
+    assert sorted(c['count'] for c in response['clusters']) == [1, 1]
+    # 両端が範囲内のクラスタの接続だけ
+    assert len(response['edges']) == 1
+    assert response['edges'][0]['weight'] == 1
+
+    whole = cluster_response(summary, 0, 'cursor', True)
+    assert len(whole['clusters']) == 3 and len(whole['edges']) == 3 and whole['bbox'] is None
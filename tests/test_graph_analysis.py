@@ -0,0 +1,124 @@
+"""
+app/graph_analysis.py のスパイラル分析をランダムなグラフで確かめる（DB 不要）
+
+循環 S→E→C→I→S の数と循環に含まれるノード、理想的な遷移の最長の連鎖を、
+すべての組・経路を列挙する素朴な数え方と比べる。
+"""
+import itertools
+import random
+
+import pytest
+
+from app import graph_analysis
+from app.graph_analysis import analyze_spiral, count_cycles, longest_chain
+from app.session_graph import CATEGORIES, SessionGraph
+
+
+def random_graph(rng, size, edge_count):
+    """接続の多くを次のフェーズへ向け、循環や長い連鎖ができやすくしたランダムなグラフ"""
+    nodes = [(f'n{i:03d}', rng.choice(CATEGORIES + ('unknown',))) for i in range(size)]
+    by_category = {}
+    for node_id, category in nodes:
+        by_category.setdefault(category, []).append(node_id)
+    edges = []
+    for _ in range(edge_count if nodes else 0):
+        source, category = rng.choice(nodes)
+        following = []
+        if category in CATEGORIES:
+            following = by_category.get(CATEGORIES[(CATEGORIES.index(category) + 1) % len(CATEGORIES)], [])
+        if following and rng.random() < 0.7:
+            edges.append((source, rng.choice(following)))
+        else:
+            edges.append((source, rng.choice(nodes)[0]))
+    return SessionGraph.from_rows(nodes, edges)
+
+
+def ideal_edges(graph):
+    return set(graph.ideal_flows().edges())
+
+
+def brute_force_cycles(graph):
+    edges = ideal_edges(graph)
+    layers = [graph.nodes_of(code) for code in range(len(CATEGORIES))]
+    return [
+        (s, e, c, i) for s, e, c, i in itertools.product(*layers)
+        if (s, e) in edges and (e, c) in edges and (c, i) in edges and (i, s) in edges
+    ]
+
+
+def brute_force_longest(graph, max_length):
+    """理想的な遷移をたどる経路（同じノードを通ってもよい）の最長（max_length で打ち切り）"""
+    successors = {}
+    for s, t in ideal_edges(graph):
+        successors.setdefault(s, []).append(t)
+
+    def walk(node, length):
+        if length == max_length:
+            return length
+        return max((walk(t, length + 1) for t in successors.get(node, ())), default=length)
+
+    return max((walk(node, 0) for node in range(len(graph))), default=0)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_cycles_match_brute_force(seed):
+    rng = random.Random(seed)
+    graph = random_graph(rng, rng.randint(0, 16), rng.randint(0, 60))
+    cycles = brute_force_cycles(graph)
+    result = count_cycles(graph.ideal_flows())
+
+    assert not result['truncated']
+    assert result['complete_cycles'] == len(cycles)
+    assert result['nodes_in_cycles'] == len({node for cycle in cycles for node in cycle})
+    named = {tuple(graph.ids[n] for n in cycle) for cycle in cycles}
+    # 例は閉じる組 (共同化, 連結化) ごとに1つ
+    closing = {(s, c) for s, _, c, _ in cycles}
+    assert len(result['sample_cycles']) == min(len(closing), graph_analysis.SAMPLE_CYCLES)
+    for sample in result['sample_cycles']:
+        assert tuple(sample) in named
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_longest_chain_matches_brute_force(seed):
+    rng = random.Random(seed)
+    graph = random_graph(rng, rng.randint(0, 14), rng.randint(0, 40))
+    max_length = 6
+    result = longest_chain(graph.ideal_flows(), max_length)
+    expected = brute_force_longest(graph, max_length)
+
+    assert result['length'] == expected
+    assert result['capped'] == (expected == max_length)
+    if expected:
+        # 返した連鎖が理想的な遷移をたどっている
+        chain = [graph.index_of(node_id) for node_id in result['nodes']]
+        assert len(chain) == expected + 1
+        edges = ideal_edges(graph)
+        assert all(pair in edges for pair in zip(chain, chain[1:]))
+    else:
+        assert result['nodes'] == []
+
+
+def test_duplicate_connections_are_counted_once():
+    nodes = [('s', 'socialization'), ('e', 'externalization'), ('c', 'combination'), ('i', 'internalization')]
+    edges = [('s', 'e'), ('s', 'e'), ('e', 'c'), ('c', 'i'), ('i', 's'), ('s', 'c')]
+    result = analyze_spiral(SessionGraph.from_rows(nodes, edges))
+
+    assert result['complete_cycles'] == 1
+    assert result['nodes_in_cycles'] == 4
+    assert result['coverage_percentage'] == 100.0
+    assert result['sample_cycles'] == [['s', 'e', 'c', 'i']]
+    assert result['longest_chain']['capped']
+
+
+def test_wedge_limit_truncates(monkeypatch):
+    # 各層3ノードで、次の層へ全部つなぐ（中間ノード1つあたり 3×3 のウェッジ）
+    nodes = [(f'{category}{k}', category) for category in CATEGORIES for k in range(3)]
+    edges = [
+        (f'{category}{a}', f'{CATEGORIES[(code + 1) % len(CATEGORIES)]}{b}')
+        for code, category in enumerate(CATEGORIES) for a in range(3) for b in range(3)
+    ]
+    graph = SessionGraph.from_rows(nodes, edges).ideal_flows()
+    assert count_cycles(graph)['complete_cycles'] == 3 ** 4
+
+    monkeypatch.setattr(graph_analysis, 'SPIRAL_MAX_WEDGES', 20)
+    assert count_cycles(graph)['truncated']
@@ -0,0 +1,65 @@
+"""
+app/ids.py の UUIDv7 を確かめる（DB 不要）
+
+バージョン・バリアント・先頭 48bit の時刻と、同じミリ秒内・時計が戻ったとき・
+カウンタがあふれたときも生成順に並ぶこと。
+"""
+import time
+import uuid
+
+import pytest
+
+from app import ids
+from app.ids import uuid7
+
+
+def timestamp_ms(value):
+    return value.int >> 80
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ids の時計を止めて手で進める（生成の状態はテスト後に戻す）"""
+    monkeypatch.setattr(ids, '_last_ms', 0)
+    monkeypatch.setattr(ids, '_counter', 0)
+    now = {'ms': 1_700_000_000_000}
+    monkeypatch.setattr(ids.time, 'time_ns', lambda: now['ms'] * 1_000_000)
+    return now
+
+
+def test_version_variant_and_timestamp():
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert before <= timestamp_ms(value) <= after
+    assert uuid.UUID(str(value)) == value
+
+
+def test_sequential_ids_sort_in_creation_order():
+    values = [uuid7() for _ in range(5000)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+    # 文字列でも同じ順（API や DB の text 比較）
+    assert [str(v) for v in values] == sorted(str(v) for v in values)
+
+
+def test_same_millisecond_and_clock_going_back(clock):
+    first = [uuid7() for _ in range(100)]
+    assert {timestamp_ms(v) for v in first} == {clock['ms']}
+
+    clock['ms'] -= 5000
+    later = [uuid7() for _ in range(100)]
+    # 戻った時計は使わず直前の時刻のまま
+    assert {timestamp_ms(v) for v in later} == {clock['ms'] + 5000}
+    values = first + later
+    assert values == sorted(values)
+
+
+def test_counter_overflow_moves_to_next_millisecond(clock):
+    values = [uuid7() for _ in range(ids._COUNTER_MAX + 2)]
+    assert values == sorted(values)
+    assert timestamp_ms(values[-1]) == clock['ms'] + 1
+    assert all(v.version == 7 for v in values)
@@ -0,0 +1,120 @@
+"""
+app/layout.py のサーバー側レイアウトを確かめる（DB 不要）
+
+  - 四分木の反発力: theta=0 なら全ペアの総和と一致し、既定の theta でも誤差が小さい
+  - 構造のハッシュは行の順序によらず、ノード・カテゴリ・接続が変わったときだけ変わる
+  - 同じグラフからは常に同じ配置になり、原点中心でカテゴリの象限に分かれる
+"""
+import math
+import random
+
+import pytest
+
+from app.layout import (
+    CATEGORY_ANCHORS, IDEAL_DISTANCE, THETA, _build_tree, _repulsion, compute_layout, parse_center,
+    structural_hash,
+)
+from app.session_graph import CATEGORIES, SessionGraph
+
+
+def random_graph(rng, size, edge_count):
+    nodes = [(f'n{i:03d}', rng.choice(CATEGORIES)) for i in range(size)]
+    edges = [(rng.choice(nodes)[0], rng.choice(nodes)[0]) for _ in range(edge_count)]
+    return nodes, edges
+
+
+def exact_repulsion(xs, ys, k2):
+    fx, fy = [0.0] * len(xs), [0.0] * len(xs)
+    for i in range(len(xs)):
+        for j in range(len(xs)):
+            if i != j:
+                dx, dy = xs[i] - xs[j], ys[i] - ys[j]
+                d2 = dx * dx + dy * dy
+                fx[i] += dx * k2 / d2
+                fy[i] += dy * k2 / d2
+    return fx, fy
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_repulsion_matches_pairwise_sum(seed):
+    rng = random.Random(seed)
+    n = rng.randint(2, 150)
+    xs = [rng.uniform(-500, 500) for _ in range(n)]
+    ys = [rng.uniform(-500, 500) for _ in range(n)]
+    k2 = IDEAL_DISTANCE ** 2
+    expected = exact_repulsion(xs, ys, k2)
+
+    com_x, com_y, mass, *_ = _build_tree(xs, ys)
+    assert mass[0] == n
+    assert com_x[0] == pytest.approx(sum(xs) / n)
+    assert com_y[0] == pytest.approx(sum(ys) / n)
+
+    exact = _repulsion(xs, ys, k2, 0.0, rng)
+    for got, want in zip(exact, expected):
+        assert got == pytest.approx(want, rel=1e-9, abs=1e-6)
+
+    # Barnes–Hut の近似誤差は力の大きさに比べて小さい
+    fx, fy = _repulsion(xs, ys, k2, THETA, rng)
+    error = math.sqrt(sum((a - b) ** 2 for a, b in zip(fx + fy, expected[0] + expected[1])))
+    norm = math.sqrt(sum(v * v for v in expected[0] + expected[1]))
+    assert error <= 0.1 * norm
+
+
+def test_repulsion_separates_overlapping_nodes():
+    rng = random.Random(0)
+    fx, fy = _repulsion([0.0, 0.0, 0.0], [0.0, 0.0, 0.0], 1.0, THETA, rng)
+    assert all(math.isfinite(v) for v in fx + fy)
+    assert any(v != 0 for v in fx + fy)
+
+
+def test_structural_hash():
+    rng = random.Random(3)
+    nodes, edges = random_graph(rng, 30, 60)
+    base = structural_hash(SessionGraph.from_rows(nodes, edges))
+
+    shuffled_nodes, shuffled_edges = nodes[:], edges[:]
+    rng.shuffle(shuffled_nodes)
+    rng.shuffle(shuffled_edges)
+    assert structural_hash(SessionGraph.from_rows(shuffled_nodes, shuffled_edges)) == base
+
+    recategorized = [(nodes[0][0], CATEGORIES[(CATEGORIES.index(nodes[0][1]) + 1) % 4])] + nodes[1:]
+    assert structural_hash(SessionGraph.from_rows(recategorized, edges)) != base
+    assert structural_hash(SessionGraph.from_rows(nodes, edges + [(nodes[0][0], nodes[1][0])])) != base
+    assert structural_hash(SessionGraph.from_rows(nodes[1:], edges)) != base
+
+
+def test_layout_is_deterministic_and_centered():
+    rng = random.Random(5)
+    nodes, edges = random_graph(rng, 60, 90)
+    graph = SessionGraph.from_rows(nodes, edges)
+
+    positions = compute_layout(graph, iterations=30)
+    assert positions == compute_layout(SessionGraph.from_rows(nodes, edges), iterations=30)
+    assert set(positions) == {node_id for node_id, _ in nodes}
+    assert all(math.isfinite(x) and math.isfinite(y) for x, y in positions.values())
+    # 原点中心（座標は 0.1 単位に丸める）
+    assert abs(sum(x for x, _ in positions.values()) / len(nodes)) < 0.1
+    assert abs(sum(y for _, y in positions.values()) / len(nodes)) < 0.1
+
+
+def test_categories_gather_in_their_quadrants():
+    nodes = [(f'{category}{k}', category) for category in CATEGORIES for k in range(10)]
+    positions = compute_layout(SessionGraph.from_rows(nodes, []))
+    for category, (ux, uy) in CATEGORY_ANCHORS.items():
+        members = [positions[node_id] for node_id, c in nodes if c == category]
+        mean_x = sum(x for x, _ in members) / len(members)
+        mean_y = sum(y for _, y in members) / len(members)
+        assert mean_x * ux > 0 and mean_y * uy > 0
+
+
+def test_small_graphs():
+    assert compute_layout(SessionGraph.from_rows([], [])) == {}
+    assert compute_layout(SessionGraph.from_rows([('only', 'combination')], [])) == {'only': (0.0, 0.0)}
+
+
+def test_parse_center():
+    assert parse_center(None) == (0.0, 0.0)
+    assert parse_center({}) == (0.0, 0.0)
+    assert parse_center({'x': '10', 'y': -2.5}) == (10.0, -2.5)
+    for value in [[1, 2], 'origin', {'x': 'a'}, {'x': None}, {'x': 1, 'y': float('nan')}, {'y': 'inf'}]:
+        assert parse_center(value) is None
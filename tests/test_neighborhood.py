@@ -0,0 +1,68 @@
+"""
+app/neighborhood.py の再帰 CTE（NEIGHBORHOOD_QUERY）を実DBで確かめる
+
+グラフ（セッション A）:
+    center -> a1 -> a2 -> a3 -> a4
+    a2 -> center（閉路）, a1 -> gone（論理削除済み）, a1 -> other（セッション B のノード）
+"""
+import pytest
+from sqlalchemy import text
+
+from app.neighborhood import NEIGHBORHOOD_QUERY, walk_params
+from conftest import add_node, connect
+
+
+@pytest.fixture
+def graph(engine, make_session):
+    sid, other_sid = make_session(), make_session()
+    with engine.begin() as conn:
+        ids = {name: add_node(conn, sid, name) for name in ('center', 'a1', 'a2', 'a3', 'a4')}
+        ids['gone'] = add_node(conn, sid, 'gone', is_deleted=True)
+        ids['other'] = add_node(conn, other_sid, 'other')
+        for source, target in (('center', 'a1'), ('a1', 'a2'), ('a2', 'a3'), ('a3', 'a4'),
+                               ('a2', 'center'), ('a1', 'gone'), ('a1', 'other')):
+            connect(conn, ids[source], ids[target])
+    names = {str(node_id): name for name, node_id in ids.items()}
+    return sid, other_sid, ids, names
+
+
+def walk(engine, names, session_id, center, depth, direction):
+    with engine.connect() as conn:
+        rows = conn.execute(NEIGHBORHOOD_QUERY, walk_params(session_id, center, depth, direction)).all()
+    return {names[str(node_id)]: node_depth for node_id, node_depth in rows}
+
+
+def test_depth_limit(engine, graph):
+    sid, _, ids, names = graph
+    assert walk(engine, names, sid, ids['center'], 1, 'out') == {'center': 0, 'a1': 1}
+    assert walk(engine, names, sid, ids['center'], 2, 'out') == {'center': 0, 'a1': 1, 'a2': 2}
+    assert walk(engine, names, sid, ids['center'], 3, 'out') == {'center': 0, 'a1': 1, 'a2': 2, 'a3': 3}
+
+
+def test_direction_in(engine, graph):
+    sid, _, ids, names = graph
+    # center に入ってくるのは a2 だけ
+    assert walk(engine, names, sid, ids['center'], 2, 'in') == {'center': 0, 'a2': 1, 'a1': 2}
+
+
+def test_cycle_terminates_with_shortest_depth(engine, graph):
+    sid, _, ids, names = graph
+    result = walk(engine, names, sid, ids['center'], 3, 'both')
+    # 閉路を回って戻ってきた center は深さ 0 のまま1行だけ
+    assert result == {'center': 0, 'a1': 1, 'a2': 1, 'a3': 2, 'a4': 3}
+
+
+def test_session_scoping_and_deleted_nodes(engine, graph):
+    sid, other_sid, ids, names = graph
+    result = walk(engine, names, sid, ids['a1'], 1, 'both')
+    assert 'other' not in result
+    assert 'gone' not in result
+    # 他のセッションからは中心のノードも見えない
+    assert walk(engine, names, other_sid, ids['center'], 3, 'both') == {}
+
+
+def test_deleted_center_returns_nothing(engine, graph):
+    sid, _, ids, names = graph
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE knowledge_nodes SET is_deleted = TRUE WHERE id = :id"), {'id': ids['center']})
+    assert walk(engine, names, sid, ids['center'], 2, 'both') == {}
@@ -0,0 +1,135 @@
+"""
+007 の node_stats（トリガーで増減）を読む node_statistics が、001 のビューと同じ
+COUNT(DISTINCT ...) の集計（scripts/bench_node_stats.py の LEGACY_QUERY）と一致し続けることを、
+子の行の追加・削除・付け替えとコメントの論理削除/復元、reaction_type の変更のたびに確かめる
+"""
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from conftest import add_node
+from scripts.bench_node_stats import LEGACY_QUERY, VIEW_QUERY
+
+
+@pytest.fixture
+def tag_ids(engine):
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO tags (id, name) VALUES (:id, :name)"), [
+            {'id': tag_id, 'name': f'test-{tag_id[:8]}'} for tag_id in ids
+        ])
+    yield ids
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM tags WHERE id = ANY(CAST(:ids AS uuid[]))"), {'ids': ids})
+
+
+@pytest.fixture
+def nodes(engine, make_session, tag_ids):
+    sid = make_session()
+    reactors = [make_session(), make_session()]
+    with engine.begin() as conn:
+        n1, n2 = add_node(conn, sid, 'n1'), add_node(conn, sid, 'n2')
+        conn.execute(text("INSERT INTO node_tags (node_id, tag_id) VALUES (:node, :tag)"), [
+            {'node': n1, 'tag': tag_ids[0]}, {'node': n1, 'tag': tag_ids[1]}, {'node': n2, 'tag': tag_ids[2]},
+        ])
+        conn.execute(text("""
+            INSERT INTO node_reactions (node_id, session_id, reaction_type) VALUES (:node, :sid, :type)
+        """), [
+            {'node': n1, 'sid': reactors[0], 'type': 'like'},
+            {'node': n1, 'sid': reactors[1], 'type': 'like'},
+            {'node': n1, 'sid': reactors[0], 'type': 'star'},
+            {'node': n2, 'sid': reactors[1], 'type': 'bookmark'},
+        ])
+        conn.execute(text("""
+            INSERT INTO node_comments (node_id, session_id, comment_text, is_deleted)
+            VALUES (:node, :sid, 'c', :deleted)
+        """), [
+            {'node': n1, 'sid': sid, 'deleted': False},
+            {'node': n1, 'sid': sid, 'deleted': False},
+            {'node': n1, 'sid': sid, 'deleted': True},
+        ])
+        conn.execute(text("""
+            INSERT INTO node_versions (node_id, title, category, version_number)
+            VALUES (:node, 'v', 'socialization', :number)
+        """), [{'node': n1, 'number': 1}, {'node': n1, 'number': 2}, {'node': n2, 'number': 1}])
+    return sid, n1, n2
+
+
+def assert_matches_legacy(engine, sid):
+    with engine.connect() as conn:
+        legacy = [tuple(row) for row in conn.execute(text(LEGACY_QUERY), {'sid': sid})]
+        view = [tuple(row) for row in conn.execute(text(VIEW_QUERY), {'sid': sid})]
+    assert view == legacy
+    return {str(row[0]): row[1:] for row in view}
+
+
+def execute(engine, sql, **params):
+    with engine.begin() as conn:
+        return conn.execute(text(sql), params)
+
+
+def test_insert(engine, nodes):
+    sid, n1, n2 = nodes
+    counts = assert_matches_legacy(engine, sid)
+    # (tag, like, star, bookmark, comment, version)
+    assert counts[str(n1)] == (2, 2, 1, 0, 2, 2)
+    assert counts[str(n2)] == (1, 0, 0, 1, 0, 1)
+
+
+def test_delete(engine, nodes):
+    sid, n1, n2 = nodes
+    execute(engine, "DELETE FROM node_tags WHERE node_id = :node", node=n1)
+    execute(engine, "DELETE FROM node_reactions WHERE node_id = :node AND reaction_type = 'like'", node=n1)
+    execute(engine, "DELETE FROM node_versions WHERE node_id = :node AND version_number = 2", node=n1)
+    execute(engine, "DELETE FROM node_comments WHERE node_id = :node AND NOT is_deleted", node=n1)
+    counts = assert_matches_legacy(engine, sid)
+    assert counts[str(n1)] == (0, 0, 1, 0, 0, 1)
+
+
+def test_comment_soft_delete_and_restore(engine, nodes):
+    sid, n1, _ = nodes
+    execute(engine, "UPDATE node_comments SET is_deleted = TRUE WHERE node_id = :node", node=n1)
+    assert assert_matches_legacy(engine, sid)[str(n1)][4] == 0
+    execute(engine, "UPDATE node_comments SET is_deleted = FALSE WHERE node_id = :node", node=n1)
+    assert assert_matches_legacy(engine, sid)[str(n1)][4] == 3
+    # 本文の編集では変わらない
+    execute(engine, "UPDATE node_comments SET comment_text = 'edited' WHERE node_id = :node", node=n1)
+    assert assert_matches_legacy(engine, sid)[str(n1)][4] == 3
+
+
+def test_reaction_type_change(engine, nodes):
+    sid, n1, n2 = nodes
+    execute(engine, """
+        UPDATE node_reactions SET reaction_type = 'bookmark'
+        WHERE node_id = :node AND reaction_type = 'star'
+    """, node=n1)
+    assert assert_matches_legacy(engine, sid)[str(n1)][1:4] == (2, 0, 1)
+    # 数えない種類への変更と、そこからの戻し
+    execute(engine, "UPDATE node_reactions SET reaction_type = 'other' WHERE node_id = :node", node=n2)
+    assert assert_matches_legacy(engine, sid)[str(n2)][1:4] == (0, 0, 0)
+    execute(engine, "UPDATE node_reactions SET reaction_type = 'like' WHERE node_id = :node", node=n2)
+    assert assert_matches_legacy(engine, sid)[str(n2)][1:4] == (1, 0, 0)
+
+
+def test_move_to_another_node(engine, nodes, tag_ids):
+    sid, n1, n2 = nodes
+    execute(engine, "UPDATE node_tags SET node_id = :to WHERE tag_id = :tag", to=n2, tag=tag_ids[0])
+    execute(engine, "UPDATE node_versions SET node_id = :to WHERE node_id = :node", to=n2, node=n1)
+    counts = assert_matches_legacy(engine, sid)
+    assert counts[str(n1)][0] == 1 and counts[str(n1)][5] == 0
+    assert counts[str(n2)][0] == 2 and counts[str(n2)][5] == 3
+
+
+def test_node_soft_and_hard_delete(engine, nodes):
+    sid, n1, n2 = nodes
+    execute(engine, "UPDATE knowledge_nodes SET is_deleted = TRUE WHERE id = :node", node=n1)
+    assert str(n1) not in assert_matches_legacy(engine, sid)
+    execute(engine, "UPDATE knowledge_nodes SET is_deleted = FALSE WHERE id = :node", node=n1)
+    assert assert_matches_legacy(engine, sid)[str(n1)] == (2, 2, 1, 0, 2, 2)
+
+    # 物理削除: 子の行のカスケード削除のトリガーが node_stats の行を作り直さない
+    execute(engine, "DELETE FROM knowledge_nodes WHERE id = :node", node=n2)
+    remaining = execute(engine, "SELECT count(*) FROM node_stats WHERE node_id = :node", node=n2).scalar()
+    assert remaining == 0
+    assert str(n2) not in assert_matches_legacy(engine, sid)
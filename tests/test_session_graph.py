@@ -0,0 +1,147 @@
+"""
+app/session_graph.py の SessionGraph / SessionGraphStats をランダムなグラフで確かめる（DB 不要）
+
+辞書・集合で素直に数えた結果と、CSR の集計・分析サマリー用の集計行からの結果が一致すること。
+"""
+import pickle
+import random
+import uuid
+
+import pytest
+
+from app.session_graph import CATEGORIES, SessionGraph, SessionGraphStats
+
+# 不明なカテゴリのノードも混ぜる
+NODE_CATEGORIES = CATEGORIES + ('unknown',)
+
+
+def random_rows(rng, size, edge_count):
+    """ノードの行 (id, category) と接続の行 (source_id, target_id)
+
+    接続には行き先が生きていないもの（dangling）と、出元が生きていないもの（読まれない）を混ぜる。
+    """
+    nodes = [(uuid.UUID(int=rng.getrandbits(128)), rng.choice(NODE_CATEGORIES)) for _ in range(size)]
+    ids = [node_id for node_id, _ in nodes]
+    gone = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(3)]
+    edges = []
+    for _ in range(edge_count if ids else 0):
+        roll = rng.random()
+        if roll < 0.1:
+            edges.append((rng.choice(ids), rng.choice(gone)))
+        elif roll < 0.15:
+            edges.append((rng.choice(gone), rng.choice(ids)))
+        else:
+            edges.append((rng.choice(ids), rng.choice(ids)))
+    return nodes, edges
+
+
+def brute_force(nodes, edges):
+    category = {str(node_id): c for node_id, c in nodes}
+    live = [(str(s), str(t)) for s, t in edges if str(s) in category]
+    both = [(s, t) for s, t in live if t in category]
+
+    counts = [sum(1 for c in category.values() if c == name) for name in CATEGORIES]
+    matrix = [[0] * len(CATEGORIES) for _ in CATEGORIES]
+    for s, t in both:
+        if category[s] in CATEGORIES and category[t] in CATEGORIES:
+            matrix[CATEGORIES.index(category[s])][CATEGORIES.index(category[t])] += 1
+    touched = {s for s, _ in live} | {t for _, t in both}
+    isolated = {node_id for node_id in category if node_id not in touched}
+    ideal = {
+        (s, t) for s, t in both
+        if category[s] in CATEGORIES and category[t] in CATEGORIES
+        and CATEGORIES.index(category[t]) == (CATEGORIES.index(category[s]) + 1) % len(CATEGORIES)
+    }
+    return {
+        'counts': counts, 'matrix': matrix, 'isolated': isolated,
+        'live': live, 'both': both, 'ideal': ideal,
+    }
+
+
+def stats_rows(nodes, edges):
+    """NODE_STATS_QUERY / EDGE_STATS_QUERY と同じ形の集計行"""
+    expected = brute_force(nodes, edges)
+    category = {str(node_id): c for node_id, c in nodes}
+    node_rows = {}
+    for node_id, c in category.items():
+        row = node_rows.setdefault(c, [0, 0])
+        row[0] += 1
+        row[1] += node_id in expected['isolated']
+    edge_rows = {}
+    for s, t in expected['live']:
+        key = (category[s], category.get(t))
+        edge_rows[key] = edge_rows.get(key, 0) + 1
+    return (
+        [(c, total, isolated) for c, (total, isolated) in node_rows.items()],
+        [(s, t, count) for (s, t), count in edge_rows.items()],
+    )
+
+
+def named_edges(graph, pairs):
+    return sorted((graph.ids[s], graph.ids[t]) for s, t in pairs)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    nodes, edges = random_rows(rng, rng.randint(0, 40), rng.randint(0, 120))
+    expected = brute_force(nodes, edges)
+    graph = SessionGraph.from_rows(nodes, edges)
+
+    assert len(graph) == len(nodes)
+    assert graph.edge_count == len(expected['both'])
+    assert graph.connection_count == len(expected['live'])
+    assert named_edges(graph, graph.edges()) == sorted(expected['both'])
+    assert graph.category_counts() == expected['counts']
+    assert graph.flow_matrix() == expected['matrix']
+    assert graph.isolated_count() == len(expected['isolated'])
+
+    for i, node_id in enumerate(graph.ids):
+        assert graph.index_of(node_id) == i
+        assert sorted(graph.ids[t] for t in graph.successors(i)) == sorted(
+            t for s, t in expected['both'] if s == node_id)
+        assert sorted(graph.ids[s] for s in graph.predecessors(i)) == sorted(
+            s for s, t in expected['both'] if t == node_id)
+
+    ideal = graph.ideal_flows()
+    assert named_edges(ideal, ideal.edges()) == sorted(expected['ideal'])
+    assert ideal.connection_count == len(expected['ideal'])
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_stats_match_graph(seed):
+    rng = random.Random(seed)
+    nodes, edges = random_rows(rng, rng.randint(0, 40), rng.randint(0, 120))
+    graph = SessionGraph.from_rows(nodes, edges)
+    stats = SessionGraphStats(*stats_rows(nodes, edges))
+
+    assert len(stats) == len(graph)
+    assert stats.connection_count == graph.connection_count
+    assert stats.category_counts() == graph.category_counts()
+    assert stats.flow_matrix() == graph.flow_matrix()
+    assert stats.isolated_count() == graph.isolated_count()
+
+
+def test_pickle_round_trip():
+    rng = random.Random(7)
+    nodes, edges = random_rows(rng, 30, 80)
+    graph = SessionGraph.from_rows(nodes, edges)
+    copy = pickle.loads(pickle.dumps(graph))
+
+    assert copy.ids == graph.ids
+    assert list(copy.edges()) == list(graph.edges())
+    assert copy.connection_count == graph.connection_count
+    assert copy.isolated_count() == graph.isolated_count()
+    # 番号の辞書は送らずに作り直す
+    assert copy.index_of(graph.ids[5]) == 5
+
+
+def test_from_dicts():
+    graph = SessionGraph.from_dicts(
+        [{'id': 'a', 'category': 'socialization'}, {'id': 'b', 'category': 'externalization'}],
+        [{'source_id': 'a', 'target_id': 'b'}, {'source_id': 'b', 'target_id': 'gone'}],
+    )
+    assert graph.category(0) == 'socialization'
+    assert graph.edge_count == 1
+    assert graph.connection_count == 2
+    assert graph.isolated_count() == 0
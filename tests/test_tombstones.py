@@ -0,0 +1,81 @@
+"""
+CleanupService の墓石コンパクションを実DBで確かめる
+
+子行が tombstone_cascade_cap を超えるハブのノードでも、1トランザクションで消す子行は
+上限までで、何回かに分けて最後にはノードと子行がすべて消えること。
+"""
+import re
+from collections import defaultdict
+
+import pytest
+from sqlalchemy import event, text
+
+from app.cleanup_service import TOMBSTONE_CASCADES, CleanupService
+from conftest import add_node, connect
+
+CHILD_DELETE_RE = re.compile(r'DELETE FROM (\w+)\s+USING batch')
+CHILD_TABLES = {table for table, _ in TOMBSTONE_CASCADES}
+
+
+@pytest.fixture
+def service(engine, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', engine.url.render_as_string(hide_password=False))
+    monkeypatch.delenv('DATABASE_SHARD_URLS', raising=False)
+    monkeypatch.setenv('REDIS_URL', 'redis://127.0.0.1:1/0')
+    service = CleanupService()
+    service.batch_sleep = 0
+    service.tombstone_batch_size = 5
+    service.tombstone_cascade_cap = 10
+    # updated_at はトリガーで書き込み時刻になるので、猶予を負にして今作った墓石も対象にする
+    service.tombstone_grace_days = -1
+    yield service
+    for shard_engine in service.engines:
+        shard_engine.dispose()
+
+
+def track_transactions(shard_engine):
+    """コミットしたトランザクションごとの子行の削除件数のリスト"""
+    committed = []
+    current = defaultdict(int)
+
+    @event.listens_for(shard_engine, 'after_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        match = CHILD_DELETE_RE.search(statement)
+        if match and match.group(1) in CHILD_TABLES:
+            current['children'] += cursor.rowcount
+
+    @event.listens_for(shard_engine, 'commit')
+    def commit(conn):
+        committed.append(current.pop('children', 0))
+
+    @event.listens_for(shard_engine, 'rollback')
+    def rollback(conn):
+        current.clear()
+
+    return committed
+
+
+def test_hub_node_children_are_capped_per_transaction(engine, make_session, service):
+    sid = make_session()
+    with engine.begin() as conn:
+        hub = add_node(conn, sid, 'hub', is_deleted=True)
+        spokes = [add_node(conn, sid, f's{i}') for i in range(12)]
+        for spoke in spokes:
+            connect(conn, hub, spoke)
+        conn.execute(text("""
+            INSERT INTO node_comments (node_id, session_id, comment_text)
+            SELECT :node, :sid, 'c' FROM generate_series(1, 15)
+        """), {'node': hub, 'sid': sid})
+
+    committed = track_transactions(service.engines[0])
+    reclaimed = service.compact_tombstones(time_budget=30)
+
+    assert max(committed) <= service.tombstone_cascade_cap
+    assert sum(committed) >= 27
+    assert reclaimed['node_connections'] >= 12
+    assert reclaimed['node_comments'] >= 15
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM knowledge_nodes WHERE id = :id"), {'id': hub}).scalar() == 0
+        assert conn.execute(text("""
+            SELECT count(*) FROM knowledge_nodes WHERE session_id = :sid AND NOT is_deleted
+        """), {'sid': sid}).scalar() == 12
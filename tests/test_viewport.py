@@ -0,0 +1,90 @@
+"""
+app/viewport.py の SpatialGrid と bbox の解釈を確かめる（DB 不要）
+
+グリッドの範囲検索が全点の線形走査と一致すること（拡大表示で範囲のセルをたどる場合と、
+縮小表示で使用中のセルだけを見る場合の両方）。
+"""
+import random
+
+import pytest
+
+from app import viewport
+from app.viewport import SpatialGrid, parse_bbox, visible_node_ids
+
+
+def random_points(rng, count, spread):
+    points = [(f'n{i}', rng.uniform(-spread, spread), rng.uniform(-spread, spread)) for i in range(count)]
+    # 同じ位置に重なったノード（位置の行が無いノードは原点）
+    points += [(f'origin{i}', 0.0, 0.0) for i in range(3)]
+    return points
+
+
+def linear_scan(points, bbox):
+    min_x, min_y, max_x, max_y = bbox
+    return sorted(node_id for node_id, x, y in points if min_x <= x <= max_x and min_y <= y <= max_y)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_query_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    spread = rng.choice([10, 1000, 100000])
+    points = random_points(rng, rng.randint(1, 400), spread)
+    grid = SpatialGrid(points)
+
+    for _ in range(30):
+        # 拡大表示の小さい範囲から、全体を覆う範囲まで
+        width = spread * rng.choice([0.01, 0.1, 1, 4])
+        x0, y0 = rng.uniform(-spread * 1.5, spread * 1.5), rng.uniform(-spread * 1.5, spread * 1.5)
+        bbox = (x0, y0, x0 + width, y0 + width * rng.uniform(0.5, 2))
+        assert sorted(grid.query(bbox)) == linear_scan(points, bbox)
+
+
+def test_query_includes_boundary_and_cell_edges():
+    points = [('a', 0.0, 0.0), ('b', 96.0, 96.0), ('c', -96.0, 95.999), ('d', 96.0, -0.001)]
+    grid = SpatialGrid(points)
+    size = grid.cell_size
+    # 範囲の端に載った点・セルの境界に載った点も含める
+    for bbox in [(0, 0, size, size), (-size, 0, 0, size), (96, 96, 96, 96), (-0.001, -0.001, 96, 0),
+                 (-96, -0.001, 96, 95.999)]:
+        assert sorted(grid.query(bbox)) == linear_scan(points, bbox)
+
+
+def test_empty_grid():
+    grid = SpatialGrid([])
+    assert len(grid) == 0
+    assert grid.query((-1e9, -1e9, 1e9, 1e9)) == []
+
+
+def test_parse_bbox():
+    assert parse_bbox('0,0,10,20') == (0.0, 0.0, 10.0, 20.0)
+    # 逆向きの範囲は並べ替える
+    assert parse_bbox('10,20,-5,0') == (-5.0, 0.0, 10.0, 20.0)
+    for value in ['', '1,2,3', '1,2,3,4,5', 'a,b,c,d', '0,0,nan,1', '0,0,inf,1']:
+        with pytest.raises(ValueError):
+            parse_bbox(value)
+
+
+def test_visible_node_ids_truncates(monkeypatch):
+    monkeypatch.setattr(viewport, 'VIEWPORT_MAX_NODES', 5)
+    grid = SpatialGrid([(f'n{i}', float(i), 0.0) for i in range(10)])
+    ids, truncated = visible_node_ids(grid, (0, 0, 100, 0))
+    assert len(ids) == 5 and truncated
+    ids, truncated = visible_node_ids(grid, (0, 0, 3, 0))
+    assert sorted(ids) == ['n0', 'n1', 'n2', 'n3'] and not truncated
+
+
+def test_grid_cache_follows_cursor(monkeypatch):
+    monkeypatch.setattr(viewport, '_grids', type(viewport._grids)())
+    monkeypatch.setattr(viewport, 'VIEWPORT_GRID_CACHE_SESSIONS', 2)
+
+    grid = viewport.store_grid('s1', 'c1', [('n1', 1, 2)])
+    assert viewport.cached_grid('s1', 'c1') is grid
+    # カーソルが進んだら使わない
+    assert viewport.cached_grid('s1', 'c2') is None
+
+    viewport.store_grid('s2', 'c1', [])
+    viewport.cached_grid('s1', 'c1')
+    viewport.store_grid('s3', 'c1', [])
+    # 最近使っていない s2 から追い出す
+    assert viewport.cached_grid('s2', 'c1') is None
+    assert viewport.cached_grid('s1', 'c1') is grid